@@ -10,6 +10,7 @@ from .parts_of_speech import PARTS_OF_SPEECH
 from .tags import sort_tags, tag_categories
 from .thesaurus import extract_thesaurus_data
 from .wiktionary import (
+                         ReprocessOptions,
                          extract_namespace,
                          parse_wiktionary,
                          reprocess_wiktionary,
@@ -21,6 +22,7 @@ __all__ = (
     "WiktextractContext",
     "parse_wiktionary",
     "reprocess_wiktionary",
+    "ReprocessOptions",
     "PARTS_OF_SPEECH",
     "parse_page",
     "extract_thesaurus_data",
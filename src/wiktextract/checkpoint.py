@@ -0,0 +1,144 @@
+# Checkpoint journal for the page processing phase, so that an interrupted
+# run can be resumed without processing the already written pages again.
+#
+# The journal is a JSON lines file next to the output file.  Each line
+# records the pages finished since the previous line, the size of the
+# output file after their data was written, the (word, lang_code, pos)
+# triples they emitted and the errors, warnings and debug messages merged
+# into the configuration object.  A line is only written after the output
+# file has been flushed to disk, so everything after the last recorded
+# size belongs to unrecorded pages and is discarded when resuming.
+import json
+import os
+import time
+from pathlib import Path
+from typing import TextIO
+
+from .wxr_context import WiktextractContext
+from .wxr_logging import logger
+
+
+class Checkpoint:
+    __slots__ = (
+        "path",
+        "resume",
+        "interval",
+        "done",
+        "offset",
+        "pages",
+        "emitted",
+        "stats_lens",
+        "last_time",
+    )
+
+    def __init__(self, path: Path, resume: bool = False, interval: float = 60):
+        self.path = path
+        # Continue from an existing journal instead of starting over
+        self.resume = resume
+        # Seconds between journal writes
+        self.interval = interval
+        # Keys of the pages recorded in the journal
+        self.done: set[tuple[str, int]] = set()
+        self.offset = 0
+        # Pages and emitted triples not yet written to the journal
+        self.pages: list[tuple[str, int]] = []
+        self.emitted: list[tuple[str, str, str]] = []
+        # Lengths of the errors, warnings and debugs lists of the
+        # configuration object at the last journal write
+        self.stats_lens = (0, 0, 0)
+        self.last_time = time.time()
+
+    def start(
+        self, wxr: WiktextractContext, out_f: TextIO
+    ) -> set[tuple[str, str, str]]:
+        """Starts a new journal, or if resuming, reads the journal, restores
+        the merged errors, warnings and debug messages into ``wxr.config``,
+        truncates ``out_f`` to the recorded size and returns the emitted
+        triples of the finished pages."""
+        records = []
+        valid_size = 0
+        if self.resume and self.path.exists():
+            with self.path.open("rb") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # The last line may be incomplete if the process
+                        # was killed while writing it.
+                        break
+                    valid_size += len(line)
+        offset = records[-1]["offset"] if records else 0
+        if os.fstat(out_f.fileno()).st_size < offset:
+            logger.warning(
+                f"Output file is shorter than recorded in {self.path}, "
+                "ignoring the checkpoint"
+            )
+            records = []
+            valid_size = offset = 0
+
+        emitted: set[tuple[str, str, str]] = set()
+        config = wxr.config
+        for record in records:
+            self.done.update(map(tuple, record["pages"]))
+            emitted.update(map(tuple, record["emitted"]))
+            config.errors.extend(record["errors"])
+            config.warnings.extend(record["warnings"])
+            config.debugs.extend(record["debugs"])
+        self.stats_lens = (
+            len(config.errors),
+            len(config.warnings),
+            len(config.debugs),
+        )
+        self.offset = offset
+        out_f.truncate(offset)
+        out_f.seek(offset)
+        with self.path.open("ab") as f:
+            f.truncate(valid_size)
+        if self.resume:
+            logger.info(
+                f"Resuming from checkpoint: {len(self.done)} pages done, "
+                f"{offset} bytes of output kept"
+            )
+        return emitted
+
+    def page_done(
+        self, key: tuple[str, int], emitted: list[tuple[str, str, str]]
+    ) -> None:
+        self.pages.append(key)
+        self.emitted.extend(emitted)
+
+    def due(self) -> bool:
+        return time.time() - self.last_time > self.interval
+
+    def write(self, wxr: WiktextractContext, out_f: TextIO) -> None:
+        """Flushes the output file and records the pages finished since
+        the last call."""
+        out_f.flush()
+        os.fsync(out_f.fileno())
+        self.offset = out_f.tell()
+        config = wxr.config
+        errors_len, warnings_len, debugs_len = self.stats_lens
+        record = {
+            "offset": self.offset,
+            "pages": self.pages,
+            "emitted": self.emitted,
+            "errors": config.errors[errors_len:],
+            "warnings": config.warnings[warnings_len:],
+            "debugs": config.debugs[debugs_len:],
+        }
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(self.pages)
+        self.pages = []
+        self.emitted = []
+        self.stats_lens = (
+            len(config.errors),
+            len(config.warnings),
+            len(config.debugs),
+        )
+        self.last_time = time.time()
+
+    def remove(self) -> None:
+        self.path.unlink(True)
@@ -18,6 +18,8 @@ from wikitextprocessor.core import (
     HTMLTagData,
 )
 
+from .projection import Projection
+
 if sys.version_info < (3, 10):
     from importlib_resources import files
 else:
@@ -53,6 +55,8 @@ class WiktionaryConfig:
         "capture_etymologies",
         "capture_inflections",
         "capture_descendants",
+        "projection",
+        "compact_json",
         "expand_tables",
         "verbose",
         "num_pages",
@@ -112,6 +116,10 @@ class WiktionaryConfig:
         self.capture_etymologies = capture_etymologies
         self.capture_inflections = capture_inflections
         self.capture_descendants = capture_descendants
+        # Fields written to the output, set by --fields and --exclude-fields
+        self.projection: Optional[Projection] = None
+        # JSON lines without spaces after "," and ":", set by --compact-json
+        self.compact_json = False
         self.verbose = verbose
         self.expand_tables = expand_tables
         # Some fields for statistics
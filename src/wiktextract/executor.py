@@ -0,0 +1,686 @@
+# Supervised pool of worker processes for the page processing phases.
+#
+# Unlike `multiprocessing.Pool`, which waits forever for the result of a
+# task whose worker process died (e.g., segfault in Lua or killed by the
+# OOM killer), the parent process here sends each worker one chunk of tasks
+# at a time through the worker's own pipe, and the worker sends back the
+# results of the whole chunk in one message.  While working on a chunk, the
+# worker writes the index of its current task and when it was started into
+# a small array in shared memory, so the parent always knows which task
+# each worker is working on.  A worker tells the parent when its initializer
+# has finished, and only then gets tasks: a worker that dies or whose
+# initializer fails before that stops the run, without blaming any task.
+# When a worker dies, it is replaced and its task is sent to another worker
+# once more; a task that fails again is put
+# into quarantine and reported as an error.  Workers stuck on a task for
+# longer than the timeout are killed, and workers are replaced after
+# processing a given number of tasks or when their memory usage grows too
+# large.
+import gc
+import os
+import pickle
+import signal
+import tempfile
+import time
+import traceback
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from multiprocessing import Array, current_process, get_context
+from multiprocessing.connection import Connection, Pipe, wait
+from typing import IO, Any, Optional
+
+from wikitextprocessor.core import ErrorMessageData
+
+from .wxr_context import WiktextractContext
+from .wxr_logging import logger
+
+# Log a task once when it has been running for this many seconds
+LONG_TASK_SECONDS = 300
+
+# Seconds between checks of the workers while waiting for results
+CHECK_INTERVAL = 1.0
+
+# Number of times a task may fail before it is quarantined
+MAX_ATTEMPTS = 2
+
+# Maximum number of tasks in a chunk
+MAX_CHUNK_SIZE = 256
+
+# Chunks are made to take about this many seconds, long enough to make the
+# overhead of sending them small, and short enough to keep all workers busy
+# until the end
+CHUNK_SECONDS = 0.5
+
+# Results kept in memory while waiting for the results of earlier items,
+# the rest are written to a temporary file
+MAX_REORDER_ITEMS = 1000
+
+# Result of an item that was quarantined or timed out
+NO_RESULT = object()
+
+# The workers are forked, so that they inherit the objects of the parent
+# instead of unpickling their own copies
+fork_context = get_context("fork")
+
+# Worker function, initializer and initializer arguments of the worker
+# process being started, inherited by it
+_worker_args: Optional[tuple[Callable, Optional[Callable], tuple]] = None
+
+
+class WorkerLimits:
+    __slots__ = ("timeout", "max_tasks", "max_rss_mb")
+
+    def __init__(
+        self, timeout: float = 0, max_tasks: int = 0, max_rss_mb: int = 0
+    ):
+        # Seconds after which a worker stuck on a task is killed
+        self.timeout = timeout
+        # Replace a worker after this many tasks
+        self.max_tasks = max_tasks
+        # Replace a worker after a chunk if its resident memory is larger
+        self.max_rss_mb = max_rss_mb
+
+
+class Task:
+    __slots__ = ("task_id", "item", "title", "attempts")
+
+    def __init__(self, task_id: int, item: Any, title: str):
+        self.task_id = task_id
+        self.item = item
+        self.title = title
+        # Number of times the task has failed
+        self.attempts = 0
+
+
+class Worker:
+    __slots__ = (
+        "process",
+        "conn",
+        "heartbeat",
+        "ready",
+        "ready_memory",
+        "tasks",
+        "sent",
+        "retiring",
+    )
+
+    def __init__(self, process, conn: Connection, heartbeat):
+        self.process = process
+        self.conn = conn
+        # [index of the current task in `tasks`, time it was started]
+        self.heartbeat = heartbeat
+        # Set when the worker's initializer has finished
+        self.ready = False
+        # Unique and shared memory of the worker at that time, in MiB
+        self.ready_memory: Optional[tuple[float, float]] = None
+        # Tasks of the chunk sent to the worker
+        self.tasks: list[Task] = []
+        # Time the chunk was sent
+        self.sent = 0.0
+        # Set when the worker exits after its current chunk
+        self.retiring = False
+
+    def current_task(self) -> tuple[Task, float]:
+        # The worker writes the start time before the index, so the start
+        # time read here is never older than the task's.
+        index = int(self.heartbeat[0])
+        return self.tasks[index], self.heartbeat[1]
+
+
+class ReorderBuffer:
+    """Takes results numbered 0, 1, 2, ... in any order and returns them
+    in the order of their numbers.  At most ``max_items`` results are kept
+    in memory, results that arrive when it is full are pickled to a
+    temporary file until their turn."""
+
+    __slots__ = ("max_items", "next_id", "items", "spilled", "spill_f")
+
+    def __init__(self, max_items: int = MAX_REORDER_ITEMS):
+        self.max_items = max_items
+        # Number of the next result to return
+        self.next_id = 0
+        self.items: dict[int, Any] = {}
+        # Number -> (offset, length) of the pickled result in `spill_f`
+        self.spilled: dict[int, tuple[int, int]] = {}
+        self.spill_f: Optional[IO[bytes]] = None
+
+    def add(self, item_id: int, item: Any) -> None:
+        if (
+            item_id == self.next_id
+            or len(self.items) < self.max_items
+            or item is NO_RESULT  # must keep its identity
+        ):
+            self.items[item_id] = item
+            return
+        if self.spill_f is None:
+            self.spill_f = tempfile.TemporaryFile()
+        data = pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        offset = self.spill_f.seek(0, os.SEEK_END)
+        self.spill_f.write(data)
+        self.spilled[item_id] = (offset, len(data))
+
+    def pop_ready(self) -> Iterator[Any]:
+        """Yields the results that are next in order, except `NO_RESULT`
+        placeholders."""
+        while True:
+            if self.next_id in self.items:
+                item = self.items.pop(self.next_id)
+            elif self.next_id in self.spilled:
+                assert self.spill_f is not None
+                offset, length = self.spilled.pop(self.next_id)
+                self.spill_f.seek(offset)
+                item = pickle.loads(self.spill_f.read(length))
+            else:
+                return
+            self.next_id += 1
+            if item is not NO_RESULT:
+                yield item
+
+    def close(self) -> None:
+        if self.spill_f is not None:
+            self.spill_f.close()
+            self.spill_f = None
+
+
+def current_rss_mb() -> float:
+    """Returns the resident memory of this process in megabytes, or 0 if
+    not known (only implemented for Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def process_memory_mb(pid: int) -> Optional[tuple[float, float]]:
+    """Returns the resident memory of process ``pid`` that is unique to it
+    and that is shared with other processes, e.g., the parent process it
+    was forked from, in megabytes, or None if not known (only implemented
+    for Linux)."""
+    unique = shared = 0
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Private_Clean", "Private_Dirty"):
+                    unique += int(value.split()[0])
+                elif name in ("Shared_Clean", "Shared_Dirty"):
+                    shared += int(value.split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    # Values are in kilobytes
+    return unique / 1024, shared / 1024
+
+
+def worker_main(conn: Connection, heartbeat, limits: WorkerLimits) -> None:
+    # The parent handles interrupts and terminates the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The objects of the parent were frozen when forking, so the garbage
+    # collector doesn't write to their memory pages
+    gc.enable()
+    assert _worker_args is not None
+    func, initializer, initargs = _worker_args
+    if initializer is not None:
+        try:
+            initializer(*initargs)
+        except Exception:
+            conn.send(traceback.format_exc())
+            return
+    conn.send(True)
+    num_tasks = 0
+    while True:
+        try:
+            chunk = conn.recv()
+        except EOFError:
+            return
+        if chunk is None:
+            return
+        results = []
+        for i, item in enumerate(chunk):
+            heartbeat[1] = time.time()
+            heartbeat[0] = i
+            try:
+                results.append((True, func(item)))
+            except Exception:
+                # The worker functions catch the exceptions of the extractor
+                # code, this is a bug in the worker function itself.
+                results.append(
+                    (
+                        False,
+                        f"exception in process {current_process().name}\n"
+                        + traceback.format_exc(),
+                    )
+                )
+        num_tasks += len(chunk)
+        retiring = (limits.max_tasks > 0 and num_tasks >= limits.max_tasks) or (
+            limits.max_rss_mb > 0 and current_rss_mb() > limits.max_rss_mb
+        )
+        conn.send((results, retiring))
+        if retiring:
+            return
+
+
+class SupervisedExecutor:
+    """Runs ``func(item)`` in ``num_processes`` worker processes, after
+    calling ``initializer(*initargs)`` in each.  Use as a context manager:
+    the worker processes are started when entering and stopped when
+    exiting.
+
+    The worker processes are forked and inherit ``initargs``, they share
+    the memory pages of these objects and of everything ``preload()``
+    imports or creates with the parent process.  Workers started later to
+    replace others inherit the objects as they are at that time."""
+
+    __slots__ = (
+        "num_processes",
+        "func",
+        "initializer",
+        "initargs",
+        "limits",
+        "preload",
+        "workers",
+        "quarantined",
+        "unexpected_exits",
+        "seconds_per_task",
+        "memory_logged",
+    )
+
+    def __init__(
+        self,
+        num_processes: Optional[int],
+        func: Callable,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+        limits: Optional[WorkerLimits] = None,
+        preload: Optional[Callable[[], Any]] = None,
+    ):
+        self.num_processes = num_processes or os.cpu_count() or 1
+        self.func = func
+        self.initializer = initializer
+        self.initargs = initargs
+        self.limits = limits if limits is not None else WorkerLimits()
+        # Called before the first workers are forked, e.g., to import the
+        # modules they use
+        self.preload = preload
+        self.workers: list[Worker] = []
+        # Titles of the tasks that failed in every attempt
+        self.quarantined: list[str] = []
+        # Workers that exited without a task since the last result
+        self.unexpected_exits = 0
+        # Moving average of the time to process one task, including the
+        # time to send it and its result
+        self.seconds_per_task: Optional[float] = None
+        # The memory of the workers after their first chunk was logged
+        self.memory_logged = False
+
+    def __enter__(self) -> "SupervisedExecutor":
+        # No objects are freed between the long-lived ones created by
+        # preload() until the workers are forked, see gc.freeze()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if self.preload is not None:
+                self.preload()
+            for _ in range(self.num_processes):
+                self.workers.append(self.start_worker())
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.log_memory("at the end")
+        for worker in self.workers:
+            if worker.process.is_alive() and not worker.tasks:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+        deadline = time.time() + 5
+        for worker in self.workers:
+            worker.process.join(max(0, deadline - time.time()))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+        self.workers = []
+
+    def start_worker(self) -> Worker:
+        global _worker_args
+        parent_conn, child_conn = Pipe()
+        heartbeat = Array("d", 2, lock=False)
+        process = fork_context.Process(
+            target=worker_main,
+            args=(child_conn, heartbeat, self.limits),
+            daemon=True,
+        )
+        _worker_args = (self.func, self.initializer, self.initargs)
+        # The frozen objects are never collected in the worker, so it
+        # shares their memory pages with the parent
+        gc.freeze()
+        try:
+            process.start()
+        finally:
+            gc.unfreeze()
+            _worker_args = None
+        child_conn.close()
+        return Worker(process, parent_conn, heartbeat)
+
+    def log_memory(self, when: str) -> None:
+        """Logs the unique and shared memory of the workers, and their
+        unique memory when they were ready, before their first task."""
+        usage = []
+        for worker in self.workers:
+            if worker.ready_memory is None or not worker.process.is_alive():
+                continue
+            memory = process_memory_mb(worker.process.pid)  # type: ignore[arg-type]
+            if memory is not None:
+                usage.append((worker.ready_memory[0],) + memory)
+        if not usage:
+            return
+        logger.info(
+            "Worker memory {}: {:.0f} MiB unique (at most {:.0f} MiB, "
+            "{:.0f} MiB when ready) and {:.0f} MiB shared per worker, "
+            "{} workers".format(
+                when,
+                sum(unique for _, unique, _ in usage) / len(usage),
+                max(unique for _, unique, _ in usage),
+                sum(ready for ready, _, _ in usage) / len(usage),
+                sum(shared for _, _, shared in usage) / len(usage),
+                len(usage),
+            )
+        )
+
+    def auto_chunk_size(self) -> int:
+        if self.seconds_per_task is None:
+            return 1
+        return max(
+            1,
+            min(MAX_CHUNK_SIZE, int(CHUNK_SECONDS / self.seconds_per_task)),
+        )
+
+    def imap_unordered(
+        self,
+        wxr: WiktextractContext,
+        items: Iterable[Any],
+        describe: Callable[[Any], str],
+        chunk_size: int = 1,
+        costs: bool = False,
+    ) -> Iterator[Any]:
+        """Yields the results for ``items`` in the order they finish.  Items
+        that are quarantined or time out have no result, they are logged
+        and added to the errors with the title returned by ``describe()``
+        for their item.  See `imap_numbered()` for the other arguments."""
+        for _, result in self.imap_numbered(
+            wxr, items, describe, chunk_size, costs
+        ):
+            if result is not NO_RESULT:
+                yield result
+
+    def imap(
+        self,
+        wxr: WiktextractContext,
+        items: Iterable[Any],
+        describe: Callable[[Any], str],
+        chunk_size: int = 1,
+        costs: bool = False,
+        max_buffered: int = MAX_REORDER_ITEMS,
+    ) -> Iterator[Any]:
+        """Like `imap_unordered()`, but yields the results in the order of
+        ``items``.  The results that finish before the results of earlier
+        items are buffered, with at most ``max_buffered`` in memory."""
+        buffer = ReorderBuffer(max_buffered)
+        try:
+            for item_id, result in self.imap_numbered(
+                wxr, items, describe, chunk_size, costs
+            ):
+                buffer.add(item_id, result)
+                yield from buffer.pop_ready()
+        finally:
+            buffer.close()
+
+    def imap_numbered(
+        self,
+        wxr: WiktextractContext,
+        items: Iterable[Any],
+        describe: Callable[[Any], str],
+        chunk_size: int = 1,
+        costs: bool = False,
+    ) -> Iterator[tuple[int, Any]]:
+        """Yields (index of the item in ``items``, result) pairs in the
+        order the items finish.  The result is `NO_RESULT` for the items
+        that are quarantined or time out.
+
+        Items are sent to the workers in chunks of ``chunk_size`` items, or
+        if it is 0, of as many items as take about ``CHUNK_SECONDS`` to
+        process according to the time measured so far.  If ``costs`` is
+        True, ``items`` are (item, estimated seconds) pairs, and chunks are
+        made of consecutive items whose estimates add up to at most
+        ``CHUNK_SECONDS``; more expensive items are sent alone."""
+        items_iter = enumerate(items)
+        # Next item, read but not sent to a worker yet
+        next_item: Optional[tuple[int, Any]] = None
+        items_left = True
+        requeued: deque[Task] = deque()
+        logged: set[int] = set()
+
+        def next_chunk() -> list[Task]:
+            nonlocal next_item, items_left
+            if requeued:
+                return [requeued.popleft()]
+            max_size = chunk_size
+            if costs:
+                max_size = MAX_CHUNK_SIZE
+            elif chunk_size == 0:
+                max_size = self.auto_chunk_size()
+            chunk: list[Task] = []
+            chunk_cost = 0.0
+            while items_left and len(chunk) < max_size:
+                if next_item is None:
+                    try:
+                        next_item = next(items_iter)
+                    except StopIteration:
+                        items_left = False
+                        break
+                task_id, item = next_item
+                if costs:
+                    item, cost = item
+                    if chunk and chunk_cost + cost > CHUNK_SECONDS:
+                        break
+                    chunk_cost += cost
+                chunk.append(Task(task_id, item, describe(item)))
+                next_item = None
+            return chunk
+
+        while True:
+            for worker in self.workers:
+                if worker.tasks or worker.retiring or not worker.ready:
+                    continue
+                chunk = next_chunk()
+                if not chunk:
+                    break
+                self.send_chunk(worker, chunk)
+            busy = [w for w in self.workers if w.tasks]
+            if not busy and not requeued and not items_left:
+                return
+            starting = [w for w in self.workers if not w.ready]
+
+            ready = wait(
+                [w.conn for w in busy + starting]
+                + [w.process.sentinel for w in self.workers],
+                CHECK_INTERVAL,
+            )
+            for worker in starting:
+                if worker.conn in ready:
+                    self.check_ready(worker)
+            for worker in busy:
+                if worker.conn not in ready:
+                    continue
+                try:
+                    results, retiring = worker.conn.recv()
+                except (EOFError, OSError):
+                    # Died, handled below
+                    continue
+                tasks = worker.tasks
+                worker.tasks = []
+                worker.retiring = retiring
+                self.unexpected_exits = 0
+                self.update_seconds_per_task(
+                    (time.time() - worker.sent) / len(tasks)
+                )
+                if not self.memory_logged:
+                    self.memory_logged = True
+                    self.log_memory("after the first chunk")
+                for task, (ok, result) in zip(tasks, results):
+                    if ok:
+                        yield task.task_id, result
+                    else:
+                        self.quarantine(wxr, task, result)
+                        yield task.task_id, NO_RESULT
+
+            now = time.time()
+            for i, worker in enumerate(self.workers):
+                if worker.process.exitcode is not None:
+                    if not worker.ready and worker.conn.poll():
+                        # Exited after telling it was ready
+                        self.check_ready(worker)
+                    if not worker.ready:
+                        raise RuntimeError(
+                            f"worker process {worker.process.pid} exited "
+                            "before its initializer finished (exit code "
+                            f"{worker.process.exitcode})"
+                        )
+                    if worker.tasks:
+                        failed = self.task_failed(
+                            wxr,
+                            worker,
+                            requeued,
+                            f"worker process {worker.process.pid} died "
+                            f"(exit code {worker.process.exitcode})",
+                        )
+                        if failed is not None:
+                            yield failed.task_id, NO_RESULT
+                    elif not worker.retiring:
+                        logger.warning(
+                            f"Worker process {worker.process.pid} exited "
+                            f"with exit code {worker.process.exitcode}"
+                        )
+                        self.unexpected_exits += 1
+                        if self.unexpected_exits > 2 * self.num_processes:
+                            raise RuntimeError(
+                                "worker processes keep exiting without a task"
+                            )
+                    worker.conn.close()
+                    self.workers[i] = self.start_worker()
+                    continue
+                if not worker.tasks:
+                    continue
+                task, start_time = worker.current_task()
+                if (
+                    self.limits.timeout > 0
+                    and now - start_time > self.limits.timeout
+                ):
+                    worker.process.kill()
+                    worker.process.join()
+                    worker.conn.close()
+                    self.workers[i] = self.start_worker()
+                    self.requeue_others(worker, task, requeued)
+                    self.quarantine(
+                        wxr,
+                        task,
+                        f"timed out after {now - start_time:.0f}s, "
+                        f"killed worker process {worker.process.pid}",
+                    )
+                    yield task.task_id, NO_RESULT
+                elif (
+                    now - start_time > LONG_TASK_SECONDS
+                    and task.task_id not in logged
+                ):
+                    logged.add(task.task_id)
+                    logger.warning(
+                        f'Page "{task.title}" has been processed for '
+                        f"{now - start_time:.0f}s in worker process "
+                        f"{worker.process.pid}"
+                    )
+
+    def check_ready(self, worker: Worker) -> None:
+        """Receives the message a starting worker sends when its
+        initializer has finished, raises RuntimeError if it failed."""
+        try:
+            message = worker.conn.recv()
+        except (EOFError, OSError):
+            # Died, handled by the caller
+            return
+        if message is not True:
+            raise RuntimeError(
+                f"initializer of worker process {worker.process.pid} "
+                f"failed:\n{message}"
+            )
+        worker.ready = True
+        worker.ready_memory = process_memory_mb(worker.process.pid)  # type: ignore[arg-type]
+
+    def send_chunk(self, worker: Worker, chunk: list[Task]) -> None:
+        worker.tasks = chunk
+        worker.sent = time.time()
+        worker.heartbeat[1] = worker.sent
+        worker.heartbeat[0] = 0
+        try:
+            worker.conn.send([task.item for task in chunk])
+        except OSError:
+            # The worker died, the tasks are sent again after the death is
+            # noticed.
+            pass
+
+    def update_seconds_per_task(self, seconds: float) -> None:
+        if self.seconds_per_task is None:
+            self.seconds_per_task = seconds
+        else:
+            self.seconds_per_task = 0.9 * self.seconds_per_task + 0.1 * seconds
+
+    def requeue_others(
+        self, worker: Worker, task: Task, requeued: deque[Task]
+    ) -> None:
+        """Sends the tasks of the chunk of a dead worker except ``task``
+        again; their results were lost with the worker."""
+        requeued.extendleft(
+            reversed([t for t in worker.tasks if t is not task])
+        )
+        worker.tasks = []
+
+    def task_failed(
+        self,
+        wxr: WiktextractContext,
+        worker: Worker,
+        requeued: deque[Task],
+        reason: str,
+    ) -> Optional[Task]:
+        """Handles the death of ``worker``: its current task is sent again
+        or quarantined, the rest of its chunk is sent again.  Returns the
+        task if it was quarantined."""
+        task, _ = worker.current_task()
+        self.requeue_others(worker, task, requeued)
+        task.attempts += 1
+        if task.attempts < MAX_ATTEMPTS:
+            logger.warning(f'Page "{task.title}": {reason}, retrying')
+            requeued.appendleft(task)
+            return None
+        self.quarantine(wxr, task, reason)
+        return task
+
+    def quarantine(
+        self, wxr: WiktextractContext, task: Task, reason: str
+    ) -> None:
+        self.quarantined.append(task.title)
+        msg = f'Page "{task.title}" failed: {reason}'
+        logger.error(msg)
+        error_data: ErrorMessageData = {
+            "msg": msg,
+            "trace": "",
+            "title": task.title,
+            "section": None,
+            "subsection": None,
+            "called_from": "executor_quarantine",
+            "path": tuple(),
+        }
+        wxr.config.errors.append(error_data)
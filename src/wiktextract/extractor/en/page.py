@@ -4139,6 +4139,40 @@ def parse_top_template(
     clean_node(wxr, None, [node], template_fn=top_template_fn)
 
 
+SUBTITLE_RE = re.compile(
+    r"(?m)^(==+)[ \t]*([^= \t]([^=\n]|=[^=])*?)" r"[ \t]*(==+)[ \t]*$"
+)
+
+
+def slice_captured_languages(wxr: WiktextractContext, text: str) -> str:
+    """Removes the sections of languages that are not in
+    ``capture_language_codes`` from the raw wikitext, so that they are
+    neither parsed nor pre-expanded.  Text before the first language
+    subtitle (top-level templates) is kept.  Subtitles are recognized as
+    language subtitles using the same rule as ``fix_subtitle_hierarchy()``,
+    which moves every subtitle that is a language name to level 2."""
+    capture_language_codes = wxr.config.capture_language_codes
+    if not capture_language_codes:
+        return text
+
+    parts = []
+    start = 0
+    keep = True
+    for m in SUBTITLE_RE.finditer(text):
+        title = re.sub(r"^\[\[", "", m.group(2))
+        title = re.sub(r"\]\]$", "", title)
+        lang_code = name_to_code(title, "en")
+        if lang_code == "":
+            continue
+        if keep:
+            parts.append(text[start : m.start()])
+        start = m.start()
+        keep = lang_code in capture_language_codes
+    if keep:
+        parts.append(text[start:])
+    return "".join(parts)
+
+
 def fix_subtitle_hierarchy(wxr: WiktextractContext, text: str) -> str:
     """Fix subtitle hierarchy to be strict Language -> Etymology ->
     Part-of-Speech -> Translation/Linkage. Also merge Etymology sections
@@ -4159,9 +4193,7 @@ def fix_subtitle_hierarchy(wxr: WiktextractContext, text: str) -> str:
     # Known lowercase PoS names are in part_of_speech_map
     # Known lowercase linkage section names are in linkage_map
 
-    old = re.split(
-        r"(?m)^(==+)[ \t]*([^= \t]([^=\n]|=[^=])*?)" r"[ \t]*(==+)[ \t]*$", text
-    )
+    old = SUBTITLE_RE.split(text)
 
     parts = []
     npar = 4  # Number of parentheses in above expression
@@ -4263,6 +4295,12 @@ def parse_page(wxr: WiktextractContext, word: str, text: str) -> list[WordData]:
     text = re.sub(r"(?si)<(/)?onlyinclude\s*>", "", text)
     text = re.sub(r"(?si)<(/)?includeonly\s*>", "", text)
 
+    # Drop the sections of languages we don't capture before doing any
+    # real work on them.  Pages like "a" have well over a hundred
+    # languages, and parsing and pre-expanding all of them only to skip
+    # most of them below is a large part of the processing time.
+    text = slice_captured_languages(wxr, text)
+
     # Fix up the subtitle hierarchy.  There are hundreds if not thousands of
     # pages that have, for example, Translations section under Linkage, or
     # Translations section on the same level as Noun.  Enforce a proper
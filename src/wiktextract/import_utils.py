@@ -1,6 +1,7 @@
 import importlib
 import importlib.util
 import types
+from collections.abc import Iterable
 
 
 def import_extractor_module(
@@ -16,3 +17,16 @@ def import_extractor_module(
         full_module_name = default_module_name
 
     return importlib.import_module(full_module_name)
+
+
+def preload_extractor_modules(
+    lang_code: str, module_names: Iterable[str]
+) -> None:
+    """Imports the extractor modules, and with them the data modules and
+    tables they use.  Given as the ``preload`` function of
+    `SupervisedExecutor`, they are imported in the parent process before
+    the worker processes are forked, and the workers share the memory pages
+    of these objects with the parent instead of importing their own
+    copies."""
+    for module_name in module_names:
+        import_extractor_module(lang_code, module_name)
@@ -0,0 +1,336 @@
+# Compares two JSON lines output files entry by entry and counts the changed
+# fields, e.g., to check the output of a code change against a previous run
+# on the same dump.
+#
+# Both files are split into partitions by a hash of the key (word, language
+# code, part of speech) of each entry, in parallel over byte ranges of the
+# files, and then the partitions are compared in parallel.  Only one
+# partition of each file is in the memory of a worker process at a time.
+# Entries with the same key are paired in the order of the files.
+import argparse
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from .jsonl_index import entry_key, loads
+from .wxr_logging import logger
+
+# Target size of a partition of one file, the number of partitions is
+# limited to MAX_PARTITIONS
+PARTITION_SIZE = 32 * 1024 * 1024
+MAX_PARTITIONS = 256
+# Byte ranges of the files split per process
+CHUNKS_PER_PROCESS = 4
+# Keys of the entries listed for each changed field
+MAX_SAMPLES = 5
+
+LENGTH = struct.Struct("<I")
+
+MISSING = object()
+
+DiffStats = dict[str, Any]
+
+
+def new_stats() -> DiffStats:
+    return {
+        "old_entries": 0,
+        "new_entries": 0,
+        "unchanged": 0,
+        "changed": 0,
+        "removed": 0,
+        "added": 0,
+        # Field path -> number of changed entries
+        "fields": Counter(),
+        # "added", "removed" or field path -> keys of entries
+        "samples": defaultdict(list),
+    }
+
+
+def merge_stats(stats: DiffStats, other: DiffStats, max_samples: int) -> None:
+    for name in (
+        "old_entries",
+        "new_entries",
+        "unchanged",
+        "changed",
+        "removed",
+        "added",
+    ):
+        stats[name] += other[name]
+    stats["fields"].update(other["fields"])
+    for name, keys in other["samples"].items():
+        samples = stats["samples"][name]
+        samples.extend(keys[: max_samples - len(samples)])
+
+
+def key_text(key: bytes) -> str:
+    return key.decode("utf-8").replace("\0", "/")
+
+
+def changed_paths(old: Any, new: Any, path: str, paths: set[str]) -> None:
+    """Adds the paths of the fields that differ between ``old`` and
+    ``new`` to ``paths``.  List indices are not part of the paths, e.g.,
+    "senses.glosses"; lists of different length are changed as a whole."""
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for name in old.keys() | new.keys():
+            changed_paths(
+                old.get(name, MISSING),
+                new.get(name, MISSING),
+                f"{path}.{name}" if path else name,
+                paths,
+            )
+    elif (
+        isinstance(old, list) and isinstance(new, list) and len(old) == len(new)
+    ):
+        for old_item, new_item in zip(old, new):
+            changed_paths(old_item, new_item, path, paths)
+    else:
+        paths.add(path)
+
+
+def split_chunks(path: Path, num_chunks: int) -> list[tuple[int, int]]:
+    size = path.stat().st_size
+    step = max(1, -(-size // num_chunks))
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+
+def chunk_lines(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Yields the non-empty lines that start in the byte range [start,
+    end) of ``path``."""
+    with path.open("rb") as f:
+        if start > 0:
+            # Skip the line that started in the previous chunk
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                yield line
+
+
+def partition_chunk(
+    label: str,
+    path: Path,
+    start: int,
+    end: int,
+    chunk_num: int,
+    tmp_dir: Path,
+    num_partitions: int,
+) -> int:
+    """Writes the entries whose lines start in the byte range [start, end)
+    of ``path`` to the partition files "<label>.<chunk_num>.<partition>"
+    as length-prefixed keys and lines.  Returns the number of entries."""
+    files: dict[int, Any] = {}
+    count = 0
+    try:
+        for line in chunk_lines(path, start, end):
+            key = entry_key(loads(line))
+            partition = zlib.crc32(key) % num_partitions
+            out_f = files.get(partition)
+            if out_f is None:
+                out_f = files[partition] = (
+                    tmp_dir / f"{label}.{chunk_num}.{partition}"
+                ).open("wb")
+            out_f.write(LENGTH.pack(len(key)) + key)
+            out_f.write(LENGTH.pack(len(line)) + line)
+            count += 1
+    finally:
+        for out_f in files.values():
+            out_f.close()
+    return count
+
+
+def read_partition(
+    tmp_dir: Path, label: str, num_chunks: int, partition: int
+) -> dict[bytes, list[bytes]]:
+    """Returns the lines of a partition grouped by key, in file order."""
+    entries: dict[bytes, list[bytes]] = defaultdict(list)
+    for chunk_num in range(num_chunks):
+        part_path = tmp_dir / f"{label}.{chunk_num}.{partition}"
+        if not part_path.exists():
+            continue
+        data = part_path.read_bytes()
+        pos = 0
+        while pos < len(data):
+            (key_len,) = LENGTH.unpack_from(data, pos)
+            pos += LENGTH.size
+            key = data[pos : pos + key_len]
+            pos += key_len
+            (line_len,) = LENGTH.unpack_from(data, pos)
+            pos += LENGTH.size
+            entries[key].append(data[pos : pos + line_len])
+            pos += line_len
+        part_path.unlink()
+    return entries
+
+
+def compare_partition(
+    tmp_dir: Path,
+    num_chunks: tuple[int, int],
+    partition: int,
+    max_samples: int,
+) -> DiffStats:
+    old = read_partition(tmp_dir, "old", num_chunks[0], partition)
+    new = read_partition(tmp_dir, "new", num_chunks[1], partition)
+    stats = new_stats()
+    samples = stats["samples"]
+    for key in sorted(old.keys() | new.keys()):
+        old_lines = old.get(key, [])
+        new_lines = new.get(key, [])
+        stats["old_entries"] += len(old_lines)
+        stats["new_entries"] += len(new_lines)
+        for old_line, new_line in zip(old_lines, new_lines):
+            if old_line == new_line:
+                stats["unchanged"] += 1
+                continue
+            paths: set[str] = set()
+            changed_paths(loads(old_line), loads(new_line), "", paths)
+            if not paths:
+                # Only the formatting or the order of the fields differs
+                stats["unchanged"] += 1
+                continue
+            stats["changed"] += 1
+            stats["fields"].update(paths)
+            for path in paths:
+                if len(samples[path]) < max_samples:
+                    samples[path].append(key_text(key))
+        for name, lines in (
+            ("removed", old_lines[len(new_lines) :]),
+            ("added", new_lines[len(old_lines) :]),
+        ):
+            if lines:
+                stats[name] += len(lines)
+                if len(samples[name]) < max_samples:
+                    samples[name].append(key_text(key))
+    return stats
+
+
+def diff_files(
+    old_path: Path,
+    new_path: Path,
+    num_processes: Optional[int] = None,
+    tmp_dir: Optional[str] = None,
+    max_samples: int = MAX_SAMPLES,
+) -> DiffStats:
+    """Compares the JSON lines files ``old_path`` and ``new_path``, which
+    must have one entry per line, and returns the counts of unchanged,
+    changed, removed and added entries and of the changed fields."""
+    num_processes = num_processes or os.cpu_count() or 1
+    size = max(old_path.stat().st_size, new_path.stat().st_size)
+    num_partitions = min(MAX_PARTITIONS, max(1, -(-size // PARTITION_SIZE)))
+    stats = new_stats()
+    with (
+        tempfile.TemporaryDirectory(dir=tmp_dir) as tmp,
+        multiprocessing.Pool(num_processes) as pool,
+    ):
+        tmp_path = Path(tmp)
+        tasks = []
+        num_chunks = []
+        for label, path in (("old", old_path), ("new", new_path)):
+            chunks = split_chunks(path, num_processes * CHUNKS_PER_PROCESS)
+            num_chunks.append(len(chunks))
+            for chunk_num, (start, end) in enumerate(chunks):
+                tasks.append(
+                    (
+                        label,
+                        path,
+                        start,
+                        end,
+                        chunk_num,
+                        tmp_path,
+                        num_partitions,
+                    )
+                )
+        logger.info(
+            f"Partitioning {old_path} and {new_path} into "
+            f"{num_partitions} partitions"
+        )
+        pool.starmap(partition_chunk, tasks)
+        logger.info("Comparing the partitions")
+        for partition_stats in pool.starmap(
+            compare_partition,
+            [
+                (tmp_path, tuple(num_chunks), partition, max_samples)
+                for partition in range(num_partitions)
+            ],
+        ):
+            merge_stats(stats, partition_stats, max_samples)
+    return stats
+
+
+def print_report(stats: DiffStats, file=sys.stdout) -> None:
+    print(
+        f"{stats['old_entries']} entries in the old file, "
+        f"{stats['new_entries']} in the new file",
+        file=file,
+    )
+    for name in ("unchanged", "changed", "removed", "added"):
+        samples = stats["samples"].get(name)
+        line = f"{name:>9}: {stats[name]}"
+        if samples:
+            line += "  e.g., " + ", ".join(samples)
+        print(line, file=file)
+    if stats["fields"]:
+        print("changed fields:", file=file)
+        for path, count in stats["fields"].most_common():
+            samples = ", ".join(stats["samples"].get(path, ()))
+            print(f"{count:>10} {path}  e.g., {samples}", file=file)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare two wiktextract JSON lines output files entry "
+        "by entry and count the changed fields",
+    )
+    parser.add_argument("old", type=str, help="Output file of the old version")
+    parser.add_argument("new", type=str, help="Output file of the new version")
+    parser.add_argument(
+        "--num-processes",
+        type=int,
+        default=None,
+        help="Number of processes, defaults to the number of CPUs",
+    )
+    parser.add_argument(
+        "--tmp-dir",
+        type=str,
+        default=None,
+        help="Directory for the partition files, which take as much space "
+        "as the two files",
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=MAX_SAMPLES,
+        help="Number of entry keys listed for each changed field",
+    )
+    parser.add_argument(
+        "--json",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Also write the counts and samples to FILE as JSON",
+    )
+    args = parser.parse_args()
+    stats = diff_files(
+        Path(args.old),
+        Path(args.new),
+        args.num_processes,
+        args.tmp_dir,
+        args.samples,
+    )
+    print_report(stats)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2, sort_keys=True, ensure_ascii=False)
+    if stats["changed"] or stats["removed"] or stats["added"]:
+        sys.exit(1)
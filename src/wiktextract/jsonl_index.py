@@ -0,0 +1,223 @@
+# Sidecar index of a JSON lines output file for finding entries by word,
+# language code and part of speech without reading the whole file.
+#
+# The index file ("<output file>.idx") has a header, a table of fixed-size
+# records sorted by key, and the keys.  A key is the UTF-8 encoded word,
+# language code and part of speech separated by NUL characters; each record
+# has the position and length of its key and of the entry's line in the
+# output file.  `JsonlIndex` memory-maps both files and finds entries by
+# binary search over the records.
+#
+# The records are sorted in runs of at most `RUN_RECORDS` records, which
+# are written to temporary files and merged, so that the records of the
+# whole file are never in memory.
+import heapq
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+from .output import orjson
+from .wxr_logging import logger
+
+loads = json.loads if orjson is None else orjson.loads
+
+INDEX_MAGIC = b"WXJIDX1\n"
+# Magic, number of entries, size of the JSON lines file when indexed
+HEADER = struct.Struct("<8sQQ")
+# Key position in the keys, key length, line offset, line length
+RECORD = struct.Struct("<QIQI")
+# Key length, line offset, line length of a record in a run file, followed
+# by the key
+RUN_RECORD = struct.Struct("<IQI")
+# Records sorted in memory at once
+RUN_RECORDS = 1_000_000
+
+
+def index_path(jsonl_path: Union[str, Path]) -> Path:
+    return Path(str(jsonl_path) + ".idx")
+
+
+def entry_key(data: dict) -> bytes:
+    # Hard redirects have a title instead of a word
+    word = data.get("word") or data.get("title") or ""
+    lang_code = data.get("lang_code") or ""
+    pos = data.get("pos") or ""
+    return f"{word}\0{lang_code}\0{pos}".encode("utf-8")
+
+
+def write_run(path: Path, records: Iterable[tuple[bytes, int, int]]) -> None:
+    with path.open("wb", buffering=1024 * 1024) as f:
+        for key, offset, length in records:
+            f.write(RUN_RECORD.pack(len(key), offset, length) + key)
+
+
+def read_run(path: Path) -> Iterator[tuple[bytes, int, int]]:
+    with path.open("rb", buffering=1024 * 1024) as f:
+        while True:
+            header = f.read(RUN_RECORD.size)
+            if not header:
+                return
+            key_len, offset, length = RUN_RECORD.unpack(header)
+            yield f.read(key_len), offset, length
+
+
+def build_index(
+    jsonl_path: Union[str, Path], out_path: Optional[Path] = None
+) -> int:
+    """Writes the index of the JSON lines file ``jsonl_path`` to
+    ``out_path``, by default "<jsonl_path>.idx", and returns the number of
+    entries.  The file must have one entry per line, i.e., not be written
+    with --human-readable."""
+    jsonl_path = Path(jsonl_path)
+    if out_path is None:
+        out_path = index_path(jsonl_path)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with tempfile.TemporaryDirectory(dir=out_path.parent) as tmp:
+        run_paths: list[Path] = []
+        records: list[tuple[bytes, int, int]] = []
+        count = 0
+        offset = 0
+        with jsonl_path.open("rb") as f:
+            for line in f:
+                if line.strip():
+                    records.append((entry_key(loads(line)), offset, len(line)))
+                    count += 1
+                    if len(records) >= RUN_RECORDS:
+                        records.sort()
+                        run_paths.append(Path(tmp) / f"run.{len(run_paths)}")
+                        write_run(run_paths[-1], records)
+                        records = []
+                offset += len(line)
+        records.sort()
+        # Ties are broken by the line offsets, which are unique
+        sorted_records = heapq.merge(records, *map(read_run, run_paths))
+        # The keys come after all records, they are written to a
+        # temporary file first
+        keys_path = Path(tmp) / "keys"
+        with (
+            tmp_path.open("wb", buffering=1024 * 1024) as f,
+            keys_path.open("w+b", buffering=1024 * 1024) as keys_f,
+        ):
+            f.write(HEADER.pack(INDEX_MAGIC, count, offset))
+            key_pos = 0
+            for key, line_offset, length in sorted_records:
+                f.write(RECORD.pack(key_pos, len(key), line_offset, length))
+                keys_f.write(key)
+                key_pos += len(key)
+            keys_f.seek(0)
+            shutil.copyfileobj(keys_f, f, 1024 * 1024)
+    tmp_path.replace(out_path)
+    logger.info(f"Indexed {count} entries of {jsonl_path}")
+    return count
+
+
+class JsonlIndex:
+    """Finds the entries of the JSON lines file ``jsonl_path`` using its
+    index file, by default "<jsonl_path>.idx".  Raises ValueError if the
+    index doesn't match the file."""
+
+    __slots__ = ("files", "data", "index", "count", "keys_start")
+
+    def __init__(
+        self,
+        jsonl_path: Union[str, Path],
+        idx_path: Optional[Path] = None,
+    ):
+        if idx_path is None:
+            idx_path = index_path(jsonl_path)
+        self.files = [open(jsonl_path, "rb"), open(idx_path, "rb")]
+        try:
+            self.index = mmap.mmap(
+                self.files[1].fileno(), 0, access=mmap.ACCESS_READ
+            )
+            magic, self.count, size = HEADER.unpack_from(self.index)
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{idx_path} is not an index file")
+            if size != Path(jsonl_path).stat().st_size:
+                raise ValueError(f"{idx_path} is not up to date")
+            # Empty files can't be mapped
+            self.data = (
+                mmap.mmap(self.files[0].fileno(), 0, access=mmap.ACCESS_READ)
+                if size > 0
+                else b""
+            )
+        except Exception:
+            self.close()
+            raise
+        self.keys_start = HEADER.size + self.count * RECORD.size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "JsonlIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for m in (getattr(self, "data", None), getattr(self, "index", None)):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in self.files:
+            f.close()
+
+    def record(self, i: int) -> tuple[bytes, int, int]:
+        key_pos, key_len, offset, length = RECORD.unpack_from(
+            self.index, HEADER.size + i * RECORD.size
+        )
+        start = self.keys_start + key_pos
+        return self.index[start : start + key_len], offset, length
+
+    def lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.record(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(
+        self,
+        word: str,
+        lang_code: Optional[str] = None,
+        pos: Optional[str] = None,
+    ) -> Iterator[tuple[int, int]]:
+        """Yields the offset and length of the lines of the entries of
+        ``word``, optionally only those with ``lang_code`` and ``pos``."""
+        parts = [word]
+        if lang_code is not None:
+            parts.append(lang_code)
+            if pos is not None:
+                parts.append(pos)
+        prefix = "\0".join(parts).encode("utf-8")
+        complete = len(parts) == 3
+        if not complete:
+            prefix += b"\0"
+        i = self.lower_bound(prefix)
+        while i < self.count:
+            key, offset, length = self.record(i)
+            if key != prefix and (complete or not key.startswith(prefix)):
+                break
+            if pos is None or key.rsplit(b"\0", 1)[1] == pos.encode("utf-8"):
+                yield offset, length
+            i += 1
+
+    def lookup(
+        self,
+        word: str,
+        lang_code: Optional[str] = None,
+        pos: Optional[str] = None,
+    ) -> list[dict]:
+        """Returns the entries of ``word``, optionally only those with
+        ``lang_code`` and ``pos``, in the order of the output file."""
+        return [
+            loads(self.data[offset : offset + length])
+            for offset, length in sorted(self.find(word, lang_code, pos))
+        ]
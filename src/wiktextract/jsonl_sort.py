@@ -0,0 +1,199 @@
+# Sorts a JSON lines output file by fields of the entries, e.g., language
+# code, word and part of speech, with bounded memory.
+#
+# The file is split into byte ranges that fit in the memory budget, which
+# are sorted into run files in parallel, and the runs are then merged.  The
+# sort is stable: entries with the same key stay in the order of the input
+# file.  The lines are written unchanged.
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import struct
+import tempfile
+from operator import itemgetter
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .jsonl_diff import chunk_lines, split_chunks
+from .jsonl_index import loads
+from .wxr_logging import logger
+
+DEFAULT_SORT_FIELDS = ("lang_code", "word", "pos")
+DEFAULT_MEMORY_MB = 1024
+# Python objects of the lines being sorted take about twice the size of
+# the lines
+MEMORY_PER_BYTE = 2
+# Runs merged at once, more runs are merged in several passes
+MAX_MERGE_RUNS = 256
+
+LENGTH = struct.Struct("<I")
+
+
+def sort_key(data: dict, fields: tuple[str, ...]) -> bytes:
+    parts = []
+    for name in fields:
+        value = data.get(name)
+        if value is None and name == "word":
+            # Hard redirects have a title instead of a word
+            value = data.get("title")
+        if value is None:
+            value = ""
+        elif isinstance(value, int) and not isinstance(value, bool):
+            # Non-negative numbers sort by value, e.g., etymology_number
+            value = f"{value:020d}"
+        elif not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False, sort_keys=True)
+        parts.append(value)
+    # NUL sorts before any other character, so shorter values come first
+    return "\0".join(parts).encode("utf-8")
+
+
+def write_run(path: Path, items: Iterator[tuple[bytes, bytes]]) -> None:
+    with path.open("wb", buffering=1024 * 1024) as f:
+        for key, line in items:
+            f.write(LENGTH.pack(len(key)) + key)
+            f.write(LENGTH.pack(len(line)) + line)
+
+
+def read_run(path: Path) -> Iterator[tuple[bytes, bytes]]:
+    with path.open("rb", buffering=1024 * 1024) as f:
+        while True:
+            header = f.read(LENGTH.size)
+            if not header:
+                return
+            key = f.read(LENGTH.unpack(header)[0])
+            line = f.read(LENGTH.unpack(f.read(LENGTH.size))[0])
+            if not line.endswith(b"\n"):
+                # The last line of the input file
+                line += b"\n"
+            yield key, line
+
+
+def sort_chunk(
+    path: Path, start: int, end: int, fields: tuple[str, ...], run_path: Path
+) -> int:
+    """Sorts the lines that start in the byte range [start, end) of
+    ``path`` into the run file ``run_path`` and returns their number."""
+    items = [
+        (sort_key(loads(line), fields), line)
+        for line in chunk_lines(path, start, end)
+    ]
+    # Stable, only compares the keys
+    items.sort(key=itemgetter(0))
+    write_run(run_path, iter(items))
+    return len(items)
+
+
+def merge_runs(run_paths: list[Path]) -> Iterator[tuple[bytes, bytes]]:
+    # heapq.merge() is stable, entries with the same key come from the
+    # runs in the order of ``run_paths``
+    return heapq.merge(*map(read_run, run_paths), key=itemgetter(0))
+
+
+def sort_file(
+    in_path: Path,
+    out_path: Path,
+    fields: tuple[str, ...] = DEFAULT_SORT_FIELDS,
+    memory_mb: int = DEFAULT_MEMORY_MB,
+    num_processes: Optional[int] = None,
+    tmp_dir: Optional[str] = None,
+) -> int:
+    """Sorts the JSON lines file ``in_path``, which must have one entry
+    per line, by the values of ``fields`` into ``out_path``, using about
+    ``memory_mb`` megabytes of memory for sorting.  Returns the number of
+    entries."""
+    num_processes = num_processes or os.cpu_count() or 1
+    chunk_size = max(
+        1, memory_mb * 1024 * 1024 // num_processes // MEMORY_PER_BYTE
+    )
+    size = in_path.stat().st_size
+    chunks = split_chunks(in_path, max(1, -(-size // chunk_size)))
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        tmp_path = Path(tmp)
+        run_paths = [tmp_path / f"run.{i}" for i in range(len(chunks))]
+        logger.info(f"Sorting {in_path} into {len(chunks)} runs")
+        with multiprocessing.Pool(min(num_processes, len(chunks) or 1)) as pool:
+            count = sum(
+                pool.starmap(
+                    sort_chunk,
+                    [
+                        (in_path, start, end, fields, run_path)
+                        for (start, end), run_path in zip(chunks, run_paths)
+                    ],
+                )
+            )
+        merge_pass = 0
+        while len(run_paths) > MAX_MERGE_RUNS:
+            logger.info(f"Merging {len(run_paths)} runs")
+            merged_paths = []
+            for i in range(0, len(run_paths), MAX_MERGE_RUNS):
+                merged_path = tmp_path / f"merged.{merge_pass}.{i}"
+                group = run_paths[i : i + MAX_MERGE_RUNS]
+                write_run(merged_path, merge_runs(group))
+                for run_path in group:
+                    run_path.unlink()
+                merged_paths.append(merged_path)
+            run_paths = merged_paths
+            merge_pass += 1
+        logger.info(f"Merging {len(run_paths)} runs into {out_path}")
+        out_tmp_path = out_path.with_name(out_path.name + ".tmp")
+        with out_tmp_path.open("wb", buffering=1024 * 1024) as out_f:
+            for _, line in merge_runs(run_paths):
+                out_f.write(line)
+        out_tmp_path.replace(out_path)
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Sort a wiktextract JSON lines output file with "
+        "bounded memory",
+    )
+    parser.add_argument("input", type=str, help="Output file to sort")
+    parser.add_argument("output", type=str, help="Sorted file")
+    parser.add_argument(
+        "--keys",
+        type=str,
+        default=",".join(DEFAULT_SORT_FIELDS),
+        help="Comma-separated fields to sort by, defaults to "
+        f"{','.join(DEFAULT_SORT_FIELDS)}",
+    )
+    parser.add_argument(
+        "--memory",
+        type=int,
+        default=DEFAULT_MEMORY_MB,
+        metavar="MB",
+        help="Memory used for sorting, in megabytes, defaults to "
+        f"{DEFAULT_MEMORY_MB}",
+    )
+    parser.add_argument(
+        "--num-processes",
+        type=int,
+        default=None,
+        help="Number of processes sorting the runs, defaults to the "
+        "number of CPUs",
+    )
+    parser.add_argument(
+        "--tmp-dir",
+        type=str,
+        default=None,
+        help="Directory for the sorted runs, which take as much space as "
+        "the input file",
+    )
+    args = parser.parse_args()
+    fields = tuple(
+        name.strip() for name in args.keys.split(",") if name.strip()
+    )
+    if not fields:
+        parser.error("--keys needs at least one field")
+    count = sort_file(
+        Path(args.input),
+        Path(args.output),
+        fields,
+        args.memory,
+        args.num_processes,
+        args.tmp_dir,
+    )
+    logger.info(f"Sorted {count} entries")
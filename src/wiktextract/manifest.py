@@ -0,0 +1,361 @@
+# Manifest of the output file of an extraction run, used to re-extract only
+# the pages that changed between two dump versions.
+#
+# For every processed page the manifest stores a hash of the page, the
+# location of the page's data in the output file and the set of pages
+# (templates, modules, ...) looked up while extracting it, together with a
+# hash of each of those pages.  A later run on a newer dump copies the data
+# of a page from the previous output if neither the page nor any of the
+# pages it depends on has changed.
+import hashlib
+import importlib.metadata
+import json
+import sqlite3
+from array import array
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Optional
+
+from wikitextprocessor import Wtp
+
+from .wxr_context import WiktextractContext
+from .wxr_logging import logger
+
+# (title, namespace_id) as passed to `Wtp.get_page()`
+Dependency = tuple[str, Optional[int]]
+
+# Pages looked up by the worker process since the last
+# `pop_dependencies()` call
+_dependencies: set[Dependency] = set()
+
+WIKTIONARY_CONFIG_CAPTURE_FIELDS = (
+    "capture_translations",
+    "capture_pronunciation",
+    "capture_linkages",
+    "capture_compounds",
+    "capture_redirects",
+    "capture_examples",
+    "capture_etymologies",
+    "capture_inflections",
+    "capture_descendants",
+)
+
+
+class DependencyRecordingWtp(Wtp):
+    """Wtp that remembers the pages it looks up.  The class of the worker's
+    Wtp object is changed to this by `record_dependencies()`."""
+
+    __slots__ = ()
+
+    def get_page(self, title, namespace_id=None, *args, **kwargs):
+        _dependencies.add((title, namespace_id))
+        return super().get_page(title, namespace_id, *args, **kwargs)
+
+    def get_page_body(self, title, namespace_id, *args, **kwargs):
+        _dependencies.add((title, namespace_id))
+        return super().get_page_body(title, namespace_id, *args, **kwargs)
+
+
+def record_dependencies(wxr: WiktextractContext) -> None:
+    wxr.wtp.__class__ = DependencyRecordingWtp
+
+
+def recording_dependencies(wxr: WiktextractContext) -> bool:
+    return isinstance(wxr.wtp, DependencyRecordingWtp)
+
+
+def add_dependencies(
+    wxr: WiktextractContext, deps: Iterable[Dependency]
+) -> None:
+    """Records pages that the extracted data depends on but that are not
+    looked up through the Wtp, e.g., the thesaurus pages of the linkages
+    added from the thesaurus database."""
+    if recording_dependencies(wxr):
+        _dependencies.update(deps)
+
+
+def pop_dependencies() -> list[Dependency]:
+    deps = list(_dependencies)
+    _dependencies.clear()
+    return deps
+
+
+def hash_page(body: Optional[str], redirect_to: Optional[str]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update((redirect_to or "").encode("utf-8"))
+    h.update(b"\0")
+    h.update((body or "").encode("utf-8"))
+    return h.hexdigest()
+
+
+def hash_dependency(wxr: WiktextractContext, dep: Dependency) -> str:
+    """Hashes a page looked up during extraction as the current database
+    returns it.  Pages that don't exist have an empty hash."""
+    page = wxr.wtp.get_page(*dep)
+    if page is None:
+        return ""
+    return hash_page(page.body, page.redirect_to)
+
+
+def normalize_dependency(
+    wxr: WiktextractContext, dep: Dependency
+) -> tuple[str, Optional[int]]:
+    """Returns the full title (with the namespace prefix, first letter of
+    the name in uppercase, underscores as spaces) and namespace id of a
+    dependency."""
+    title, namespace_id = dep
+    title = title.replace("_", " ").strip()
+    prefix, sep, name = title.partition(":")
+    lower_prefix = prefix.strip().lower()
+    for ns_name, ns_data in wxr.wtp.NAMESPACE_DATA.items():
+        if sep and lower_prefix in (
+            n.lower() for n in (ns_name, ns_data["name"], *ns_data["aliases"])
+        ):
+            prefix, name = ns_data["name"], name.strip()
+            namespace_id = ns_data["id"]
+            break
+        if ns_data["id"] == namespace_id and namespace_id != 0:
+            prefix, name = ns_data["name"], title
+            break
+    else:
+        return title[:1].upper() + title[1:], namespace_id
+    return f"{prefix}:{name[:1].upper()}{name[1:]}", namespace_id
+
+
+def extractor_version() -> str:
+    try:
+        return importlib.metadata.version("wiktextract")
+    except importlib.metadata.PackageNotFoundError:
+        return ""
+
+
+def manifest_config(wxr: WiktextractContext) -> str:
+    """Returns the extractor version and the settings that affect the
+    extracted data.  Data is only reused from a run with the same value."""
+    config = wxr.config
+    settings = {
+        "version": extractor_version(),
+        "dump_file_lang_code": config.dump_file_lang_code,
+        "capture_language_codes": sorted(config.capture_language_codes or []),
+        "capture": [
+            getattr(config, name) for name in WIKTIONARY_CONFIG_CAPTURE_FIELDS
+        ],
+        "extract_thesaurus_pages": config.extract_thesaurus_pages,
+    }
+    if config.projection is not None:
+        # Only added when set, manifests without it still match
+        settings["projection"] = str(config.projection)
+    if config.compact_json:
+        settings["compact_json"] = True
+    return json.dumps(settings, sort_keys=True)
+
+
+class Manifest:
+    """Manifest stored in the SQLite file ``path`` describing the output
+    file ``out_path``."""
+
+    __slots__ = (
+        "path",
+        "out_path",
+        "conn",
+        "dep_ids",
+        "dep_set_ids",
+        "dep_sets",
+    )
+
+    def __init__(self, path: Path, out_path: Path):
+        self.path = path
+        self.out_path = out_path
+        self.conn: Optional[sqlite3.Connection] = None
+        # Dependency -> id in the `deps` table
+        self.dep_ids: dict[Dependency, int] = {}
+        # Sorted tuple of dependency ids -> id in the `dep_sets` table
+        self.dep_set_ids: dict[tuple[int, ...], int] = {}
+        # Dependency set id -> dependencies, read from a previous manifest
+        self.dep_sets: dict[int, list[Dependency]] = {}
+
+    def open(self) -> sqlite3.Connection:
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS deps (
+            id INTEGER PRIMARY KEY,
+            title TEXT,
+            namespace_id INTEGER,
+            hash TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS dep_sets (
+            id INTEGER PRIMARY KEY,
+            deps BLOB  -- array of `deps` ids
+            );
+
+            CREATE TABLE IF NOT EXISTS pages (
+            title TEXT,
+            namespace_id INTEGER,
+            hash TEXT,
+            offset INTEGER,  -- of the page's data in the output file
+            length INTEGER,
+            dep_set_id INTEGER,
+            PRIMARY KEY(title, namespace_id)
+            );
+            """
+        )
+        return self.conn
+
+    def start(
+        self, wxr: WiktextractContext, resume_offset: Optional[int] = None
+    ) -> None:
+        """Creates a new manifest, or if ``resume_offset`` is given,
+        continues the existing one, forgetting the pages whose data is not
+        before that offset in the output file."""
+        if resume_offset is None:
+            self.path.unlink(True)
+        conn = self.open()
+        conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES('config', ?)",
+            (manifest_config(wxr),),
+        )
+        if resume_offset is not None:
+            conn.execute(
+                "DELETE FROM pages WHERE offset + length > ?",
+                (resume_offset,),
+            )
+            for dep_id, title, namespace_id in conn.execute(
+                "SELECT id, title, namespace_id FROM deps"
+            ):
+                self.dep_ids[(title, namespace_id)] = dep_id
+            for dep_set_id, deps in conn.execute(
+                "SELECT id, deps FROM dep_sets"
+            ):
+                self.dep_set_ids[tuple(array("i", deps))] = dep_set_id
+        conn.commit()
+
+    def add_page(
+        self,
+        wxr: WiktextractContext,
+        key: tuple[str, int],
+        page_hash: str,
+        offset: int,
+        length: int,
+        deps: list[Dependency],
+    ) -> None:
+        assert self.conn is not None
+        dep_ids = []
+        for dep in deps:
+            dep_id = self.dep_ids.get(dep)
+            if dep_id is None:
+                dep_id = self.conn.execute(
+                    "INSERT INTO deps (title, namespace_id, hash) "
+                    "VALUES(?, ?, ?)",
+                    (*dep, hash_dependency(wxr, dep)),
+                ).lastrowid
+                self.dep_ids[dep] = dep_id  # type:ignore[assignment]
+            dep_ids.append(dep_id)
+        dep_set = tuple(sorted(dep_ids))
+        dep_set_id = self.dep_set_ids.get(dep_set)
+        if dep_set_id is None:
+            dep_set_id = self.conn.execute(
+                "INSERT INTO dep_sets (deps) VALUES(?)",
+                (array("i", dep_set).tobytes(),),
+            ).lastrowid
+            self.dep_set_ids[dep_set] = dep_set_id  # type:ignore[assignment]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages VALUES(?, ?, ?, ?, ?, ?)",
+            (*key, page_hash, offset, length, dep_set_id),
+        )
+
+    def commit(self) -> None:
+        if self.conn is not None:
+            self.conn.commit()
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def matches_config(self, wxr: WiktextractContext) -> bool:
+        assert self.conn is not None
+        for (value,) in self.conn.execute(
+            "SELECT value FROM meta WHERE key = 'config'"
+        ):
+            return value == manifest_config(wxr)
+        return False
+
+    def changed_dep_sets(self, wxr: WiktextractContext) -> set[int]:
+        """Returns the ids of the dependency sets that contain a page that
+        has changed in the current database."""
+        assert self.conn is not None
+        changed_deps = set()
+        for dep_id, title, namespace_id, dep_hash in self.conn.execute(
+            "SELECT id, title, namespace_id, hash FROM deps"
+        ):
+            if hash_dependency(wxr, (title, namespace_id)) != dep_hash:
+                changed_deps.add(dep_id)
+        logger.info(f"{len(changed_deps)} dependency pages have changed")
+        return {
+            dep_set_id
+            for dep_set_id, deps in self.conn.execute(
+                "SELECT id, deps FROM dep_sets"
+            )
+            if not changed_deps.isdisjoint(array("i", deps))
+        }
+
+    def dependent_dep_sets(
+        self, wxr: WiktextractContext, titles: list[str]
+    ) -> set[int]:
+        """Returns the ids of the dependency sets that contain one of the
+        pages with the given titles, e.g., "Template:en-noun"."""
+        assert self.conn is not None
+        targets = {normalize_dependency(wxr, (t, None))[0] for t in titles}
+        dep_ids = {
+            dep_id
+            for dep_id, title, namespace_id in self.conn.execute(
+                "SELECT id, title, namespace_id FROM deps"
+            )
+            if normalize_dependency(wxr, (title, namespace_id))[0] in targets
+        }
+        return {
+            dep_set_id
+            for dep_set_id, deps in self.conn.execute(
+                "SELECT id, deps FROM dep_sets"
+            )
+            if not dep_ids.isdisjoint(array("i", deps))
+        }
+
+    def dependencies(self, dep_set_id: int) -> list[Dependency]:
+        assert self.conn is not None
+        if not self.dep_sets:
+            deps = {
+                dep_id: (title, namespace_id)
+                for dep_id, title, namespace_id in self.conn.execute(
+                    "SELECT id, title, namespace_id FROM deps"
+                )
+            }
+            for set_id, dep_ids in self.conn.execute(
+                "SELECT id, deps FROM dep_sets"
+            ):
+                self.dep_sets[set_id] = [
+                    deps[dep_id] for dep_id in array("i", dep_ids)
+                ]
+        return self.dep_sets.get(dep_set_id, [])
+
+    def lookup_page(
+        self, key: tuple[str, int]
+    ) -> Optional[tuple[str, int, int, int]]:
+        """Returns the hash, output offset, output length and dependency set
+        id of a page."""
+        assert self.conn is not None
+        for r in self.conn.execute(
+            "SELECT hash, offset, length, dep_set_id FROM pages "
+            "WHERE title = ? AND namespace_id = ?",
+            key,
+        ):
+            return r
+        return None
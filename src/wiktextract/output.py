@@ -0,0 +1,382 @@
+# Serialization of the extracted data and writing of the output file,
+# optionally compressed.
+#
+# The data is encoded with the json module's default separators, unless
+# --compact-json selects lines without spaces after "," and ":", which are
+# encoded with orjson if it is installed.  The output only depends on the
+# options: both encoders write the same bytes.
+import io
+import json
+import lzma
+import os
+import queue
+import re
+import threading
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Optional, TextIO, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+# Number of pages whose data may wait for the writer thread before the
+# parent process blocks
+MAX_QUEUED_PAGES = 256
+
+# Uncompressed size of the blocks that are compressed in parallel, each
+# block is a complete gzip member, xz stream or zstd frame
+COMPRESS_BLOCK_SIZE = 8 * 1024 * 1024
+MAX_COMPRESS_THREADS = 8
+
+
+def json_text_stdlib(
+    data: Any, human_readable: bool, compact: bool = False
+) -> str:
+    if human_readable:
+        text = json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False)
+    elif compact:
+        # Same as orjson
+        text = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    else:
+        text = json.dumps(data, ensure_ascii=False)
+    return text + "\n"
+
+
+def encode_json_stdlib(
+    data: Any, human_readable: bool, compact: bool = False
+) -> bytes:
+    return json_text_stdlib(data, human_readable, compact).encode("utf-8")
+
+
+def encode_json_orjson(data: Any, human_readable: bool) -> bytes:
+    option = orjson.OPT_APPEND_NEWLINE
+    if human_readable:
+        option |= orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+    try:
+        return orjson.dumps(data, option=option)
+    except orjson.JSONEncodeError:
+        # E.g., integers over 64 bits or dictionary keys that are not
+        # strings, which the json module accepts
+        return encode_json_stdlib(data, human_readable, True)
+
+
+def json_text_orjson(data: Any, human_readable: bool) -> str:
+    return encode_json_orjson(data, human_readable).decode("utf-8")
+
+
+# Set by `set_compact_json()`
+compact_json = False
+
+
+def set_compact_json(compact: bool) -> None:
+    global compact_json
+    compact_json = compact
+
+
+def encode_json(data: Any, human_readable: bool) -> bytes:
+    """Returns the JSON text of ``data`` followed by a newline, encoded in
+    UTF-8."""
+    if compact_json and orjson is not None:
+        return encode_json_orjson(data, human_readable)
+    return encode_json_stdlib(data, human_readable, compact_json)
+
+
+def json_text(data: Any, human_readable: bool) -> str:
+    """Like `encode_json()`, but returns a string for text files."""
+    if compact_json and orjson is not None:
+        return json_text_orjson(data, human_readable)
+    return json_text_stdlib(data, human_readable, compact_json)
+
+
+class OutputWriter:
+    """Writes UTF-8 encoded data to ``out_f`` from a background thread.
+    Nothing else may write to ``out_f`` until ``close()`` is called, and
+    ``offset`` is the position in the file after the data written so
+    far."""
+
+    __slots__ = ("out_f", "offset", "queue", "thread", "error")
+
+    def __init__(self, out_f: TextIO, max_queued: int = MAX_QUEUED_PAGES):
+        out_f.flush()
+        self.out_f = out_f
+        # Pipes and compressed files have no position, the offset is
+        # only used for manifests, which need an uncompressed file.
+        self.offset = out_f.tell() if out_f.seekable() else 0
+        self.queue: queue.Queue[Optional[bytes]] = queue.Queue(max_queued)
+        self.error: Optional[Exception] = None
+        self.thread = threading.Thread(
+            target=self.run, name="output-writer", daemon=True
+        )
+        self.thread.start()
+
+    def run(self) -> None:
+        # Text files (e.g., io.StringIO in tests) have no binary buffer
+        buffer = getattr(self.out_f, "buffer", None)
+        while True:
+            data = self.queue.get()
+            try:
+                if data is None:
+                    return
+                if self.error is None:
+                    if buffer is not None:
+                        buffer.write(data)
+                    else:
+                        self.out_f.write(data.decode("utf-8"))
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def check_error(self) -> None:
+        if self.error is not None:
+            raise self.error
+
+    def write(self, data: bytes) -> None:
+        self.check_error()
+        self.offset += len(data)
+        self.queue.put(data)
+
+    def flush(self) -> None:
+        """Waits until the queued data has been written and flushes the
+        output file."""
+        self.queue.join()
+        self.check_error()
+        self.out_f.flush()
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+        self.check_error()
+        self.out_f.flush()
+
+
+def compress_gzip(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_xz(data: bytes) -> bytes:
+    return lzma.compress(data, lzma.FORMAT_XZ)
+
+
+def compress_zstd(data: bytes) -> bytes:
+    import zstandard  # type: ignore[import-not-found]
+
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+COMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+    ".gz": compress_gzip,
+    ".xz": compress_xz,
+    ".zst": compress_zstd,
+}
+
+
+def output_compression(path: str) -> Optional[str]:
+    """Returns the compression suffix of an output path, or None if the
+    output is not compressed."""
+    for suffix in COMPRESSORS:
+        if path.endswith(suffix):
+            return suffix
+    return None
+
+
+class BlockCompressingFile(io.BufferedIOBase):
+    """Binary file that compresses the data written to it in blocks, in
+    several threads, and writes the compressed blocks to ``raw`` in order.
+    The concatenated blocks are a valid compressed file."""
+
+    def __init__(
+        self,
+        raw: BinaryIO,
+        compress: Callable[[bytes], bytes],
+        num_threads: Optional[int] = None,
+        block_size: int = COMPRESS_BLOCK_SIZE,
+    ):
+        super().__init__()
+        self.raw = raw
+        self.compress = compress
+        self.block_size = block_size
+        self.num_threads = num_threads or min(
+            os.cpu_count() or 1, MAX_COMPRESS_THREADS
+        )
+        self.pool = ThreadPoolExecutor(
+            self.num_threads, thread_name_prefix="compress"
+        )
+        self.block = bytearray()
+        self.pending: deque[Future[bytes]] = deque()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[override]
+        if self.closed:
+            raise ValueError("write to closed file")
+        self.block += data
+        if len(self.block) >= self.block_size:
+            self.submit_block()
+            # Limit the memory used by blocks waiting to be written
+            while len(self.pending) > 2 * self.num_threads:
+                self.raw.write(self.pending.popleft().result())
+        return len(data)
+
+    def submit_block(self) -> None:
+        if self.block:
+            self.pending.append(
+                self.pool.submit(self.compress, bytes(self.block))
+            )
+            self.block = bytearray()
+
+    def flush(self) -> None:
+        if self.closed:
+            return
+        self.submit_block()
+        while self.pending:
+            self.raw.write(self.pending.popleft().result())
+        self.raw.flush()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            # Flushes the remaining data
+            super().close()
+        finally:
+            self.pool.shutdown()
+            self.raw.close()
+
+
+def open_output(path: str, append: bool = False) -> TextIO:
+    """Opens an output file for writing UTF-8 text.  If the path ends in
+    ".gz", ".xz" or ".zst", the data is compressed (".zst" needs the
+    zstandard package).  ``path`` may have a further suffix, e.g., ".tmp",
+    after the compression suffix."""
+    compression = output_compression(path.removesuffix(".tmp"))
+    if compression is None:
+        return open(
+            path,
+            "a" if append else "w",
+            buffering=1024 * 1024,
+            encoding="utf-8",
+        )
+    if compression == ".zst":
+        # Fail before processing any pages if zstandard is not installed
+        import zstandard  # type: ignore[import-not-found]  # noqa: F401
+    raw = open(path, "ab" if append else "wb")
+    return io.TextIOWrapper(
+        BlockCompressingFile(raw, COMPRESSORS[compression]),
+        encoding="utf-8",
+    )
+
+
+# Open partition files of a PartitionedOutput; the least recently used
+# file is closed when another one is needed
+MAX_OPEN_PARTITIONS = 64
+
+
+class EntryOutput:
+    """Output that takes the extracted entries as dictionaries instead of
+    text, passed as ``out_f`` to `reprocess_wiktionary()`.  It can't be
+    used with checkpoints, manifests or serialization in the workers."""
+
+    __slots__ = ()
+
+    def write_entry(self, data: dict, human_readable: bool) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+
+class PartitionedOutput(EntryOutput):
+    """Writes each entry to a JSON lines file in ``out_dir`` chosen by its
+    language code, e.g., "en.jsonl", or if ``by_pos`` is True, by its
+    language code and part of speech, e.g., "en/noun.jsonl".  Entries
+    without a language code, e.g., redirects, go to "_unknown.jsonl".
+    ``close()`` writes "manifest.json" with the number of entries and size
+    of each file."""
+
+    __slots__ = ("out_dir", "by_pos", "max_open", "files", "partitions")
+
+    def __init__(
+        self,
+        out_dir: Path,
+        by_pos: bool = False,
+        max_open: int = MAX_OPEN_PARTITIONS,
+    ):
+        self.out_dir = out_dir
+        self.by_pos = by_pos
+        self.max_open = max_open
+        # Relative path -> open file, in the order of last use
+        self.files: OrderedDict[str, BinaryIO] = OrderedDict()
+        # Relative path -> manifest record of the partition
+        self.partitions: dict[str, dict[str, Any]] = {}
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    def partition_path(self, data: dict) -> str:
+        lang_code = data.get("lang_code")
+        if not isinstance(lang_code, str) or lang_code == "":
+            return "_unknown.jsonl"
+        path = safe_file_name(lang_code)
+        if self.by_pos:
+            pos = data.get("pos")
+            if not isinstance(pos, str) or pos == "":
+                pos = "_unknown"
+            path += "/" + safe_file_name(pos)
+        return path + ".jsonl"
+
+    def write_entry(self, data: dict, human_readable: bool) -> None:
+        path = self.partition_path(data)
+        f = self.files.get(path)
+        if f is not None:
+            self.files.move_to_end(path)
+        else:
+            if len(self.files) >= self.max_open:
+                self.files.popitem(last=False)[1].close()
+            file_path = self.out_dir / path
+            if path in self.partitions:
+                # Reopened after it was closed to open another file
+                f = file_path.open("ab")
+            else:
+                file_path.parent.mkdir(exist_ok=True)
+                f = file_path.open("wb")
+                self.partitions[path] = {"path": path, "entries": 0, "bytes": 0}
+            self.files[path] = f
+        encoded = encode_json(data, human_readable)
+        f.write(encoded)
+        record = self.partitions[path]
+        record["entries"] += 1
+        record["bytes"] += len(encoded)
+
+    def close(self) -> None:
+        for f in self.files.values():
+            f.close()
+        self.files.clear()
+        manifest_path = self.out_dir / "manifest.json"
+        with manifest_path.open("w", encoding="utf-8") as manifest_f:
+            json.dump(
+                {
+                    "partition_by": ["lang_code", "pos"]
+                    if self.by_pos
+                    else ["lang_code"],
+                    "partitions": sorted(
+                        self.partitions.values(), key=lambda r: r["path"]
+                    ),
+                },
+                manifest_f,
+                indent=2,
+                sort_keys=True,
+                ensure_ascii=False,
+            )
+
+
+def safe_file_name(name: str) -> str:
+    return re.sub(r"[^\w.-]|^\.", "_", name)
+
+
+# Where the extracted data is written
+OutputFile = Union[TextIO, EntryOutput]
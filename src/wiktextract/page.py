@@ -162,7 +162,7 @@ def recursively_extract(
 
 def inject_linkages(wxr: WiktextractContext, page_data: list[dict]) -> None:
     # Inject linkages from thesaurus entries
-    from .thesaurus import search_thesaurus
+    from .thesaurus import find_thesaurus_terms
 
     local_thesaurus_ns = wxr.wtp.NAMESPACE_DATA.get("Thesaurus", {}).get("name")  # type: ignore[call-overload]
     for data in page_data:
@@ -171,8 +171,8 @@ def inject_linkages(wxr: WiktextractContext, page_data: list[dict]) -> None:
         word = data["word"]
         lang_code = data["lang_code"]
         pos = data["pos"]
-        for term in search_thesaurus(
-            wxr.thesaurus_db_conn,  # type:ignore[arg-type]
+        for term in find_thesaurus_terms(
+            wxr,
             word,
             lang_code,
             pos,  # type: ignore[arg-type]
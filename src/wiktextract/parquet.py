@@ -0,0 +1,187 @@
+# Parquet output of the extracted entries, written one row group at a time
+# while the pages are processed.  Needs the pyarrow package.
+#
+# The schema is derived from the data model of the edition: `WordEntry` in
+# extractor/<lang>/models.py, or `WordData` in type_utils.py for the
+# editions without one.  Lists of objects become lists of structs, and the
+# short strings that repeat a lot (tags, language codes, ...) are
+# dictionary encoded.  Values that can't be represented in the schema, like
+# template arguments and recursive descendant trees, are stored as JSON
+# text, and fields that are not in the data model are not written.
+import collections.abc
+import importlib
+import json
+import os
+import typing
+from pathlib import Path
+from typing import Any, Union
+
+import pyarrow as pa  # type: ignore[import-not-found]
+import pyarrow.parquet as pq  # type: ignore[import-not-found]
+from pydantic import BaseModel
+
+from .output import EntryOutput
+from .type_utils import WordData
+
+# Entries are written in row groups of this many entries
+ROW_GROUP_SIZE = 10000
+
+# String fields stored with dictionary encoding, at any level
+DICTIONARY_FIELDS = {
+    "categories",
+    "code",
+    "lang",
+    "lang_code",
+    "pos",
+    "raw_tags",
+    "source",
+    "tags",
+    "topics",
+}
+
+# Top-level fields of the entries that are not in the data models: hard
+# redirects written by `page_handler()` and the source of the entries
+# emitted from the thesaurus
+EXTRA_FIELDS = {"title": str, "redirect": str, "source": str}
+
+DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+
+def word_model(lang_code: str) -> type:
+    """Returns the data model of the entries of the ``lang_code`` edition."""
+    try:
+        module = importlib.import_module(
+            f"wiktextract.extractor.{lang_code}.models"
+        )
+    except ModuleNotFoundError:
+        return WordData
+    return module.WordEntry
+
+
+def model_fields(model: type) -> dict[str, Any]:
+    """Returns the names and types of the fields of a TypedDict or a
+    pydantic model."""
+    if issubclass(model, BaseModel):
+        return {
+            name: field.annotation
+            for name, field in model.model_fields.items()
+            if not field.exclude
+        }
+    return typing.get_type_hints(model)
+
+
+def is_model(tp: Any) -> bool:
+    return isinstance(tp, type) and (
+        issubclass(tp, BaseModel)
+        # TypedDict
+        or (issubclass(tp, dict) and hasattr(tp, "__total__"))
+    )
+
+
+def arrow_type(tp: Any, name: str, parents: tuple[type, ...] = ()):
+    """Returns the Arrow type of the field ``name`` with the type ``tp``
+    in the data model.  ``parents`` are the models containing the field."""
+    origin = typing.get_origin(tp)
+    args = [a for a in typing.get_args(tp) if a is not type(None)]
+    if tp is str or origin is typing.Literal:
+        return DICTIONARY_STRING if name in DICTIONARY_FIELDS else pa.string()
+    if tp is bool:
+        return pa.bool_()
+    if tp is int:
+        return pa.int64()
+    if tp is float:
+        return pa.float64()
+    if origin is Union and args:
+        return arrow_type(args[0], name, parents)
+    if origin in (list, tuple, collections.abc.Sequence):
+        return pa.list_(arrow_type(args[0] if args else str, name, parents))
+    if is_model(tp) and tp not in parents:
+        return pa.struct(
+            [
+                pa.field(n, arrow_type(t, n, parents + (tp,)))
+                for n, t in model_fields(tp).items()
+            ]
+        )
+    # Dictionaries and recursive models
+    return pa.string()
+
+
+def entry_schema(lang_code: str):
+    model = word_model(lang_code)
+    fields = dict(model_fields(model))
+    for name, tp in EXTRA_FIELDS.items():
+        fields.setdefault(name, tp)
+    return pa.schema(
+        [pa.field(n, arrow_type(t, n, (model,))) for n, t in fields.items()]
+    )
+
+
+def column_value(value: Any, typ) -> Any:
+    """Converts a value of an entry to the Arrow type ``typ``, or None if
+    it has the wrong type."""
+    if value is None:
+        return None
+    if pa.types.is_struct(typ):
+        if not isinstance(value, dict):
+            return None
+        return {f.name: column_value(value.get(f.name), f.type) for f in typ}
+    if pa.types.is_list(typ):
+        if not isinstance(value, (list, tuple)):
+            return None
+        return [column_value(v, typ.value_type) for v in value]
+    if pa.types.is_string(typ) or pa.types.is_dictionary(typ):
+        if isinstance(value, str):
+            return value
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    if pa.types.is_boolean(typ):
+        return value if isinstance(value, bool) else None
+    if pa.types.is_integer(typ):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        return None
+    if pa.types.is_floating(typ):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return None
+    return None
+
+
+class ParquetOutput(EntryOutput):
+    """Writes the entries to the Parquet file ``path``.  The file is
+    written under a temporary name and renamed when closed."""
+
+    __slots__ = ("path", "tmp_path", "schema", "writer", "rows")
+
+    def __init__(self, path: Path, lang_code: str):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.schema = entry_schema(lang_code)
+        self.writer = pq.ParquetWriter(
+            self.tmp_path, self.schema, compression="zstd"
+        )
+        self.rows: list[dict[str, Any]] = []
+
+    def write_entry(self, data: dict, human_readable: bool) -> None:
+        self.rows.append(
+            {
+                f.name: column_value(data.get(f.name), f.type)
+                for f in self.schema
+            }
+        )
+        if len(self.rows) >= ROW_GROUP_SIZE:
+            self.write_row_group()
+
+    def write_row_group(self) -> None:
+        if self.rows:
+            self.writer.write_table(
+                pa.Table.from_pylist(self.rows, schema=self.schema)
+            )
+            self.rows = []
+
+    def close(self) -> None:
+        if self.writer is None:
+            return
+        self.write_row_group()
+        self.writer.close()
+        self.writer = None
+        os.replace(self.tmp_path, self.path)
@@ -0,0 +1,186 @@
+# Projection of the extracted entries to some of their fields, given with
+# --fields and --exclude-fields as comma-separated field paths, e.g.,
+# "word,pos,senses.glosses,forms".  A path selects a field of the entry,
+# or a field of the objects in a list field of it, like the glosses of all
+# senses.
+#
+# The projection is applied in the worker processes, so the removed fields
+# are not sent to the parent process.  With --fields, the `capture_*`
+# options of the sections that only produce removed fields are turned off,
+# so those sections are not parsed at all, for the editions whose sections
+# are listed in `CAPTURE_FIELDS`.
+#
+# The fields identifying the entry are always kept: the partitioned, SQLite
+# and Parquet outputs and the index of the output file are keyed by them.
+from typing import Any, Optional
+
+# Field name -> the fields selected below it, or an empty dictionary if the
+# whole field is selected
+FieldTree = dict[str, "FieldTree"]
+
+LINKAGE_FIELDS = (
+    "abbreviations",
+    "antonyms",
+    "coordinate_terms",
+    "derived",
+    "holonyms",
+    "hypernyms",
+    "hyponyms",
+    "idioms",
+    "instances",
+    "meronyms",
+    "paronyms",
+    "proverbs",
+    "related",
+    "synonyms",
+    "troponyms",
+)
+
+# Always kept by the projection
+KEY_FIELDS = ("word", "lang_code", "pos")
+
+# clean_node() adds categories, and tags on Lua errors, to the data of the
+# section it cleans; the English extractor moves the tags of the word to
+# its senses.
+CLEAN_NODE_FIELDS = ("categories", "tags")
+
+# Fields, at any level, that the sections enabled by each `capture_*`
+# option of `WiktionaryConfig` may write, by edition.  The options are
+# never turned off for the other editions, whose sections are not all
+# gated by the option of their name, e.g., the Polish linkage sections are
+# parsed with `capture_inflections`.
+CAPTURE_FIELDS: dict[str, dict[str, tuple[str, ...]]] = {
+    "en": {
+        "capture_translations": ("translations",) + CLEAN_NODE_FIELDS,
+        # Korean romanizations are forms
+        "capture_pronunciation": ("sounds", "hyphenation", "forms")
+        + CLEAN_NODE_FIELDS,
+        "capture_linkages": LINKAGE_FIELDS + CLEAN_NODE_FIELDS,
+        "capture_compounds": ("derived",) + CLEAN_NODE_FIELDS,
+        "capture_examples": ("examples",) + CLEAN_NODE_FIELDS,
+        "capture_etymologies": (
+            "etymology_number",
+            "etymology_templates",
+            "etymology_text",
+            "wikipedia",
+        )
+        + CLEAN_NODE_FIELDS,
+        "capture_inflections": ("forms", "inflection_templates")
+        + CLEAN_NODE_FIELDS,
+        "capture_descendants": ("descendants", "wikipedia") + CLEAN_NODE_FIELDS,
+    },
+}
+
+# Fields containing fields of the sections above
+CONTAINER_FIELDS: dict[str, tuple[str, ...]] = {
+    "senses": ("examples", "translations") + LINKAGE_FIELDS + CLEAN_NODE_FIELDS,
+}
+
+
+def parse_fields(spec: str) -> FieldTree:
+    """Parses comma-separated field paths, raises ValueError if a path is
+    empty."""
+    tree: FieldTree = {}
+    for path in spec.split(","):
+        names = [name.strip() for name in path.split(".")]
+        if not all(names):
+            raise ValueError(f"invalid field path: {path.strip()!r}")
+        node = tree
+        for name in names[:-1]:
+            child = node.get(name)
+            if child is not None and not child:
+                # The whole field is already selected
+                break
+            node = node.setdefault(name, {})
+        else:
+            node[names[-1]] = {}
+    return tree
+
+
+def select_fields(value: Any, tree: FieldTree) -> Any:
+    if isinstance(value, list):
+        return [select_fields(v, tree) for v in value]
+    if isinstance(value, dict):
+        return {
+            k: select_fields(v, tree[k]) if tree[k] else v
+            for k, v in value.items()
+            if k in tree
+        }
+    return value
+
+
+def drop_fields(value: Any, tree: FieldTree) -> Any:
+    if isinstance(value, list):
+        return [drop_fields(v, tree) for v in value]
+    if isinstance(value, dict):
+        return {
+            k: drop_fields(v, tree[k]) if k in tree else v
+            for k, v in value.items()
+            if k not in tree or tree[k]
+        }
+    return value
+
+
+def tree_names(tree: FieldTree) -> set[str]:
+    """Returns the names of the fields in ``tree`` at any level, and of
+    the fields that the selected container fields may contain."""
+    names = set()
+    for name, subtree in tree.items():
+        names.add(name)
+        if subtree:
+            names |= tree_names(subtree)
+        else:
+            names.update(CONTAINER_FIELDS.get(name, ()))
+    return names
+
+
+class Projection:
+    """Keeps the fields of the entries selected by ``fields``, or all
+    fields if it is None, and removes those selected by
+    ``exclude_fields``.  The `KEY_FIELDS` are always kept, excluding them
+    raises ValueError.  Hard redirects are not changed."""
+
+    __slots__ = ("fields", "exclude_fields", "include", "exclude")
+
+    def __init__(
+        self,
+        fields: Optional[str] = None,
+        exclude_fields: Optional[str] = None,
+    ):
+        self.fields = fields
+        self.exclude_fields = exclude_fields
+        self.include = parse_fields(fields) if fields is not None else None
+        if self.include is not None:
+            for name in KEY_FIELDS:
+                self.include[name] = {}
+        self.exclude = (
+            parse_fields(exclude_fields) if exclude_fields is not None else {}
+        )
+        for name in KEY_FIELDS:
+            if self.exclude.get(name) == {}:
+                raise ValueError(f"{name!r} is always written")
+
+    def __str__(self) -> str:
+        return f"fields={self.fields},exclude_fields={self.exclude_fields}"
+
+    def apply(self, data: dict) -> dict:
+        if data.get("pos") == "hard-redirect":
+            return data
+        if self.include is not None:
+            data = select_fields(data, self.include)
+        if self.exclude:
+            data = drop_fields(data, self.exclude)
+        return data
+
+    def unused_captures(self, edition: str) -> list[str]:
+        """Returns the `capture_*` options of the ``edition`` extractor
+        whose fields are all removed.  Only known with ``fields``, other
+        fields may come from any section."""
+        if self.include is None:
+            return []
+        names = tree_names(self.include)
+        return [
+            option
+            for option, option_fields in CAPTURE_FIELDS.get(edition, {}).items()
+            if names.isdisjoint(option_fields)
+        ]
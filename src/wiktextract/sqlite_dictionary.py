@@ -0,0 +1,225 @@
+# SQLite dictionary output: the extracted entries are loaded into an SQLite
+# database during extraction, with accent- and case-insensitive search keys
+# for the words and their forms, and optionally a full-text index of the
+# glosses.
+#
+# The entries are inserted in large transactions with journaling turned
+# off, and the indexes are only built when the database is closed.  The
+# search keys are computed when loading, so lookups are index probes
+# instead of comparisons with a Python collation function.
+import json
+import os
+import sqlite3
+import unicodedata
+from pathlib import Path
+from typing import Any, Optional
+
+from .output import EntryOutput, json_text
+from .wxr_logging import logger
+
+# Entries inserted in one transaction
+LOAD_BATCH_SIZE = 10000
+
+
+def search_key(text: str) -> str:
+    """Returns ``text`` without diacritics and in lowercase, e.g., "kůň" ->
+    "kun".  Words and forms are found by their search keys."""
+    return unicodedata.normalize(
+        "NFC",
+        "".join(
+            c
+            for c in unicodedata.normalize("NFD", text)
+            if unicodedata.category(c) != "Mn"
+        ),
+    ).casefold()
+
+
+class SqliteOutput(EntryOutput):
+    """Writes the entries to the SQLite database ``path``.  If ``fts`` is
+    True, an FTS5 full-text index of the glosses is also built.  The
+    database is written under a temporary name and renamed when closed."""
+
+    __slots__ = (
+        "path",
+        "tmp_path",
+        "fts",
+        "conn",
+        "next_id",
+        "entries",
+        "forms",
+        "glosses",
+    )
+
+    def __init__(self, path: Path, fts: bool = False):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.fts = fts
+        self.tmp_path.unlink(True)
+        self.conn = sqlite3.connect(self.tmp_path)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+
+            CREATE TABLE entries (
+            id INTEGER PRIMARY KEY,
+            word TEXT,
+            word_key TEXT,  -- search_key(word)
+            lang_code TEXT,
+            pos TEXT,
+            data TEXT  -- the entry as JSON
+            );
+
+            CREATE TABLE forms (
+            entry_id INTEGER,
+            form TEXT,
+            form_key TEXT  -- search_key(form)
+            );
+
+            CREATE TABLE glosses (
+            id INTEGER PRIMARY KEY,
+            entry_id INTEGER,
+            sense_index INTEGER,
+            gloss TEXT  -- the glosses of the sense separated by "; "
+            );
+            """
+        )
+        self.next_id = 1
+        # Rows not inserted yet
+        self.entries: list[tuple[Any, ...]] = []
+        self.forms: list[tuple[int, str, str]] = []
+        self.glosses: list[tuple[int, int, str]] = []
+
+    def write_entry(self, data: dict, human_readable: bool) -> None:
+        entry_id = self.next_id
+        self.next_id += 1
+        # Hard redirects have a title instead of a word
+        word = data.get("word") or data.get("title") or ""
+        self.entries.append(
+            (
+                entry_id,
+                word,
+                search_key(word),
+                data.get("lang_code"),
+                data.get("pos"),
+                json_text(data, False).rstrip("\n"),
+            )
+        )
+        forms = set()
+        for form_data in data.get("forms", ()):
+            form = (
+                form_data.get("form") if isinstance(form_data, dict) else None
+            )
+            if isinstance(form, str) and form != "" and form not in forms:
+                forms.add(form)
+                self.forms.append((entry_id, form, search_key(form)))
+        if self.fts:
+            for i, sense in enumerate(data.get("senses", ())):
+                glosses = (
+                    sense.get("glosses") if isinstance(sense, dict) else None
+                )
+                if glosses:
+                    self.glosses.append((entry_id, i, "; ".join(glosses)))
+        if len(self.entries) >= LOAD_BATCH_SIZE:
+            self.load()
+
+    def load(self) -> None:
+        self.conn.executemany(
+            "INSERT INTO entries VALUES(?, ?, ?, ?, ?, ?)", self.entries
+        )
+        self.conn.executemany("INSERT INTO forms VALUES(?, ?, ?)", self.forms)
+        self.conn.executemany(
+            "INSERT INTO glosses (entry_id, sense_index, gloss) "
+            "VALUES(?, ?, ?)",
+            self.glosses,
+        )
+        self.conn.commit()
+        self.entries = []
+        self.forms = []
+        self.glosses = []
+
+    def close(self) -> None:
+        if self.conn is None:
+            return
+        self.load()
+        logger.info(f"Creating the indexes of {self.path}")
+        self.conn.executescript(
+            """
+            CREATE INDEX entries_word_key ON entries(word_key, lang_code);
+            CREATE INDEX forms_form_key ON forms(form_key);
+            CREATE INDEX forms_entry_id ON forms(entry_id);
+            """
+        )
+        if self.fts:
+            # External content table, the glosses are only stored once
+            self.conn.executescript(
+                """
+                CREATE VIRTUAL TABLE glosses_fts USING fts5(
+                gloss,
+                content = 'glosses',
+                content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2'
+                );
+                INSERT INTO glosses_fts(glosses_fts) VALUES('rebuild');
+                """
+            )
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None  # type: ignore[assignment]
+        os.replace(self.tmp_path, self.path)
+
+
+def lookup_word(
+    conn: sqlite3.Connection,
+    word: str,
+    lang_code: Optional[str] = None,
+    forms: bool = False,
+) -> list[dict]:
+    """Returns the entries of ``word`` ignoring case and diacritics, and if
+    ``forms`` is True, also the entries that have it as a form."""
+    key = search_key(word)
+    query = "SELECT id FROM entries WHERE word_key = ?"
+    args: list[str] = [key]
+    if lang_code is not None:
+        query += " AND lang_code = ?"
+        args.append(lang_code)
+    if forms:
+        query += " UNION SELECT entry_id FROM forms WHERE form_key = ?"
+        args.append(key)
+        if lang_code is not None:
+            query = (
+                f"SELECT id FROM entries WHERE id IN ({query}) "
+                "AND lang_code = ?"
+            )
+            args.append(lang_code)
+    return [
+        json.loads(data)
+        for (data,) in conn.execute(
+            f"SELECT data FROM entries WHERE id IN ({query}) ORDER BY id",
+            args,
+        )
+    ]
+
+
+def search_glosses(
+    conn: sqlite3.Connection, query: str, limit: int = 20
+) -> list[dict]:
+    """Returns the entries with glosses matching the FTS5 query ``query``,
+    best matches first.  Needs a database written with ``fts``."""
+    entries = []
+    seen = set()
+    for entry_id, data in conn.execute(
+        "SELECT entries.id, entries.data FROM glosses_fts "
+        "JOIN glosses ON glosses.id = glosses_fts.rowid "
+        "JOIN entries ON entries.id = glosses.entry_id "
+        "WHERE glosses_fts MATCH ? ORDER BY glosses_fts.rank",
+        (query,),
+    ):
+        if entry_id in seen:
+            continue
+        seen.add(entry_id)
+        entries.append(json.loads(data))
+        if len(entries) >= limit:
+            break
+    return entries
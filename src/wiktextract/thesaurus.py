@@ -2,25 +2,40 @@
 # merged into word linkages in later stages.
 #
 # Copyright (c) 2021 Tatu Ylonen.  See file LICENSE and https://ylonen.org
-import os
+import json
 import sqlite3
+import sys
 import tempfile
 import time
 import traceback
 from collections.abc import Iterable
 from dataclasses import dataclass, field
-from multiprocessing import Pool, current_process
+from functools import partial
+from itertools import chain, groupby
+from multiprocessing import current_process
+from operator import itemgetter
 from pathlib import Path
-from typing import Optional, TextIO
+from typing import Optional
 
 from mediawiki_langcodes import code_to_name
 from wikitextprocessor import Page
 from wikitextprocessor.core import CollatedErrorReturnData, NamespaceDataEntry
 
-from .import_utils import import_extractor_module
+from .executor import SupervisedExecutor, WorkerLimits
+from .import_utils import import_extractor_module, preload_extractor_modules
+from .manifest import (
+    add_dependencies,
+    extractor_version,
+    hash_page,
+    recording_dependencies,
+)
+from .output import OutputFile
 from .wxr_context import WiktextractContext
 from .wxr_logging import logger
 
+# Version of the tables of the thesaurus database
+THESAURUS_DB_VERSION = 1
+
 
 @dataclass
 class ThesaurusTerm:
@@ -39,30 +54,21 @@ class ThesaurusTerm:
 
 def worker_func(
     page: Page,
-) -> tuple[bool, list[ThesaurusTerm], CollatedErrorReturnData, Optional[str]]:
+) -> tuple[
+    str, bool, list[ThesaurusTerm], CollatedErrorReturnData, Optional[str]
+]:
     wxr: WiktextractContext = worker_func.wxr  # type:ignore[attr-defined]
-    with tempfile.TemporaryDirectory(prefix="wiktextract") as tmpdirname:
-        debug_path = "{}/wiktextract-{}".format(tmpdirname, os.getpid())
-        with open(debug_path, "w", encoding="utf-8") as f:
-            f.write(page.title + "\n")
-
-        wxr.wtp.start_page(page.title)
-        try:
-            terms = extract_thesaurus_page(wxr, page)
-            return True, terms, wxr.wtp.to_return(), None
-        except Exception as e:
-            lst = traceback.format_exception(
-                type(e), value=e, tb=e.__traceback__
-            )
-            msg = (
-                '=== EXCEPTION while parsing page "{}":\n '
-                "in process {}".format(
-                    page.title,
-                    current_process().name,
-                )
-                + "".join(lst)
-            )
-            return False, [], {}, msg  # type:ignore[typeddict-item]
+    wxr.wtp.start_page(page.title)
+    try:
+        terms = extract_thesaurus_page(wxr, page)
+        return page.title, True, terms, wxr.wtp.to_return(), None
+    except Exception as e:
+        lst = traceback.format_exception(type(e), value=e, tb=e.__traceback__)
+        msg = '=== EXCEPTION while parsing page "{}":\n in process {}'.format(
+            page.title,
+            current_process().name,
+        ) + "".join(lst)
+        return page.title, False, [], {}, msg  # type:ignore[typeddict-item]
 
 
 def extract_thesaurus_page(
@@ -74,45 +80,197 @@ def extract_thesaurus_page(
     return thesaurus_extractor_mod.extract_thesaurus_page(wxr, page)
 
 
+def thesaurus_cache_key(wxr: WiktextractContext) -> str:
+    """Returns the edition and extractor version of the thesaurus data.
+    Data with another key is extracted again."""
+    return json.dumps(
+        {
+            "version": extractor_version(),
+            "dump_file_lang_code": wxr.config.dump_file_lang_code,
+        },
+        sort_keys=True,
+    )
+
+
 def extract_thesaurus_data(
-    wxr: WiktextractContext, num_processes: Optional[int] = None
+    wxr: WiktextractContext,
+    num_processes: Optional[int] = None,
+    worker_limits: Optional[WorkerLimits] = None,
+    batch_size: int = 0,
 ) -> None:
-    from .wiktionary import init_worker_process
-
+    """Extracts the thesaurus pages into the thesaurus database.  If the
+    database has data of the same edition and extractor version, only the
+    pages that changed since it was written are extracted again."""
     start_t = time.time()
-    logger.info("Extracting thesaurus data")
     thesaurus_ns_data: NamespaceDataEntry = wxr.wtp.NAMESPACE_DATA.get(
         "Thesaurus",
         {},  # type:ignore[typeddict-item]
     )
     thesaurus_ns_id = thesaurus_ns_data.get("id", 0)
+    db_conn = wxr.thesaurus_db_conn
+    assert db_conn is not None
+    # Same pages as `Wtp.get_all_pages([thesaurus_ns_id], False)`
+    page_hashes = {
+        title: hash_page(body, None)
+        for title, body in wxr.wtp.db_conn.execute(
+            "SELECT title, body FROM pages "
+            "WHERE namespace_id = ? AND redirect_to IS NULL",
+            (thesaurus_ns_id,),
+        )
+    }
+    cache_key = thesaurus_cache_key(wxr)
+    row = db_conn.execute(
+        "SELECT value FROM meta WHERE key = 'cache_key'"
+    ).fetchone()
+    stored_key = row[0] if row is not None else None
+    if stored_key == cache_key:
+        stored_hashes = dict(db_conn.execute("SELECT title, hash FROM pages"))
+        changed = [
+            title
+            for title, page_hash in page_hashes.items()
+            if stored_hashes.get(title) != page_hash
+        ]
+        removed = stored_hashes.keys() - page_hashes.keys()
+        if not changed and not removed:
+            logger.info(
+                f"Thesaurus data of {len(page_hashes)} pages is up to date"
+            )
+            return
+        logger.info(
+            f"Extracting thesaurus data of {len(changed)} changed pages, "
+            f"removing {len(removed)} pages"
+        )
+        for title in chain(changed, removed):
+            db_conn.execute(
+                "DELETE FROM terms WHERE page_id = "
+                "(SELECT id FROM pages WHERE title = ?)",
+                (title,),
+            )
+        db_conn.executemany(
+            "DELETE FROM pages WHERE title = ?", [(title,) for title in removed]
+        )
+        db_conn.execute(
+            "DELETE FROM entries WHERE id NOT IN (SELECT entry_id FROM terms)"
+        )
+    else:
+        if stored_key is not None:
+            logger.info(
+                "Thesaurus data was extracted by another extractor version"
+            )
+        logger.info("Extracting thesaurus data")
+        db_conn.executescript(
+            """
+            DELETE FROM terms;
+            DELETE FROM entries;
+            DELETE FROM pages;
+            DELETE FROM meta;
+            """
+        )
+        changed = list(page_hashes)
+    # Pages without hash are extracted again if this run is interrupted
+    db_conn.executemany(
+        "INSERT INTO pages (title, hash) VALUES(?, NULL) "
+        "ON CONFLICT(title) DO UPDATE SET hash = NULL",
+        [(title,) for title in changed],
+    )
+    db_conn.commit()
+    pages = {
+        title: (page_id, page_hashes[title])
+        for title, page_id in db_conn.execute(
+            "SELECT title, id FROM pages WHERE hash IS NULL"
+        )
+    }
+    loader = extract_thesaurus_pages(
+        wxr,
+        thesaurus_ns_id,
+        pages,
+        num_processes,
+        worker_limits,
+        batch_size,
+    )
+    # Connected again by `extract_thesaurus_pages()`
+    wxr.thesaurus_db_conn.execute(  # type:ignore[union-attr]
+        "INSERT OR REPLACE INTO meta (key, value) VALUES('cache_key', ?)",
+        (cache_key,),
+    )
+    wxr.thesaurus_db_conn.commit()  # type:ignore[union-attr]
+    total = thesaurus_linkage_number(wxr.thesaurus_db_conn)  # type:ignore[arg-type]
+    logger.info(
+        "Extracted {} linkages from {} thesaurus pages (took {:.1f}s, "
+        "loaded {} rows at {:.0f} rows/s)".format(
+            total,
+            len(changed),
+            time.time() - start_t,
+            loader.rows,
+            loader.rows / max(loader.load_time, 1e-6),
+        )
+    )
+
+
+def extract_thesaurus_pages(
+    wxr: WiktextractContext,
+    thesaurus_ns_id: int,
+    pages: dict[str, tuple[int, str]],
+    num_processes: Optional[int],
+    worker_limits: Optional[WorkerLimits],
+    batch_size: int,
+) -> "ThesaurusLoader":
+    """Extracts the pages with the given titles, which map to their id in
+    the `pages` table and their hash.  The hash is stored for the pages
+    extracted without errors, the other pages are extracted again by the
+    next run."""
+    from .wiktionary import init_worker_process, load_page
 
     wxr.remove_unpicklable_objects()
-    with Pool(num_processes, init_worker_process, (worker_func, wxr)) as pool:
+    with SupervisedExecutor(
+        num_processes,
+        worker_func,
+        init_worker_process,
+        (worker_func, wxr),
+        worker_limits,
+        partial(preload_extractor_modules, wxr.wtp.lang_code, ["thesaurus"]),
+    ) as executor:
         wxr.reconnect_databases(False)
-        for success, terms, stats, err in pool.imap_unordered(
-            worker_func, wxr.wtp.get_all_pages([thesaurus_ns_id], False)
+        loader = ThesaurusLoader(wxr.thesaurus_db_conn)  # type:ignore[arg-type]
+        extracted = []
+        for title, success, terms, stats, err in executor.imap_unordered(
+            wxr,
+            (load_page(wxr, (title, thesaurus_ns_id)) for title in pages),
+            lambda page: page.title,
+            batch_size,
         ):
             if not success:
                 # Print error in parent process - do not remove
                 logger.error(err)
                 continue
+            page_id, page_hash = pages[title]
             for term in terms:
-                insert_thesaurus_term(wxr.thesaurus_db_conn, term)  # type:ignore[arg-type]
+                loader.add(term, page_id)
+            extracted.append((page_hash, page_id))
             wxr.config.merge_return(stats)
 
-    wxr.thesaurus_db_conn.commit()  # type:ignore[union-attr]
-    num_pages = wxr.wtp.saved_page_nums([thesaurus_ns_id], False)
-    total = thesaurus_linkage_number(wxr.thesaurus_db_conn)  # type:ignore[arg-type]
-    logger.info(
-        "Extracted {} linkages from {} thesaurus pages (took {:.1f}s)".format(
-            total, num_pages, time.time() - start_t
-        )
+    wxr.thesaurus_db_conn.executemany(  # type:ignore[union-attr]
+        "UPDATE pages SET hash = ? WHERE id = ?", extracted
     )
+    loader.close()
+    return loader
 
 
 def init_thesaurus_db(db_path: Path) -> sqlite3.Connection:
     conn = sqlite3.connect(db_path)
+    (db_version,) = conn.execute("PRAGMA user_version").fetchone()
+    if db_version != THESAURUS_DB_VERSION:
+        # Tables of another version are created again and the thesaurus
+        # pages are extracted again
+        conn.executescript(
+            f"""
+            DROP TABLE IF EXISTS terms;
+            DROP TABLE IF EXISTS entries;
+            DROP TABLE IF EXISTS pages;
+            DROP TABLE IF EXISTS meta;
+            PRAGMA user_version = {THESAURUS_DB_VERSION};
+            """
+        )
     conn.executescript(
         """
         CREATE TABLE IF NOT EXISTS entries (
@@ -133,10 +291,25 @@ def init_thesaurus_db(db_path: Path) -> sqlite3.Connection:
         raw_tags TEXT,
         topics TEXT,
         roman TEXT,  -- Romanization
+        page_id INTEGER,  -- Thesaurus page the term is from
         PRIMARY KEY(term, entry_id),
         FOREIGN KEY(entry_id) REFERENCES entries(id)
         );
 
+        -- Extracted thesaurus pages and the hash of their body, NULL if
+        -- the page is not extracted yet
+        CREATE TABLE IF NOT EXISTS pages (
+        id INTEGER PRIMARY KEY,
+        title TEXT UNIQUE,
+        hash TEXT
+        );
+
+        -- "cache_key": `thesaurus_cache_key()` of the data
+        CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+        );
+
         PRAGMA journal_mode = WAL;
         PRAGMA foreign_keys = ON;
         """
@@ -183,6 +356,125 @@ def search_thesaurus(
         )
 
 
+class ThesaurusIndex:
+    """Read-only copy of the thesaurus database in memory, for finding the
+    terms of an entry without a query.  Most entries have no terms, and a
+    miss is a single dictionary lookup.  The rows are kept in the order of
+    the database, the same order `search_thesaurus()` returns them in."""
+
+    __slots__ = ("db_conn", "changes", "terms", "pages")
+
+    def __init__(self, db_conn: sqlite3.Connection):
+        self.db_conn = db_conn
+        # Changes made through this connection, e.g., terms inserted in
+        # the parent process, make the index out of date
+        self.changes = db_conn.total_changes
+        terms: dict[tuple[str, str, str], list[tuple]] = {}
+        # Titles of the thesaurus pages the terms of an entry are from
+        pages: dict[tuple[str, str, str], set[str]] = {}
+        intern = sys.intern
+        for (
+            entry,
+            lang_code,
+            pos,
+            term,
+            entry_id,
+            linkage,
+            tags,
+            topics,
+            roman,
+            sense,
+            raw_tags,
+            page_title,
+        ) in db_conn.execute(
+            """
+            SELECT entry, language_code, pos, term, entries.id, linkage,
+            tags, topics, roman, sense, raw_tags, pages.title
+            FROM terms JOIN entries ON terms.entry_id = entries.id
+            LEFT JOIN pages ON terms.page_id = pages.id
+            WHERE language_code IS NOT NULL AND pos IS NOT NULL
+            ORDER BY terms.rowid
+            """
+        ):
+            # Linkage types and tags repeat a lot
+            terms.setdefault((entry, lang_code, pos), []).append(
+                (
+                    term,
+                    entry_id,
+                    intern(linkage),
+                    intern(tags),
+                    intern(topics),
+                    roman,
+                    sense,
+                    intern(raw_tags),
+                )
+            )
+            if page_title is not None:
+                pages.setdefault((entry, lang_code, pos), set()).add(
+                    intern(page_title)
+                )
+        self.terms = {key: tuple(rows) for key, rows in terms.items()}
+        self.pages = {key: tuple(titles) for key, titles in pages.items()}
+
+    def is_current(self, db_conn: sqlite3.Connection) -> bool:
+        return db_conn is self.db_conn and db_conn.total_changes == self.changes
+
+    def search(
+        self,
+        entry: str,
+        lang_code: str,
+        pos: str,
+        linkage_type: Optional[str] = None,
+    ) -> Iterable[ThesaurusTerm]:
+        for r in self.terms.get((entry, lang_code, pos), ()):
+            if linkage_type is not None and r[2] != linkage_type:
+                continue
+            yield ThesaurusTerm(
+                term=r[0],
+                entry_id=r[1],
+                linkage=r[2],
+                tags=r[3].split("|") if len(r[3]) > 0 else [],
+                topics=r[4].split("|") if len(r[4]) > 0 else [],
+                roman=r[5],
+                sense=r[6],
+                entry=entry,
+                pos=pos,
+                language_code=lang_code,
+                raw_tags=r[7].split("|") if len(r[7]) > 0 else [],
+            )
+
+
+def find_thesaurus_terms(
+    wxr: WiktextractContext,
+    entry: str,
+    lang_code: str,
+    pos: str,
+    linkage_type: Optional[str] = None,
+) -> Iterable[ThesaurusTerm]:
+    """Like `search_thesaurus()`, but uses the `ThesaurusIndex` of the
+    process, which is loaded on the first call."""
+    db_conn = wxr.thesaurus_db_conn
+    if db_conn is None:
+        return ()
+    index = wxr.thesaurus_index
+    if index is None or not index.is_current(db_conn):
+        index = wxr.thesaurus_index = ThesaurusIndex(db_conn)
+    if recording_dependencies(wxr):
+        # The pages the terms are from, and the page of the entry, which
+        # may be created later
+        ns_data = wxr.wtp.NAMESPACE_DATA.get("Thesaurus")
+        if ns_data is not None:
+            add_dependencies(
+                wxr,
+                [
+                    (title, ns_data["id"])
+                    for title in index.pages.get((entry, lang_code, pos), ())
+                ]
+                + [(f"{ns_data['name']}:{entry}", ns_data["id"])],
+            )
+    return index.search(entry, lang_code, pos, linkage_type)
+
+
 def insert_thesaurus_term(
     db_conn: sqlite3.Connection, term: ThesaurusTerm
 ) -> None:
@@ -218,16 +510,174 @@ def insert_thesaurus_term(
     )
 
 
+# Terms inserted with one `executemany()` call by `ThesaurusLoader`
+THESAURUS_LOAD_BATCH_SIZE = 10000
+
+
+class ThesaurusLoader:
+    """Inserts thesaurus terms in batches in one transaction, with the same
+    result as calling `insert_thesaurus_term()` for each term.  The entry
+    ids are assigned in memory, and the index of the entries is dropped
+    during the load and created again by `close()`, together with an index
+    of the terms by entry."""
+
+    __slots__ = (
+        "db_conn",
+        "synchronous",
+        "entry_ids",
+        "next_id",
+        "entries",
+        "terms",
+        "rows",
+        "load_time",
+    )
+
+    def __init__(self, db_conn: sqlite3.Connection):
+        self.db_conn = db_conn
+        (self.synchronous,) = db_conn.execute("PRAGMA synchronous").fetchone()
+        # (entry, language_code, pos) -> id of the entries already inserted
+        self.entry_ids: dict[tuple[str, str, str], int] = {}
+        for entry_id, entry, lang_code, pos in db_conn.execute(
+            "SELECT id, entry, language_code, pos FROM entries"
+        ):
+            self.entry_ids[(entry, lang_code, pos)] = entry_id
+        self.next_id = max(self.entry_ids.values(), default=0) + 1
+        # Rows not inserted yet
+        self.entries: list[tuple] = []
+        self.terms: list[tuple] = []
+        # Inserted rows and the time spent inserting them
+        self.rows = 0
+        self.load_time = 0.0
+        db_conn.executescript(
+            """
+            PRAGMA synchronous = OFF;
+            PRAGMA foreign_keys = OFF;
+            DROP INDEX IF EXISTS entries_index;
+            """
+        )
+
+    def add(self, term: ThesaurusTerm, page_id: Optional[int] = None) -> None:
+        key = (term.entry, term.language_code, term.pos)
+        entry_id = self.entry_ids.get(key)
+        if entry_id is None:
+            entry_id = self.next_id
+            self.next_id += 1
+            # NULL values are never equal in the unique index, such
+            # entries are inserted for every term
+            if None not in key:
+                self.entry_ids[key] = entry_id
+            self.entries.append(
+                (entry_id, term.entry, term.pos, term.language_code, term.sense)
+            )
+        self.terms.append(
+            (
+                term.term,
+                entry_id,
+                term.linkage,
+                "|".join(term.tags),
+                "|".join(term.topics),
+                term.roman,
+                "|".join(term.raw_tags),
+                page_id,
+            )
+        )
+        if len(self.terms) >= THESAURUS_LOAD_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        start_t = time.time()
+        cursor = self.db_conn.executemany(
+            "INSERT INTO entries (id, entry, pos, language_code, sense) "
+            "VALUES(?, ?, ?, ?, ?)",
+            self.entries,
+        )
+        self.rows += cursor.rowcount
+        cursor = self.db_conn.executemany(
+            """
+            INSERT OR IGNORE INTO terms
+            (term, entry_id, linkage, tags, topics, roman, raw_tags, page_id)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            self.terms,
+        )
+        self.rows += cursor.rowcount
+        self.entries = []
+        self.terms = []
+        self.load_time += time.time() - start_t
+
+    def close(self) -> None:
+        self.flush()
+        start_t = time.time()
+        self.db_conn.executescript(
+            f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS entries_index
+            ON entries(entry, pos, language_code);
+            CREATE INDEX IF NOT EXISTS terms_entry_id ON terms(entry_id);
+            CREATE INDEX IF NOT EXISTS terms_page_id ON terms(page_id);
+            PRAGMA foreign_keys = ON;
+            PRAGMA synchronous = {int(self.synchronous)};
+            """
+        )
+        self.load_time += time.time() - start_t
+
+
 def close_thesaurus_db(db_path: Path, db_conn: sqlite3.Connection) -> None:
     db_conn.close()
     if db_path.parent.samefile(Path(tempfile.gettempdir())):
         db_path.unlink(True)
 
 
+class EmittedWords:
+    """The (word, lang_code, pos) triples of the emitted entries, kept in a
+    temporary database instead of a set in memory, so that
+    `emit_words_in_thesaurus()` can leave them out in its query."""
+
+    __slots__ = ("tmp_dir", "db_path", "db_conn", "pending")
+
+    def __init__(self, tmp_dir: Optional[str] = None):
+        self.tmp_dir = tempfile.TemporaryDirectory(dir=tmp_dir)
+        self.db_path = Path(self.tmp_dir.name) / "emitted.db"
+        self.db_conn = sqlite3.connect(self.db_path)
+        self.db_conn.executescript(
+            """
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE words (
+              word TEXT,
+              lang_code TEXT,
+              pos TEXT,
+              PRIMARY KEY(word, lang_code, pos)
+            ) WITHOUT ROWID;
+            """
+        )
+        # Triples not inserted yet
+        self.pending: list[tuple[str, str, str]] = []
+
+    def add(self, triple: tuple[str, str, str]) -> None:
+        self.pending.append(triple)
+        if len(self.pending) >= THESAURUS_LOAD_BATCH_SIZE:
+            self.flush()
+
+    def update(self, triples: Iterable[tuple[str, str, str]]) -> None:
+        for triple in triples:
+            self.add(triple)
+
+    def flush(self) -> None:
+        self.db_conn.executemany(
+            "INSERT OR IGNORE INTO words VALUES(?, ?, ?)", self.pending
+        )
+        self.db_conn.commit()
+        self.pending = []
+
+    def close(self) -> None:
+        self.db_conn.close()
+        self.tmp_dir.cleanup()
+
+
 def emit_words_in_thesaurus(
     wxr: WiktextractContext,
-    emitted: set[tuple[str, str, str]],
-    out_f: TextIO,
+    emitted: EmittedWords,
+    out_f: OutputFile,
     human_readable: bool,
 ) -> None:
     # Emit words that occur in thesaurus as main words but for which
@@ -236,65 +686,78 @@ def emit_words_in_thesaurus(
     from .wiktionary import write_json_data
 
     logger.info("Emitting words that only occur in thesaurus")
-    for entry_id, entry, pos, lang_code, sense in wxr.thesaurus_db_conn.execute(  # type:ignore[union-attr]
-        "SELECT id, entry, pos, language_code, sense FROM entries "
-        "WHERE pos IS NOT NULL AND language_code IS NOT NULL"
-    ):
-        if (entry, lang_code, pos) in emitted:
-            continue
-
-        if None in (entry, lang_code, pos):
-            logger.info(
-                f"'None' in entry, lang_code or"
-                f" pos: {entry}, {lang_code}, {pos}"
+    emitted.flush()
+    db_conn = wxr.thesaurus_db_conn
+    assert db_conn is not None
+    db_conn.execute("ATTACH DATABASE ? AS emitted", (str(emitted.db_path),))
+    try:
+        # Ordered by the unique key of the entries, their ids depend on the
+        # order the thesaurus pages were processed in
+        rows = db_conn.execute(
+            """
+            SELECT entries.id, entry, entries.pos, language_code, sense,
+            term, linkage, tags, topics, roman, raw_tags
+            FROM entries LEFT JOIN terms ON terms.entry_id = entries.id
+            WHERE entries.pos IS NOT NULL AND language_code IS NOT NULL
+            AND NOT EXISTS (
+              SELECT 1 FROM emitted.words
+              WHERE word = entry AND lang_code = language_code
+              AND words.pos = entries.pos
             )
-            continue
-
-        logger.info(
-            "Emitting thesaurus entry for "
-            f"{entry}/{lang_code}/{pos} (not in main)"
+            ORDER BY entry, entries.pos, language_code, entries.id,
+            terms.rowid
+            """
         )
+        for _, entry_rows in groupby(rows, itemgetter(0)):
+            first_row = next(entry_rows)
+            _, entry, pos, lang_code, sense = first_row[:5]
+            if entry is None:
+                logger.info(
+                    f"'None' in entry, lang_code or"
+                    f" pos: {entry}, {lang_code}, {pos}"
+                )
+                continue
 
-        sense_dict = dict()
-
-        if sense:
-            sense_dict["glosses"] = [sense]
+            logger.info(
+                "Emitting thesaurus entry for "
+                f"{entry}/{lang_code}/{pos} (not in main)"
+            )
 
-        for (
-            term,
-            linkage,
-            tags,
-            topics,
-            roman,
-            raw_tags,
-        ) in wxr.thesaurus_db_conn.execute(  # type:ignore[union-attr]
-            """
-            SELECT term, linkage, tags, topics, roman, raw_tags
-            FROM terms WHERE entry_id = ?
-            """,
-            (entry_id,),
-        ):
-            relation_dict = {"word": term, "source": f"Thesaurus:{entry}"}
-            if len(tags) > 0:
-                relation_dict["tags"] = tags.split("|")
-            if len(topics) > 0:
-                relation_dict["topics"] = topics.split("|")
-            if len(raw_tags) > 0:
-                relation_dict["raw_tags"] = raw_tags.split("|")
-            if linkage not in sense_dict:
-                sense_dict[linkage] = []
-            sense_dict[linkage].append(relation_dict)
-
-        if "glosses" not in sense_dict:
-            sense_dict["tags"] = ["no-gloss"]
-
-        entry = {
-            "word": entry,
-            "lang": code_to_name(lang_code, "en"),
-            "lang_code": lang_code,
-            "pos": pos,
-            "senses": [sense_dict] if sense_dict else [],
-            "source": "thesaurus",
-        }
-        entry = {k: v for k, v in entry.items() if v}
-        write_json_data(entry, out_f, human_readable)
+            sense_dict = dict()
+
+            if sense:
+                sense_dict["glosses"] = [sense]
+
+            for row in chain([first_row], entry_rows):
+                term, linkage, tags, topics, roman, raw_tags = row[5:]
+                if term is None:
+                    # Entry without terms
+                    continue
+                relation_dict = {"word": term, "source": f"Thesaurus:{entry}"}
+                if len(tags) > 0:
+                    relation_dict["tags"] = tags.split("|")
+                if len(topics) > 0:
+                    relation_dict["topics"] = topics.split("|")
+                if len(raw_tags) > 0:
+                    relation_dict["raw_tags"] = raw_tags.split("|")
+                if linkage not in sense_dict:
+                    sense_dict[linkage] = []
+                sense_dict[linkage].append(relation_dict)
+
+            if "glosses" not in sense_dict:
+                sense_dict["tags"] = ["no-gloss"]
+
+            entry = {
+                "word": entry,
+                "lang": code_to_name(lang_code, "en"),
+                "lang_code": lang_code,
+                "pos": pos,
+                "senses": [sense_dict] if sense_dict else [],
+                "source": "thesaurus",
+            }
+            entry = {k: v for k, v in entry.items() if v}
+            if wxr.config.projection is not None:
+                entry = wxr.config.projection.apply(entry)
+            write_json_data(entry, out_f, human_readable)
+    finally:
+        db_conn.execute("DETACH DATABASE emitted")
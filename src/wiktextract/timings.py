@@ -0,0 +1,56 @@
+# Processing times of pages, recorded in an SQLite file so that a later run
+# can schedule the pages that take longest first.
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+
+class PageTimings:
+    __slots__ = ("path", "conn")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def open(self) -> sqlite3.Connection:
+        self.conn = sqlite3.connect(self.path)
+        # The timings of the previous run are read through another
+        # connection while the new ones are written.
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS timings (
+            title TEXT,
+            namespace_id INTEGER,
+            length INTEGER,  -- of the page body when it was processed
+            seconds REAL,
+            PRIMARY KEY(title, namespace_id)
+            )
+            """
+        )
+        self.conn.commit()
+        return self.conn
+
+    def record(self, key: tuple[str, int], length: int, seconds: float) -> None:
+        assert self.conn is not None
+        self.conn.execute(
+            "INSERT OR REPLACE INTO timings VALUES(?, ?, ?, ?)",
+            (*key, length, seconds),
+        )
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def seconds_per_char(self) -> Optional[float]:
+        """Returns the average processing time per character of page body,
+        used to estimate the time of the pages without timings."""
+        assert self.conn is not None
+        for seconds, length in self.conn.execute(
+            "SELECT sum(seconds), sum(length) FROM timings"
+        ):
+            if seconds is not None and length:
+                return seconds / length
+        return None
@@ -6,81 +6,449 @@
 
 import io
 import json
-import os
 import re
 import tarfile
-import tempfile
 import time
 import traceback
-from multiprocessing import Pool, current_process
+import zlib
+from functools import partial
+from multiprocessing import current_process
 from pathlib import Path
-from typing import Optional, TextIO, Union
+from typing import Callable, Iterator, Optional, TextIO, Union
 
 from wikitextprocessor import Page
 from wikitextprocessor.core import CollatedErrorReturnData, ErrorMessageData
 from wikitextprocessor.dumpparser import process_dump
 
+from .checkpoint import Checkpoint
+from .executor import SupervisedExecutor, WorkerLimits
+from .import_utils import preload_extractor_modules
+from .manifest import (
+    Dependency,
+    Manifest,
+    hash_page,
+    pop_dependencies,
+    record_dependencies,
+    recording_dependencies,
+)
+from .output import (
+    EntryOutput,
+    OutputFile,
+    OutputWriter,
+    encode_json,
+    json_text,
+    set_compact_json,
+)
 from .page import parse_page
 from .thesaurus import (
+    EmittedWords,
     emit_words_in_thesaurus,
     extract_thesaurus_data,
-    thesaurus_linkage_number,
 )
+from .timings import PageTimings
 from .wxr_context import WiktextractContext
 from .wxr_logging import logger
 
+# Pages are identified by title and namespace id when they are sent to
+# worker processes; the primary key of the `pages` table.
+PageKey = tuple[str, int]
+# (K, N): process the K-th of N disjoint parts of the pages, 0 <= K < N
+Shard = tuple[int, int]
+# (seconds, length of the page body) of processing a page
+PageTiming = tuple[float, int]
+# (word, lang_code, pos) of an emitted entry
+EmittedTriple = tuple[str, str, str]
+
+# Processing time estimate for the pages without recorded timings
+SECONDS_PER_CHAR = 1e-5
+
 
 def page_handler(
-    page: Page,
-) -> tuple[list[dict[str, str]], CollatedErrorReturnData]:
+    page: Union[Page, PageKey],
+) -> tuple[
+    PageKey,
+    list[dict[str, str]],
+    CollatedErrorReturnData,
+    str,
+    list[Dependency],
+    PageTiming,
+]:
     # Make sure there are no newlines or other strange characters in the
     # title.  They could cause security problems at several post-processing
     # steps.
     # We've given the page_handler function an extra wxr attribute previously.
     # This should never cause an exception, and if it does, we want it to.
     wxr: WiktextractContext = page_handler.wxr  #  type:ignore[attr-defined]
-    # Helps debug extraction hangs. This writes the path of each file being
-    # processed into /tmp/wiktextract*/wiktextract-*.  Once a hang
-    # has been observed, these files contain page(s) that hang.  They should
-    # be checked before aborting the process, as an interrupt might delete them.
-    with tempfile.TemporaryDirectory(prefix="wiktextract") as tmpdirname:
-        debug_path = "{}/wiktextract-{}".format(tmpdirname, os.getpid())
-        with open(debug_path, "w", encoding="utf-8") as f:
-            f.write(page.title + "\n")
-
-        wxr.wtp.start_page(page.title)
-        try:
-            title = re.sub(r"[\s\000-\037]+", " ", page.title)
-            title = title.strip()
-            if page.redirect_to is not None:
-                page_data = [
-                    {
-                        "title": title,
-                        "redirect": page.redirect_to,
-                        "pos": "hard-redirect",
-                    }
-                ]
-            else:
-                # XXX Sign gloss pages?
-                start_t = time.time()
-                page_data = parse_page(wxr, title, page.body)  # type: ignore[arg-type]
-                dur = time.time() - start_t
-                if dur > 100:
-                    logger.warning(
-                        "====== WARNING: PARSING PAGE TOOK {:.1f}s: {}".format(
-                            dur, title
-                        )
+    handler_start_t = time.time()
+    if not isinstance(page, Page):
+        # Only the key was sent through the pool, read the page body from
+        # this worker's own database connection.
+        page = load_page(wxr, page)
+    # Hashed here for the manifest, the parent doesn't read the pages
+    page_hash = (
+        hash_page(page.body, page.redirect_to)
+        if recording_dependencies(wxr)
+        else ""
+    )
+    wxr.wtp.start_page(page.title)
+    try:
+        title = re.sub(r"[\s\000-\037]+", " ", page.title)
+        title = title.strip()
+        if page.redirect_to is not None:
+            page_data = [
+                {
+                    "title": title,
+                    "redirect": page.redirect_to,
+                    "pos": "hard-redirect",
+                }
+            ]
+        else:
+            # XXX Sign gloss pages?
+            start_t = time.time()
+            page_data = parse_page(wxr, title, page.body)  # type: ignore[arg-type]
+            dur = time.time() - start_t
+            if dur > 100:
+                logger.warning(
+                    "====== WARNING: PARSING PAGE TOOK {:.1f}s: {}".format(
+                        dur, title
                     )
+                )
 
-            return page_data, wxr.wtp.to_return()
-        except Exception:
-            wxr.wtp.error(
-                f'=== EXCEPTION while parsing page "{page.title}" '
-                f"in process {current_process().name}",
-                traceback.format_exc(),
-                "page_handler_exception",
-            )
-            return [], wxr.wtp.to_return()
+        return (
+            (page.title, page.namespace_id),
+            page_data,
+            wxr.wtp.to_return(),
+            page_hash,
+            pop_dependencies(),
+            (time.time() - handler_start_t, len(page.body or "")),
+        )
+    except Exception:
+        wxr.wtp.error(
+            f'=== EXCEPTION while parsing page "{page.title}" '
+            f"in process {current_process().name}",
+            traceback.format_exc(),
+            "page_handler_exception",
+        )
+        return (
+            (page.title, page.namespace_id),
+            [],
+            wxr.wtp.to_return(),
+            page_hash,
+            pop_dependencies(),
+            (time.time() - handler_start_t, len(page.body or "")),
+        )
+
+
+def serializing_page_handler(
+    human_readable: bool,
+    page: Union[Page, PageKey],
+) -> tuple[
+    PageKey,
+    tuple[bytes, list[EmittedTriple]],
+    CollatedErrorReturnData,
+    str,
+    list[Dependency],
+    PageTiming,
+]:
+    """Like `page_handler()`, but also checks the extracted data and
+    returns it as UTF-8 encoded JSON together with the triples it emits,
+    so that the parent process only has to write it."""
+    wxr: WiktextractContext = page_handler.wxr  #  type:ignore[attr-defined]
+    page_key, page_data, wtp_stats, page_hash, deps, timing = page_handler(page)
+    page_emitted = check_page_data(wxr, page_data, wtp_stats)
+    projection = wxr.config.projection
+    if projection is not None:
+        page_data = [projection.apply(dt) for dt in page_data]
+    return (
+        page_key,
+        (
+            b"".join(encode_json(dt, human_readable) for dt in page_data),
+            page_emitted,
+        ),
+        wtp_stats,
+        page_hash,
+        deps,
+        timing,
+    )
+
+
+def projecting_page_handler(
+    page: Union[Page, PageKey],
+) -> tuple[
+    PageKey,
+    tuple[list[dict], list[EmittedTriple]],
+    CollatedErrorReturnData,
+    str,
+    list[Dependency],
+    PageTiming,
+]:
+    """Like `page_handler()`, but also checks the extracted data and
+    returns it with only the fields selected by `wxr.config.projection`,
+    together with the triples it emits.  The data is checked before the
+    fields are removed."""
+    wxr: WiktextractContext = page_handler.wxr  #  type:ignore[attr-defined]
+    page_key, page_data, wtp_stats, page_hash, deps, timing = page_handler(page)
+    page_emitted = check_page_data(wxr, page_data, wtp_stats)
+    projection = wxr.config.projection
+    assert projection is not None
+    return (
+        page_key,
+        ([projection.apply(dt) for dt in page_data], page_emitted),
+        wtp_stats,
+        page_hash,
+        deps,
+        timing,
+    )
+
+
+def check_page_data(
+    wxr: WiktextractContext,
+    page_data: list[dict],
+    wtp_stats: CollatedErrorReturnData,
+) -> list[EmittedTriple]:
+    """Checks the data of a page in a worker process and returns the
+    triples it emits.  The messages of the checks are added to
+    ``wtp_stats``."""
+    num_debugs = len(wxr.config.debugs)
+    page_emitted = []
+    for dt in page_data:
+        check_json_data(wxr, dt)
+        triple = emitted_triple(dt)
+        if triple is not None:
+            page_emitted.append(triple)
+    # The messages of the data checks are merged by the parent process
+    # after the ones of the page
+    check_debugs = wxr.config.debugs[num_debugs:]
+    if check_debugs:
+        del wxr.config.debugs[num_debugs:]
+        wtp_stats["debugs"] = wtp_stats.get("debugs", []) + check_debugs
+    return page_emitted
+
+
+def page_title(page: Union[Page, PageKey]) -> str:
+    return page.title if isinstance(page, Page) else page[0]
+
+
+def page_shard(title: str, num_shards: int) -> int:
+    """Returns the shard a page belongs to.  This must not depend on the
+    Python process (unlike ``hash()``) so that every node computes the same
+    partition."""
+    return zlib.crc32(title.encode("utf-8")) % num_shards
+
+
+def page_query(
+    wxr: WiktextractContext,
+    namespace_ids: list[int],
+    search_pattern: Optional[str] = None,
+    shard: Optional[Shard] = None,
+) -> tuple[str, list[Union[str, int]]]:
+    """Returns the WHERE clause and its arguments selecting the same pages
+    as ``Wtp.get_all_pages(namespace_ids, True, "wikitext",
+    search_pattern)``, optionally limited to one shard."""
+    where = "namespace_id IN ({}) AND model = ?".format(
+        ", ".join("?" * len(namespace_ids))
+    )
+    args: list[Union[str, int]] = [*namespace_ids, "wikitext"]
+    if search_pattern is not None:
+        where += " AND body LIKE ?"
+        args.append(search_pattern)
+    if shard is not None:
+        wxr.wtp.db_conn.create_function(
+            "page_shard", 2, page_shard, deterministic=True
+        )
+        where += " AND page_shard(title, ?) = ?"
+        args.extend((shard[1], shard[0]))
+    return where, args
+
+
+def count_pages(
+    wxr: WiktextractContext,
+    namespace_ids: list[int],
+    search_pattern: Optional[str] = None,
+    shard: Optional[Shard] = None,
+) -> int:
+    where, args = page_query(wxr, namespace_ids, search_pattern, shard)
+    for (r,) in wxr.wtp.db_conn.execute(
+        f"SELECT count(*) FROM pages WHERE {where}", args
+    ):
+        return r
+    return 0
+
+
+def iter_page_keys(
+    wxr: WiktextractContext,
+    namespace_ids: list[int],
+    search_pattern: Optional[str] = None,
+    shard: Optional[Shard] = None,
+) -> Iterator[PageKey]:
+    """Yields the keys of the pages to process in title order, without
+    reading the page bodies."""
+    where, args = page_query(wxr, namespace_ids, search_pattern, shard)
+    yield from wxr.wtp.db_conn.execute(
+        f"SELECT title, namespace_id FROM pages WHERE {where} "
+        "ORDER BY title ASC",
+        args,
+    )
+
+
+def iter_scheduled_page_keys(
+    wxr: WiktextractContext,
+    namespace_ids: list[int],
+    search_pattern: Optional[str] = None,
+    shard: Optional[Shard] = None,
+    timings: Optional[PageTimings] = None,
+) -> Iterator[tuple[PageKey, float]]:
+    """Yields the keys of the pages to process with their estimated
+    processing time in seconds, longest first, so that no long page is left
+    for the end of the run.  The time is the one recorded in ``timings``, or
+    estimated from the length of the page body."""
+    where, args = page_query(wxr, namespace_ids, search_pattern, shard)
+    conn = wxr.wtp.db_conn
+    seconds_per_char = None
+    if timings is not None:
+        seconds_per_char = timings.seconds_per_char()
+    if seconds_per_char is None:
+        # No timings recorded yet
+        cursor = conn.execute(
+            "SELECT title, namespace_id, coalesce(length(body), 0) * ? AS cost "
+            f"FROM pages WHERE {where} ORDER BY cost DESC, title ASC",
+            [SECONDS_PER_CHAR, *args],
+        )
+        try:
+            for title, namespace_id, cost in cursor:
+                yield (title, namespace_id), cost
+        finally:
+            cursor.close()
+        return
+
+    assert timings is not None
+    conn.execute("ATTACH DATABASE ? AS prev_timings", (str(timings.path),))
+    try:
+        cursor = conn.execute(
+            "SELECT p.title, p.namespace_id, "
+            "coalesce(t.seconds, p.length * ?) AS cost FROM "
+            "(SELECT title, namespace_id, coalesce(length(body), 0) AS length "
+            f"FROM pages WHERE {where}) AS p "
+            "LEFT JOIN prev_timings.timings AS t USING (title, namespace_id) "
+            "ORDER BY cost DESC, title ASC",
+            [seconds_per_char, *args],
+        )
+        try:
+            for title, namespace_id, cost in cursor:
+                yield (title, namespace_id), cost
+        finally:
+            cursor.close()
+    finally:
+        conn.execute("DETACH DATABASE prev_timings")
+
+
+def load_page(wxr: WiktextractContext, key: PageKey) -> Page:
+    """Reads a page saved in the first phase from the database."""
+    for r in wxr.wtp.db_conn.execute(
+        "SELECT title, namespace_id, redirect_to, need_pre_expand, body, "
+        "model FROM pages WHERE title = ? AND namespace_id = ?",
+        key,
+    ):
+        return Page(
+            title=r[0],
+            namespace_id=r[1],
+            redirect_to=r[2],
+            need_pre_expand=bool(r[3]),
+            body=r[4],
+            model=r[5],
+        )
+    raise KeyError(f"page {key} is not in the database")
+
+
+class ReprocessOptions:
+    """Options of `reprocess_wiktionary()`.
+
+    If ``workers_read_pages`` is True, only page titles are sent to the
+    worker processes, which read the page bodies from their own database
+    connections; otherwise the parent reads every page and pickles it to
+    the workers.
+
+    If ``shard`` is given, only the pages of that shard are processed and
+    the words that only occur in the thesaurus are not emitted; they are
+    added once by ``merge_shard_outputs()``.
+
+    If ``checkpoint`` is given, the finished pages are recorded in its
+    journal, and when resuming, the pages already recorded are skipped and
+    the output is appended to the output file.
+
+    If ``manifest`` is given, the location of each page's data in the
+    output and the pages each page depends on are stored in it.  If
+    ``previous_manifest`` is also given, the data of the pages that haven't
+    changed since that run is copied from its output instead of extracting
+    the pages again.  If ``reprocess_dependents_of`` is also given, only
+    the pages that used one of the pages with those titles (e.g.,
+    "Template:en-noun" after changing it with an override) and the pages
+    not in the previous run are extracted, without comparing the other
+    pages with the previous run.
+
+    Pages whose worker process crashes twice or exceeds the timeout of
+    ``worker_limits`` are reported as errors instead of stopping the run.
+    Pages are sent to the worker processes in batches of ``batch_size``
+    pages, or if it is 0, of as many pages as the measured processing
+    time allows.
+
+    If ``serialize_in_workers`` is True, the worker processes check and
+    serialize the extracted data, and the parent process writes it to the
+    output file from a separate thread.
+
+    If ``ordered_output`` is True, the data of the pages is written in the
+    order the pages are read from the database, by title, instead of the
+    order they finish in, so that two runs on the same database write the
+    same output.
+
+    If ``longest_first`` is True, the pages are processed in the order of
+    their processing time in the previous run recorded in ``timings``, or
+    estimated from their length, longest first, and short pages are
+    batched by their estimated time.  The processing times of this run
+    are recorded in ``timings``."""
+
+    __slots__ = (
+        "workers_read_pages",
+        "shard",
+        "checkpoint",
+        "manifest",
+        "previous_manifest",
+        "reprocess_dependents_of",
+        "worker_limits",
+        "longest_first",
+        "timings",
+        "batch_size",
+        "serialize_in_workers",
+        "ordered_output",
+    )
+
+    def __init__(
+        self,
+        workers_read_pages: bool = True,
+        shard: Optional[Shard] = None,
+        checkpoint: Optional[Checkpoint] = None,
+        manifest: Optional[Manifest] = None,
+        previous_manifest: Optional[Manifest] = None,
+        reprocess_dependents_of: Optional[list[str]] = None,
+        worker_limits: Optional[WorkerLimits] = None,
+        longest_first: bool = False,
+        timings: Optional[PageTimings] = None,
+        batch_size: int = 0,
+        serialize_in_workers: bool = False,
+        ordered_output: bool = False,
+    ):
+        self.workers_read_pages = workers_read_pages
+        self.shard = shard
+        self.checkpoint = checkpoint
+        self.manifest = manifest
+        self.previous_manifest = previous_manifest
+        self.reprocess_dependents_of = reprocess_dependents_of
+        self.worker_limits = worker_limits
+        self.longest_first = longest_first
+        self.timings = timings
+        self.batch_size = batch_size
+        self.serialize_in_workers = serialize_in_workers
+        self.ordered_output = ordered_output
 
 
 def parse_wiktionary(
@@ -94,6 +462,7 @@ def parse_wiktionary(
     override_folders: Optional[Union[list[str], list[Path]]] = None,
     skip_extract_dump: bool = False,
     save_pages_path: Optional[Union[str, Path]] = None,
+    options: Optional[ReprocessOptions] = None,
 ) -> None:
     """Parses Wiktionary from the dump file ``path`` (which should point
     to a "enwiktionary-<date>-pages-articles.xml.bz2" file.  This
@@ -121,18 +490,18 @@ def parse_wiktionary(
     )
 
     if not phase1_only:
-        reprocess_wiktionary(wxr, num_processes, out_f, human_readable)
+        reprocess_wiktionary(
+            wxr, num_processes, out_f, human_readable, options=options
+        )
 
 
-def write_json_data(data: dict, out_f: TextIO, human_readable: bool) -> None:
-    if out_f is not None:
-        if human_readable:
-            out_f.write(
-                json.dumps(data, indent=2, sort_keys=True, ensure_ascii=False)
-            )
-        else:
-            out_f.write(json.dumps(data, ensure_ascii=False))
-        out_f.write("\n")
+def write_json_data(
+    data: dict, out_f: OutputFile, human_readable: bool
+) -> None:
+    if isinstance(out_f, EntryOutput):
+        out_f.write_entry(data, human_readable)
+    elif out_f is not None:
+        out_f.write(json_text(data, human_readable))
 
 
 def estimate_progress(
@@ -160,8 +529,15 @@ def estimate_progress(
     return last_time
 
 
-def init_worker_process(worker_func, wxr: WiktextractContext) -> None:
+def init_worker_process(
+    worker_func,
+    wxr: WiktextractContext,
+    record_deps: bool = False,
+) -> None:
     wxr.reconnect_databases()
+    set_compact_json(wxr.config.compact_json)
+    if record_deps:
+        record_dependencies(wxr)
     worker_func.wxr = wxr
 
 
@@ -725,58 +1101,446 @@ def reprocess_wiktionary(
     out_f: TextIO,
     human_readable: bool = False,
     search_pattern: Optional[str] = None,
+    options: Optional[ReprocessOptions] = None,
 ) -> None:
-    """Reprocesses the Wiktionary from the sqlite db."""
+    """Reprocesses the Wiktionary from the sqlite db, see
+    `ReprocessOptions` for the ``options``."""
     logger.info("Second phase - processing pages")
+    if options is None:
+        options = ReprocessOptions()
+    shard = options.shard
+    checkpoint = options.checkpoint
+    manifest = options.manifest
+    timings = options.timings
 
     # Extract thesaurus data. This iterates over thesaurus pages,
-    # but is very fast.
-    if (
-        wxr.config.extract_thesaurus_pages
-        and thesaurus_linkage_number(wxr.thesaurus_db_conn) == 0  # type: ignore[arg-type]
-    ):
-        extract_thesaurus_data(wxr, num_processes)
+    # but is very fast.  Only the pages that changed since the thesaurus
+    # database was written are extracted.
+    if wxr.config.extract_thesaurus_pages:
+        extract_thesaurus_data(
+            wxr, num_processes, options.worker_limits, options.batch_size
+        )
 
-    emitted = set()
+    emitted = EmittedWords()
+    if checkpoint is not None:
+        emitted.update(checkpoint.start(wxr, out_f))
+    if manifest is not None:
+        manifest.start(
+            wxr,
+            checkpoint.offset
+            if checkpoint is not None and checkpoint.resume
+            else None,
+        )
     process_ns_ids: list[int] = list(
         {
             wxr.wtp.NAMESPACE_DATA.get(ns, {}).get("id", 0)  # type: ignore[call-overload]
             for ns in wxr.config.extract_ns_names
         }
     )
+    if shard is not None:
+        logger.info(f"Processing shard {shard[0]}/{shard[1]}")
+    changed_pages = None
+    previous_manifest = options.previous_manifest
+    if previous_manifest is not None:
+        previous_manifest.open()
+        if previous_manifest.matches_config(wxr):
+            changed_pages = copy_unchanged_pages(
+                wxr,
+                previous_manifest,
+                out_f,
+                emitted,
+                process_ns_ids,
+                search_pattern,
+                shard,
+                checkpoint,
+                manifest,
+                options.reprocess_dependents_of,
+            )
+        else:
+            logger.warning(
+                f"{previous_manifest.path} was written with different "
+                "settings or extractor version, extracting all pages"
+            )
+        previous_manifest.close()
     start_time = time.time()
     last_time = start_time
-    all_page_nums = wxr.wtp.saved_page_nums(
-        process_ns_ids, True, "wikitext", search_pattern
-    )
+    if changed_pages is not None:
+        all_page_nums = len(changed_pages)
+    else:
+        all_page_nums = count_pages(wxr, process_ns_ids, search_pattern, shard)
+        if checkpoint is not None:
+            all_page_nums -= len(checkpoint.done)
     wxr.remove_unpicklable_objects()
-    with Pool(num_processes, init_worker_process, (page_handler, wxr)) as pool:
+    with SupervisedExecutor(
+        num_processes,
+        select_page_handler(wxr, human_readable, options.serialize_in_workers),
+        init_worker_process,
+        (page_handler, wxr, manifest is not None),
+        options.worker_limits,
+        partial(preload_extractor_modules, wxr.wtp.lang_code, ["page"]),
+    ) as executor:
         wxr.reconnect_databases(False)
-        for processed_pages, (page_data, wtp_stats) in enumerate(
-            pool.imap_unordered(
-                page_handler,
-                wxr.wtp.get_all_pages(
-                    process_ns_ids, True, "wikitext", search_pattern
-                ),
+        if timings is not None:
+            timings.open()
+        pages = pages_to_process(
+            wxr, process_ns_ids, search_pattern, changed_pages, options
+        )
+        if options.ordered_output:
+            results = executor.imap(
+                wxr,
+                pages,
+                page_title,
+                options.batch_size,
+                options.longest_first,
             )
-        ):
+        else:
+            results = executor.imap_unordered(
+                wxr,
+                pages,
+                page_title,
+                options.batch_size,
+                options.longest_first,
+            )
+        writer = select_output_writer(out_f, options)
+        for processed_pages, (
+            page_key,
+            page_data,
+            wtp_stats,
+            page_hash,
+            deps,
+            timing,
+        ) in enumerate(results):
             wxr.config.merge_return(wtp_stats)
-            for dt in page_data:
-                check_json_data(wxr, dt)
-                write_json_data(dt, out_f, human_readable)
-                word = dt.get("word")
-                lang_code = dt.get("lang_code")
-                pos = dt.get("pos")
-                if word and lang_code and pos:
-                    emitted.add((word, lang_code, pos))
+            if timings is not None:
+                timings.record(page_key, timing[1], timing[0])
+            offset = writer.offset if writer is not None else 0
+            if options.serialize_in_workers:
+                data, page_emitted = page_data  # type: ignore[misc]
+                writer.write(data)  # type: ignore[union-attr]
+            else:
+                if wxr.config.projection is not None:
+                    # Checked and projected by the worker process
+                    page_data, page_emitted = page_data  # type: ignore[misc]
+                else:
+                    page_emitted = []
+                    for dt in page_data:
+                        check_json_data(wxr, dt)
+                        triple = emitted_triple(dt)
+                        if triple is not None:
+                            page_emitted.append(triple)
+                for dt in page_data:
+                    if writer is not None:
+                        writer.write(encode_json(dt, human_readable))
+                    else:
+                        write_json_data(dt, out_f, human_readable)
+            end_offset = writer.offset if writer is not None else 0
+            emitted.update(page_emitted)
+            if manifest is not None:
+                manifest.add_page(
+                    wxr,
+                    page_key,
+                    page_hash,
+                    offset,
+                    end_offset - offset,
+                    deps,
+                )
+            page_done(
+                wxr,
+                out_f,
+                page_key,
+                page_emitted,
+                checkpoint,
+                manifest,
+                writer,
+            )
             last_time = estimate_progress(
                 processed_pages, all_page_nums, start_time, last_time
             )
-    if wxr.config.dump_file_lang_code == "en":
+        if writer is not None:
+            writer.close()
+    if manifest is not None:
+        manifest.close()
+    if timings is not None:
+        timings.close()
+    if checkpoint is not None:
+        # Record the last pages before adding the thesaurus words, so that
+        # a resumed run only redoes the thesaurus part.
+        checkpoint.write(wxr, out_f)
+    if wxr.config.dump_file_lang_code == "en" and shard is None:
         emit_words_in_thesaurus(wxr, emitted, out_f, human_readable)
+    emitted.close()
     logger.info("Reprocessing wiktionary complete")
 
 
+def select_page_handler(
+    wxr: WiktextractContext, human_readable: bool, serialize_in_workers: bool
+) -> Callable:
+    """Returns the function that processes the pages in the worker
+    processes."""
+    if serialize_in_workers:
+        return partial(serializing_page_handler, human_readable)
+    if wxr.config.projection is not None:
+        return projecting_page_handler
+    return page_handler
+
+
+def select_output_writer(
+    out_f: TextIO, options: ReprocessOptions
+) -> Optional[OutputWriter]:
+    """Returns the writer of the data of the pages, or None if it is
+    written to ``out_f`` directly."""
+    # The manifest records the byte offsets of the data of each page,
+    # counted by the writer instead of asking the text file
+    if options.serialize_in_workers or options.manifest is not None:
+        return OutputWriter(out_f)
+    return None
+
+
+def pages_to_process(
+    wxr: WiktextractContext,
+    namespace_ids: list[int],
+    search_pattern: Optional[str],
+    changed_pages: Optional[list[PageKey]],
+    options: ReprocessOptions,
+) -> Iterator[Union[Page, PageKey, tuple[Union[Page, PageKey], float]]]:
+    """Returns the pages, or only their keys if the worker processes read
+    them, that are sent to the worker processes, and with
+    ``longest_first`` their estimated processing times."""
+    shard = options.shard
+    checkpoint = options.checkpoint
+    workers_read_pages = options.workers_read_pages
+    if options.longest_first:
+        # Skips the pages done before resuming
+        return scheduled_pages(
+            wxr,
+            namespace_ids,
+            search_pattern,
+            shard,
+            options.timings,
+            changed_pages,
+            checkpoint,
+            workers_read_pages,
+        )
+    pages: Iterator[Union[Page, PageKey]]
+    if changed_pages is not None and workers_read_pages:
+        pages = iter(changed_pages)
+    elif changed_pages is not None:
+        pages = (load_page(wxr, key) for key in changed_pages)
+    elif workers_read_pages:
+        pages = iter_page_keys(wxr, namespace_ids, search_pattern, shard)
+    elif shard is None:
+        pages = wxr.wtp.get_all_pages(
+            namespace_ids, True, "wikitext", search_pattern
+        )
+    else:
+        pages = (
+            load_page(wxr, key)
+            for key in iter_page_keys(wxr, namespace_ids, search_pattern, shard)
+        )
+    if checkpoint is not None and checkpoint.done:
+        done = checkpoint.done
+        pages = (
+            page
+            for page in pages
+            if (
+                (page.title, page.namespace_id)
+                if isinstance(page, Page)
+                else page
+            )
+            not in done
+        )
+    return pages
+
+
+def scheduled_pages(
+    wxr: WiktextractContext,
+    namespace_ids: list[int],
+    search_pattern: Optional[str],
+    shard: Optional[Shard],
+    timings: Optional[PageTimings],
+    changed_pages: Optional[list[PageKey]],
+    checkpoint: Optional[Checkpoint],
+    workers_read_pages: bool,
+) -> Iterator[tuple[Union[Page, PageKey], float]]:
+    """Yields the pages to process, longest first, with their estimated
+    processing times."""
+    only = set(changed_pages) if changed_pages is not None else None
+    done = checkpoint.done if checkpoint is not None else set()
+    for key, cost in iter_scheduled_page_keys(
+        wxr, namespace_ids, search_pattern, shard, timings
+    ):
+        if (only is not None and key not in only) or key in done:
+            continue
+        yield key if workers_read_pages else load_page(wxr, key), cost
+
+
+def emitted_triple(dt: dict) -> Optional[EmittedTriple]:
+    word = dt.get("word")
+    lang_code = dt.get("lang_code")
+    pos = dt.get("pos")
+    if word and lang_code and pos:
+        return word, lang_code, pos
+    return None
+
+
+def page_done(
+    wxr: WiktextractContext,
+    out_f: TextIO,
+    page_key: PageKey,
+    page_emitted: list[EmittedTriple],
+    checkpoint: Optional[Checkpoint],
+    manifest: Optional[Manifest],
+    writer: Optional[OutputWriter] = None,
+) -> None:
+    if checkpoint is None:
+        return
+    checkpoint.page_done(page_key, page_emitted)
+    if checkpoint.due():
+        if writer is not None:
+            writer.flush()
+        # The manifest must not lag behind the checkpoint journal, a
+        # resumed run only removes the pages after the journal's offset.
+        if manifest is not None:
+            manifest.commit()
+        checkpoint.write(wxr, out_f)
+
+
+def iter_json_objects(text: str) -> Iterator[dict]:
+    """Parses the JSON objects of output data, written with or without
+    ``human_readable``."""
+    decoder = json.JSONDecoder()
+    idx = 0
+    while True:
+        while idx < len(text) and text[idx].isspace():
+            idx += 1
+        if idx >= len(text):
+            return
+        obj, idx = decoder.raw_decode(text, idx)
+        yield obj
+
+
+def copy_unchanged_pages(
+    wxr: WiktextractContext,
+    previous_manifest: Manifest,
+    out_f: TextIO,
+    emitted: EmittedWords,
+    namespace_ids: list[int],
+    search_pattern: Optional[str],
+    shard: Optional[Shard],
+    checkpoint: Optional[Checkpoint],
+    manifest: Optional[Manifest],
+    dependents_of: Optional[list[str]] = None,
+) -> list[PageKey]:
+    """Copies the data of the pages that have not changed since the run
+    described by ``previous_manifest`` from its output file to ``out_f``,
+    and returns the keys of the other pages, which must be extracted.
+
+    If ``dependents_of`` is given, the pages that depend on one of the
+    pages with those titles are treated as changed instead of the pages
+    that differ from the previous run, which avoids reading and hashing
+    every page and dependency."""
+    logger.info(f"Copying unchanged pages from {previous_manifest.out_path}")
+    start_t = time.time()
+    if dependents_of is None:
+        changed_dep_sets = previous_manifest.changed_dep_sets(wxr)
+        columns = "title, namespace_id, body, redirect_to"
+    else:
+        changed_dep_sets = previous_manifest.dependent_dep_sets(
+            wxr, dependents_of
+        )
+        logger.info(
+            f"{len(changed_dep_sets)} dependency sets use "
+            + ", ".join(dependents_of)
+        )
+        columns = "title, namespace_id, NULL, NULL"
+    changed_pages = []
+    num_copied = 0
+    where, args = page_query(wxr, namespace_ids, search_pattern, shard)
+    writer = OutputWriter(out_f)
+    with previous_manifest.out_path.open("rb") as prev_f:
+        for title, namespace_id, body, redirect_to in wxr.wtp.db_conn.execute(
+            f"SELECT {columns} FROM pages WHERE {where} ORDER BY title ASC",
+            args,
+        ):
+            page_key = (title, namespace_id)
+            if checkpoint is not None and page_key in checkpoint.done:
+                continue
+            previous = previous_manifest.lookup_page(page_key)
+            if previous is None or previous[3] in changed_dep_sets:
+                changed_pages.append(page_key)
+                continue
+            prev_hash, prev_offset, prev_length, dep_set_id = previous
+            if dependents_of is None:
+                page_hash = hash_page(body, redirect_to)
+                if page_hash != prev_hash:
+                    changed_pages.append(page_key)
+                    continue
+            else:
+                page_hash = prev_hash
+            prev_f.seek(prev_offset)
+            data = prev_f.read(prev_length)
+            offset = writer.offset
+            writer.write(data)
+            page_emitted = []
+            for dt in iter_json_objects(data.decode("utf-8")):
+                triple = emitted_triple(dt)
+                if triple is not None:
+                    page_emitted.append(triple)
+            emitted.update(page_emitted)
+            if manifest is not None:
+                manifest.add_page(
+                    wxr,
+                    page_key,
+                    page_hash,
+                    offset,
+                    prev_length,
+                    previous_manifest.dependencies(dep_set_id),
+                )
+            page_done(
+                wxr,
+                out_f,
+                page_key,
+                page_emitted,
+                checkpoint,
+                manifest,
+                writer,
+            )
+            num_copied += 1
+    writer.close()
+    logger.info(
+        f"Copied {num_copied} unchanged pages, {len(changed_pages)} pages "
+        f"changed (took {time.time() - start_t:.1f}s)"
+    )
+    return changed_pages
+
+
+def merge_shard_outputs(
+    wxr: WiktextractContext,
+    shard_paths: list[str],
+    out_f: TextIO,
+    human_readable: bool = False,
+) -> None:
+    """Concatenates the JSON lines files written by ``reprocess_wiktionary()``
+    for each shard, in the given order, and then emits the words that only
+    occur in the thesaurus once for all shards.  The shard outputs must be
+    JSON lines, i.e., not written with ``human_readable``."""
+    logger.info(f"Merging {len(shard_paths)} shard outputs")
+    emitted = EmittedWords()
+    for path in shard_paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                out_f.write(line)
+                triple = emitted_triple(json.loads(line))
+                if triple is not None:
+                    emitted.add(triple)
+    if wxr.config.dump_file_lang_code == "en":
+        if wxr.config.extract_thesaurus_pages:
+            extract_thesaurus_data(wxr)
+        emit_words_in_thesaurus(wxr, emitted, out_f, human_readable)
+    emitted.close()
+    logger.info("Merging shard outputs complete")
+
+
 def process_ns_page_title(page: Page, ns_name: str) -> tuple[str, str]:
     text: str = page.body if page.body is not None else page.redirect_to  # type: ignore[assignment]
     title = page.title[page.title.find(":") + 1 :]
@@ -28,17 +28,32 @@ from wikitextprocessor import Wtp
 from wikitextprocessor.dumpparser import analyze_and_overwrite_pages
 
 from .categories import extract_categories
+from .checkpoint import Checkpoint
 from .config import WiktionaryConfig
+from .executor import WorkerLimits
 from .inflection import set_debug_cell_text
+from .jsonl_index import build_index
+from .manifest import Manifest
+from .output import (
+    EntryOutput,
+    PartitionedOutput,
+    open_output,
+    output_compression,
+    set_compact_json,
+)
+from .projection import Projection
+from .sqlite_dictionary import SqliteOutput
 from .template_override import template_override_fns
 from .thesaurus import (
     close_thesaurus_db,
     extract_thesaurus_data,
-    thesaurus_linkage_number,
 )
+from .timings import PageTimings
 from .wiktionary import (
+    ReprocessOptions,
     check_json_data,
     extract_namespace,
+    merge_shard_outputs,
     parse_page,
     parse_wiktionary,
     reprocess_wiktionary,
@@ -76,19 +91,29 @@ def process_single_page(
     # Extract Thesaurus data (this is a bit slow for a single page, but
     # needed for debugging linkages with thesaurus extraction).  This
     # is disabled by default to speed up single page testing.
-    if (
-        args.use_thesaurus
-        and wxr.config.extract_thesaurus_pages
-        and thesaurus_linkage_number(wxr.thesaurus_db_conn) == 0  # type: ignore[arg-type]
-    ):
+    if args.use_thesaurus and wxr.config.extract_thesaurus_pages:
         extract_thesaurus_data(wxr)
     # Parse the page
     ret = parse_page(wxr, title, text)
     for data in ret:
         check_json_data(wxr, data)
+        if wxr.config.projection is not None:
+            data = wxr.config.projection.apply(data)
         write_json_data(data, out_f, human_readable)
 
 
+def parse_shard(value: str) -> tuple[int, int]:
+    try:
+        k, n = map(int, value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard: {value!r}")
+    if n < 1 or not 0 <= k < n:
+        raise argparse.ArgumentTypeError(
+            f"shard must be K/N with 0 <= K < N: {value!r}"
+        )
+    return k, n
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Multilingual Wiktionary data extractor"
@@ -106,6 +131,49 @@ def main():
         default=None,
         help="Path where to write output (- for stdout)",
     )
+    parser.add_argument(
+        "--write-index",
+        action="store_true",
+        help="Write an index of the entries of the --out file by word, "
+        "language code and part of speech to <file>.idx",
+    )
+    parser.add_argument(
+        "--out-dir",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="Write the output to one file per language code in this "
+        "directory, with a manifest.json listing the files",
+    )
+    parser.add_argument(
+        "--out-parquet",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Write the output to a Parquet file instead of JSON lines "
+        "(needs the pyarrow package)",
+    )
+    parser.add_argument(
+        "--out-sqlite",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="Write the output to an SQLite database with accent- and "
+        "case-insensitive indexes of the words and forms",
+    )
+    parser.add_argument(
+        "--sqlite-fts",
+        action="store_true",
+        help="Also build a full-text index of the glosses in the "
+        "--out-sqlite database",
+    )
+    parser.add_argument(
+        "--partition-by-pos",
+        action="store_true",
+        default=False,
+        help="With --out-dir, write one file per language code and part "
+        "of speech",
+    )
     parser.add_argument(
         "--errors", type=str, help="File in which to save error information"
     )
@@ -231,6 +299,72 @@ def main():
         default=None,
         help="Number of parallel processes (default: #cpus)",
     )
+    parser.add_argument(
+        "--page-timeout",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="Kill and replace a worker process that spends more than this "
+        "many seconds on one page, reporting the page as an error "
+        "(default: 0, no timeout)",
+    )
+    parser.add_argument(
+        "--max-pages-per-worker",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Replace each worker process after it has processed N pages "
+        "(default: 0, never)",
+    )
+    parser.add_argument(
+        "--max-worker-rss",
+        type=int,
+        default=0,
+        metavar="MB",
+        help="Replace a worker process after a page if its resident memory "
+        "is over MB megabytes (Linux only; default: 0, never)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Send N pages at a time to each worker process (default: 0, "
+        "as many as take about half a second to process, measured while "
+        "running)",
+    )
+    parser.add_argument(
+        "--serialize-in-workers",
+        action="store_true",
+        default=False,
+        help="Check and serialize the extracted data in the worker "
+        "processes and write it from a separate thread, so that the main "
+        "process doesn't limit the speed with many worker processes",
+    )
+    parser.add_argument(
+        "--ordered-output",
+        action="store_true",
+        default=False,
+        help="Write the data of the pages in title order instead of the "
+        "order they finish in, so that runs on the same database write the "
+        "same output",
+    )
+    parser.add_argument(
+        "--longest-first",
+        action="store_true",
+        default=False,
+        help="Process the pages that take longest first (according to "
+        "--timings, or estimated from their length), sending short pages "
+        "to the worker processes in chunks",
+    )
+    parser.add_argument(
+        "--timings",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="SQLite file for the processing time of each page; read by "
+        "--longest-first and updated with the times of this run",
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
@@ -243,6 +377,29 @@ def main():
         default=False,
         help="Write output in human-readable JSON",
     )
+    parser.add_argument(
+        "--compact-json",
+        action="store_true",
+        default=False,
+        help="Write the JSON lines without spaces after ',' and ':', "
+        "encoded with orjson if it is installed",
+    )
+    parser.add_argument(
+        "--fields",
+        type=str,
+        default=None,
+        metavar="FIELDS",
+        help="Only write these comma-separated fields of the entries, "
+        "e.g., word,pos,senses.glosses,forms",
+    )
+    parser.add_argument(
+        "--exclude-fields",
+        type=str,
+        default=None,
+        metavar="FIELDS",
+        help="Don't write these comma-separated fields of the entries, "
+        "e.g., sounds,senses.examples",
+    )
     parser.add_argument(
         "--override",
         type=str,
@@ -304,8 +461,64 @@ def main():
         "character. Example: '%%==English==%%', '%%==Anglo_Saxon==%%'; "
         "functions only with ready database file",
     )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="Only process the K-th of N parts of the pages (K/N, "
+        "0 <= K < N); words only found in the thesaurus are emitted by "
+        "--merge-shards.  Pages are partitioned by a hash of their title, "
+        "so shards can be processed on different machines with copies of "
+        "the same database",
+    )
+    parser.add_argument(
+        "--merge-shards",
+        type=str,
+        nargs="+",
+        default=None,
+        help="Combine the outputs of all --shard runs into --out and add the "
+        "words only found in the thesaurus; requires --db-path",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Write a checkpoint journal next to the temporary --out file, "
+        "and continue from it if an interrupted run with --resume left one, "
+        "skipping the pages already written",
+    )
+    parser.add_argument(
+        "--write-manifest",
+        action="store_true",
+        default=False,
+        help="Write a manifest of the pages and the templates and modules "
+        "they use next to the --out file (--out path + .manifest), for "
+        "a later --incremental run",
+    )
+    parser.add_argument(
+        "--incremental",
+        type=str,
+        default=None,
+        help="Path of the output of a previous run with --write-manifest; "
+        "only extract the pages that changed since then and copy the data "
+        "of the other pages from that file (implies --write-manifest)",
+    )
+    parser.add_argument(
+        "--reprocess-dependents-of",
+        type=str,
+        action="append",
+        default=None,
+        metavar="TITLE",
+        help="With --incremental, only extract the pages that used this "
+        "page (e.g., Template:en-noun or Module:links) in the previous run, "
+        "for example after changing it with --override (may be repeated)",
+    )
     args = parser.parse_args()
 
+    if args.shard is not None and args.human_readable:
+        print("--shard output can't be written with --human-readable.")
+        sys.exit(1)
+
     if not args.quiet:
         logger.setLevel(logging.DEBUG)
 
@@ -358,17 +571,108 @@ def main():
 
     # Open output file.
     out_path = args.out
-    if not out_path and args.pages_dir:
+    checkpoint = None
+    manifest = None
+    previous_manifest = None
+    compressed = bool(out_path) and output_compression(out_path) is not None
+    if compressed and (args.resume or args.write_manifest or args.incremental):
+        # Checkpoints and manifests refer to positions in the output file
+        print(
+            "--resume, --write-manifest and --incremental can't be used "
+            "with compressed output."
+        )
+        sys.exit(1)
+    entry_outputs = [args.out_dir, args.out_parquet, args.out_sqlite]
+    num_entry_outputs = sum(1 for o in entry_outputs if o)
+    if num_entry_outputs > 0 and (
+        out_path
+        or num_entry_outputs > 1
+        or args.resume
+        or args.write_manifest
+        or args.incremental
+        or args.serialize_in_workers
+        or args.merge_shards
+    ):
+        print(
+            "--out-dir, --out-parquet and --out-sqlite can't be used with "
+            "each other, "
+            "--out, --resume, --write-manifest, --incremental, "
+            "--serialize-in-workers or --merge-shards."
+        )
+        sys.exit(1)
+    if args.write_index and (
+        not out_path
+        or out_path == "-"
+        or out_path.startswith("/dev/")
+        or compressed
+        or args.human_readable
+    ):
+        # The index has the positions of the lines in the output file
+        print(
+            "--write-index needs an uncompressed --out file and can't be "
+            "used with --human-readable."
+        )
+        sys.exit(1)
+    if args.ordered_output and args.longest_first:
+        # The order of --longest-first changes with the recorded timings
+        print("--ordered-output can't be used with --longest-first.")
+        sys.exit(1)
+    if args.partition_by_pos and not args.out_dir:
+        print("--partition-by-pos needs --out-dir.")
+        sys.exit(1)
+    if args.sqlite_fts and not args.out_sqlite:
+        print("--sqlite-fts needs --out-sqlite.")
+        sys.exit(1)
+    if args.out_dir:
+        out_tmp_path = None
+        out_f = PartitionedOutput(Path(args.out_dir), args.partition_by_pos)
+    elif args.out_parquet:
+        from .parquet import ParquetOutput
+
+        out_tmp_path = None
+        out_f = ParquetOutput(
+            Path(args.out_parquet), args.dump_file_language_code
+        )
+    elif args.out_sqlite:
+        out_tmp_path = None
+        out_f = SqliteOutput(Path(args.out_sqlite), args.sqlite_fts)
+    elif not out_path and args.pages_dir:
         out_f = None
     elif out_path and out_path != "-":
         if out_path.startswith("/dev/"):
             out_tmp_path = out_path
         else:
             out_tmp_path = out_path + ".tmp"
-        out_f = open(out_tmp_path, "w", buffering=1024 * 1024, encoding="utf-8")
+            if args.resume:
+                checkpoint = Checkpoint(
+                    Path(out_tmp_path + ".checkpoint"), args.resume
+                )
+            if args.write_manifest or args.incremental:
+                manifest = Manifest(
+                    Path(out_tmp_path + ".manifest"), Path(out_tmp_path)
+                )
+        out_f = open_output(out_tmp_path, args.resume)
     else:
         out_tmp_path = out_path
         out_f = sys.stdout
+    if (args.write_manifest or args.incremental) and manifest is None:
+        print("--write-manifest and --incremental need an --out file.")
+        sys.exit(1)
+    if args.reprocess_dependents_of and not args.incremental:
+        print("--reprocess-dependents-of needs --incremental.")
+        sys.exit(1)
+    if args.incremental:
+        previous_manifest = Manifest(
+            Path(args.incremental + ".manifest"), Path(args.incremental)
+        )
+        if not previous_manifest.path.exists():
+            print(f"{previous_manifest.path} not found.")
+            sys.exit(1)
+
+    worker_limits = WorkerLimits(
+        args.page_timeout, args.max_pages_per_worker, args.max_worker_rss
+    )
+    timings = PageTimings(Path(args.timings)) if args.timings else None
 
     # Create expansion context
 
@@ -387,6 +691,19 @@ def main():
         verbose=args.verbose,
         expand_tables=args.inflection_tables_file,
     )
+    conf.compact_json = args.compact_json
+    set_compact_json(args.compact_json)
+    if args.fields is not None or args.exclude_fields is not None:
+        try:
+            conf.projection = Projection(args.fields, args.exclude_fields)
+        except ValueError as e:
+            print(f"--fields or --exclude-fields: {e}")
+            sys.exit(1)
+        # Don't parse the sections whose data would be removed
+        for option in conf.projection.unused_captures(
+            args.dump_file_language_code
+        ):
+            setattr(conf, option, False)
 
     if not args.path and not args.db_path:
         print(
@@ -448,6 +765,17 @@ def main():
                 args.override,
                 skip_extract_dump,
                 args.pages_dir,
+                ReprocessOptions(
+                    checkpoint=checkpoint,
+                    manifest=manifest,
+                    previous_manifest=previous_manifest,
+                    worker_limits=worker_limits,
+                    longest_first=args.longest_first,
+                    timings=timings,
+                    batch_size=args.batch_size,
+                    serialize_in_workers=args.serialize_in_workers,
+                    ordered_output=args.ordered_output,
+                ),
             )
 
         if args.override is not None and args.path is None:
@@ -475,19 +803,38 @@ def main():
             # --errors with single page extraction
             wxr.config.merge_return(wxr.wtp.to_return())
 
-        if not args.path and not args.page and not args.skip_extraction:
+        if args.merge_shards:
+            merge_shard_outputs(
+                wxr, args.merge_shards, out_f, args.human_readable
+            )
+        elif not args.path and not args.page and not args.skip_extraction:
             # Parse again from the db file
             reprocess_wiktionary(
                 wxr,
                 args.num_processes,
                 out_f,
                 args.human_readable,
-                search_pattern=args.search_pattern,
+                args.search_pattern,
+                ReprocessOptions(
+                    shard=args.shard,
+                    checkpoint=checkpoint,
+                    manifest=manifest,
+                    previous_manifest=previous_manifest,
+                    reprocess_dependents_of=args.reprocess_dependents_of,
+                    worker_limits=worker_limits,
+                    longest_first=args.longest_first,
+                    timings=timings,
+                    batch_size=args.batch_size,
+                    serialize_in_workers=args.serialize_in_workers,
+                    ordered_output=args.ordered_output,
+                ),
             )
 
     finally:
         if out_path and out_path != "-" and out_f is not None:
             out_f.close()
+        elif isinstance(out_f, EntryOutput):
+            out_f.close()
 
     if args.modules_file:
         extract_namespace(wxr, "Module", args.modules_file)
@@ -514,6 +861,12 @@ def main():
         except FileNotFoundError:
             pass
         os.rename(out_tmp_path, out_path)
+        if checkpoint is not None:
+            checkpoint.remove()
+        if manifest is not None and manifest.path.exists():
+            os.replace(manifest.path, out_path + ".manifest")
+        if args.write_index:
+            build_index(out_path)
 
     if args.errors:
         with open(args.errors, "w", encoding="utf-8") as f:
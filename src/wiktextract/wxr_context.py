@@ -15,6 +15,7 @@ class WiktextractContext:
         "pos",
         "thesaurus_db_path",
         "thesaurus_db_conn",
+        "thesaurus_index",
     )
 
     def __init__(self, wtp: Wtp, config: WiktionaryConfig):
@@ -33,11 +34,14 @@ class WiktextractContext:
             if config.extract_thesaurus_pages
             else None
         )
+        # `ThesaurusIndex` loaded by `find_thesaurus_terms()`
+        self.thesaurus_index = None
 
     def reconnect_databases(self, check_same_thread: bool = True) -> None:
         # `multiprocessing.pool.Pool.imap()` runs in another thread, if the db
         # connection is used to create iterable data for `imap`,
         # `check_same_thread` must be `False`.
+        self.thesaurus_index = None
         if self.config.extract_thesaurus_pages:
             self.thesaurus_db_conn = sqlite3.connect(
                 self.thesaurus_db_path, check_same_thread=check_same_thread
@@ -52,6 +56,7 @@ class WiktextractContext:
         if self.config.extract_thesaurus_pages:
             self.thesaurus_db_conn.close()  # type: ignore[union-attr]
         self.thesaurus_db_conn = None
+        self.thesaurus_index = None
         self.wtp.db_conn.close()
         self.wtp.db_conn = None  # type: ignore[assignment]
         self.wtp.lua = None
@@ -0,0 +1,66 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from wikitextprocessor import Wtp
+
+from wiktextract.checkpoint import Checkpoint
+from wiktextract.config import WiktionaryConfig
+from wiktextract.thesaurus import close_thesaurus_db
+from wiktextract.wxr_context import WiktextractContext
+
+
+class TestCheckpoint(TestCase):
+    def setUp(self):
+        self.wxr = WiktextractContext(Wtp(), WiktionaryConfig())
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.out_path = Path(self.tmp_dir.name) / "out.jsonl.tmp"
+        self.journal_path = Path(self.tmp_dir.name) / "out.jsonl.checkpoint"
+
+    def tearDown(self):
+        self.wxr.wtp.close_db_conn()
+        close_thesaurus_db(
+            self.wxr.thesaurus_db_path, self.wxr.thesaurus_db_conn
+        )
+        self.tmp_dir.cleanup()
+
+    def test_resume(self):
+        checkpoint = Checkpoint(self.journal_path)
+        with self.out_path.open("w", encoding="utf-8") as f:
+            self.assertEqual(checkpoint.start(self.wxr, f), set())
+            f.write('{"word": "a"}\n')
+            checkpoint.page_done(("a", 0), [("a", "en", "noun")])
+            self.wxr.config.errors.append({"msg": "error"})
+            checkpoint.write(self.wxr, f)
+            # not recorded in the journal
+            f.write('{"word": "b"}\n')
+            checkpoint.page_done(("b", 0), [("b", "en", "noun")])
+
+        wxr = WiktextractContext(Wtp(), WiktionaryConfig())
+        checkpoint = Checkpoint(self.journal_path, resume=True)
+        with self.out_path.open("a", encoding="utf-8") as f:
+            self.assertEqual(checkpoint.start(wxr, f), {("a", "en", "noun")})
+            f.write('{"word": "c"}\n')
+        wxr.wtp.close_db_conn()
+        self.assertEqual(checkpoint.done, {("a", 0)})
+        self.assertEqual(wxr.config.errors, [{"msg": "error"}])
+        self.assertEqual(
+            self.out_path.read_text(encoding="utf-8"),
+            '{"word": "a"}\n{"word": "c"}\n',
+        )
+
+    def test_incomplete_journal_line(self):
+        self.out_path.write_text('{"word": "a"}\n', encoding="utf-8")
+        self.journal_path.write_text(
+            '{"offset": 14, "pages": [["a", 0]], "emitted": [], '
+            '"errors": [], "warnings": [], "debugs": []}\n{"offset": 2',
+            encoding="utf-8",
+        )
+        checkpoint = Checkpoint(self.journal_path, resume=True)
+        with self.out_path.open("a", encoding="utf-8") as f:
+            checkpoint.start(self.wxr, f)
+        self.assertEqual(checkpoint.done, {("a", 0)})
+        self.assertEqual(checkpoint.offset, 14)
+        self.assertTrue(
+            self.journal_path.read_text(encoding="utf-8").endswith("}\n")
+        )
@@ -0,0 +1,203 @@
+import gc
+import os
+import signal
+import sys
+import time
+from unittest import TestCase
+
+from wikitextprocessor import Wtp
+
+from wiktextract.config import WiktionaryConfig
+from wiktextract.executor import (
+    NO_RESULT,
+    ReorderBuffer,
+    SupervisedExecutor,
+    WorkerLimits,
+    process_memory_mb,
+)
+from wiktextract.import_utils import preload_extractor_modules
+from wiktextract.thesaurus import close_thesaurus_db
+from wiktextract.wxr_context import WiktextractContext
+
+
+def process_item(item: str) -> tuple[str, int]:
+    if item == "hang":
+        time.sleep(60)
+    elif item == "crash":
+        os.kill(os.getpid(), signal.SIGKILL)
+    elif item == "raise":
+        raise ValueError(item)
+    return item, os.getpid()
+
+
+def failing_initializer() -> None:
+    raise ValueError("no such database")
+
+
+def exiting_initializer() -> None:
+    os._exit(3)
+
+
+def gc_state(item: str) -> tuple[int, bool]:
+    return gc.get_freeze_count(), gc.isenabled()
+
+
+inherited_value = None
+
+
+def set_inherited_value(value) -> None:
+    global inherited_value
+    inherited_value = value
+
+
+def get_inherited_value(item: str):
+    return inherited_value()
+
+
+def failing_preload() -> None:
+    raise ValueError("preload")
+
+
+class TestExecutor(TestCase):
+    def setUp(self):
+        self.wxr = WiktextractContext(Wtp(), WiktionaryConfig())
+
+    def tearDown(self):
+        self.wxr.wtp.close_db_conn()
+        close_thesaurus_db(
+            self.wxr.thesaurus_db_path, self.wxr.thesaurus_db_conn
+        )
+
+    def run_items(
+        self,
+        items: list,
+        limits: WorkerLimits,
+        chunk_size: int = 1,
+        costs: bool = False,
+    ) -> tuple[list[tuple[str, int]], list[str]]:
+        with SupervisedExecutor(2, process_item, limits=limits) as executor:
+            results = list(
+                executor.imap_unordered(
+                    self.wxr, items, lambda x: x, chunk_size, costs
+                )
+            )
+        return results, executor.quarantined
+
+    def test_timeout(self):
+        results, quarantined = self.run_items(
+            ["a", "hang", "b", "c"], WorkerLimits(timeout=1)
+        )
+        self.assertEqual(sorted(r[0] for r in results), ["a", "b", "c"])
+        self.assertEqual(quarantined, ["hang"])
+        self.assertEqual(self.wxr.config.errors[0]["title"], "hang")
+
+    def test_crash(self):
+        results, quarantined = self.run_items(
+            ["a", "crash", "b", "raise", "c"], WorkerLimits()
+        )
+        self.assertEqual(sorted(r[0] for r in results), ["a", "b", "c"])
+        self.assertEqual(sorted(quarantined), ["crash", "raise"])
+
+    def test_max_tasks(self):
+        results, _ = self.run_items(list("abcdef"), WorkerLimits(max_tasks=1))
+        self.assertEqual(len(results), 6)
+        self.assertEqual(len({pid for _, pid in results}), 6)
+
+    def test_chunks(self):
+        results, quarantined = self.run_items(
+            ["a", "crash", "b", "hang", "c"], WorkerLimits(timeout=1), 5
+        )
+        self.assertEqual(sorted(r[0] for r in results), ["a", "b", "c"])
+        self.assertEqual(sorted(quarantined), ["crash", "hang"])
+
+    def test_auto_chunk_size(self):
+        items = [str(i) for i in range(200)]
+        results, _ = self.run_items(items, WorkerLimits(), 0)
+        self.assertEqual(sorted(r[0] for r in results), sorted(items))
+
+    def test_chunk_costs(self):
+        results, quarantined = self.run_items(
+            [("big", 10), ("a", 0.1), ("crash", 0.1), ("b", 0.1), ("hang", 0)],
+            WorkerLimits(timeout=1),
+            costs=True,
+        )
+        self.assertEqual(sorted(r[0] for r in results), ["a", "b", "big"])
+        self.assertEqual(sorted(quarantined), ["crash", "hang"])
+        pids = {item: pid for item, pid in results}
+        self.assertNotEqual(pids["big"], pids["a"])
+
+    def test_ordered(self):
+        items = ["a", "crash", "b", "hang", "c", "d", "e"]
+        with SupervisedExecutor(
+            2, process_item, limits=WorkerLimits(timeout=1)
+        ) as executor:
+            results = list(
+                executor.imap(self.wxr, items, lambda x: x, 2, False, 1)
+            )
+        self.assertEqual([r[0] for r in results], ["a", "b", "c", "d", "e"])
+
+    def test_initializer_fails(self):
+        for initializer in (failing_initializer, exiting_initializer):
+            with self.subTest(initializer=initializer.__name__):
+                with SupervisedExecutor(
+                    2, process_item, initializer
+                ) as executor:
+                    with self.assertRaises(RuntimeError):
+                        list(
+                            executor.imap_unordered(
+                                self.wxr, ["a", "b"], lambda x: x
+                            )
+                        )
+                # No page is blamed
+                self.assertEqual(executor.quarantined, [])
+                self.assertEqual(self.wxr.config.errors, [])
+
+    def test_reorder_buffer(self):
+        buffer = ReorderBuffer(1)
+        buffer.add(2, "c")
+        buffer.add(3, "d")  # written to the temporary file
+        buffer.add(1, NO_RESULT)
+        self.assertEqual(list(buffer.pop_ready()), [])
+        buffer.add(0, "a")
+        self.assertEqual(list(buffer.pop_ready()), ["a", "c", "d"])
+        buffer.close()
+
+    def test_process_memory_mb(self):
+        memory = process_memory_mb(os.getpid())
+        if memory is not None:  # only known on Linux
+            unique, shared = memory
+            self.assertGreater(unique + shared, 0)
+
+    def test_preload_and_freeze(self):
+        with SupervisedExecutor(
+            1,
+            gc_state,
+            preload=lambda: preload_extractor_modules("en", ["thesaurus"]),
+        ) as executor:
+            self.assertIn("wiktextract.extractor.en.thesaurus", sys.modules)
+            # Only disabled and frozen while forking the workers
+            self.assertTrue(gc.isenabled())
+            self.assertEqual(gc.get_freeze_count(), 0)
+            results = list(
+                executor.imap_unordered(self.wxr, ["a"], lambda x: x)
+            )
+        freeze_count, enabled = results[0]
+        self.assertGreater(freeze_count, 0)
+        self.assertTrue(enabled)
+
+    def test_failing_preload(self):
+        with self.assertRaises(ValueError):
+            with SupervisedExecutor(1, gc_state, preload=failing_preload):
+                pass
+        self.assertTrue(gc.isenabled())
+
+    def test_inherited_initargs(self):
+        # Not picklable
+        value = lambda: "inherited"  # noqa: E731
+        with SupervisedExecutor(
+            1, get_inherited_value, set_inherited_value, (value,)
+        ) as executor:
+            results = list(
+                executor.imap_unordered(self.wxr, ["a"], lambda x: x)
+            )
+        self.assertEqual(results, ["inherited"])
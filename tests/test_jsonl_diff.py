@@ -0,0 +1,69 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from wiktextract.jsonl_diff import changed_paths, diff_files
+
+
+class TestJsonlDiff(TestCase):
+    def test_changed_paths(self):
+        paths = set()
+        changed_paths(
+            {
+                "word": "a",
+                "senses": [
+                    {"glosses": ["x"], "tags": ["t"]},
+                    {"glosses": ["y"]},
+                ],
+                "sounds": [{"ipa": "/a/"}],
+            },
+            {
+                "word": "a",
+                "senses": [{"glosses": ["x"]}, {"glosses": ["z"]}],
+                "sounds": [{"ipa": "/a/"}, {"ipa": "/ɑ/"}],
+                "forms": [],
+            },
+            "",
+            paths,
+        )
+        self.assertEqual(
+            paths, {"senses.glosses", "senses.tags", "sounds", "forms"}
+        )
+
+    def test_diff_files(self):
+        old = [
+            '{"word":"a","lang_code":"en","pos":"noun","senses":[]}',
+            '{"word":"b","lang_code":"en","pos":"noun","senses":[]}',
+            '{"word":"b","lang_code":"en","pos":"noun","etymology_number":2}',
+            '{"word":"c","lang_code":"en","pos":"verb"}',
+        ]
+        new = [
+            '{"word":"b","lang_code":"en","pos":"noun","senses":[{"x":1}]}',
+            '{"lang_code":"en","word":"a","pos":"noun","senses":[]}',
+            '{"word":"d","lang_code":"fi","pos":"noun"}',
+            '{"word":"b","lang_code":"en","pos":"noun","etymology_number":2}',
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            old_path = Path(tmp_dir) / "old.jsonl"
+            new_path = Path(tmp_dir) / "new.jsonl"
+            old_path.write_text("\n".join(old) + "\n", encoding="utf-8")
+            new_path.write_text("\n".join(new) + "\n", encoding="utf-8")
+            stats = diff_files(old_path, new_path, 2, tmp_dir)
+        self.assertEqual(
+            [
+                stats[name]
+                for name in (
+                    "old_entries",
+                    "new_entries",
+                    "unchanged",
+                    "changed",
+                    "removed",
+                    "added",
+                )
+            ],
+            [4, 4, 2, 1, 1, 1],
+        )
+        self.assertEqual(stats["fields"], {"senses": 1})
+        self.assertEqual(stats["samples"]["senses"], ["b/en/noun"])
+        self.assertEqual(stats["samples"]["removed"], ["c/en/verb"])
+        self.assertEqual(stats["samples"]["added"], ["d/fi/noun"])
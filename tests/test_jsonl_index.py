@@ -0,0 +1,73 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from wiktextract.jsonl_index import JsonlIndex, build_index, index_path
+
+
+class TestJsonlIndex(TestCase):
+    def test_lookup(self):
+        entries = [
+            '{"word":"b","lang_code":"en","pos":"noun"}',
+            '{"word":"ä","lang_code":"fi","pos":"noun"}',
+            '{"word":"b","lang_code":"de","pos":"noun"}',
+            '{"word":"bb","lang_code":"en","pos":"noun"}',
+            '{"title":"B","redirect":"b","pos":"hard-redirect"}',
+            '{"word":"b","lang_code":"en","pos":"verb"}',
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "out.jsonl"
+            path.write_text("\n".join(entries) + "\n", encoding="utf-8")
+            self.assertEqual(build_index(path), 6)
+            with JsonlIndex(path) as index:
+                self.assertEqual(len(index), 6)
+                self.assertEqual(
+                    [e["lang_code"] for e in index.lookup("b")],
+                    ["en", "de", "en"],
+                )
+                self.assertEqual(
+                    [e["pos"] for e in index.lookup("b", "en")],
+                    ["noun", "verb"],
+                )
+                self.assertEqual(
+                    index.lookup("b", "en", "verb"),
+                    [{"word": "b", "lang_code": "en", "pos": "verb"}],
+                )
+                self.assertEqual(len(index.lookup("b", pos="noun")), 2)
+                self.assertEqual(index.lookup("ä")[0]["lang_code"], "fi")
+                self.assertEqual(index.lookup("B")[0]["redirect"], "b")
+                self.assertEqual(index.lookup("c"), [])
+            with path.open("a", encoding="utf-8") as f:
+                f.write('{"word":"c"}\n')
+            with self.assertRaises(ValueError):
+                JsonlIndex(path)
+            self.assertTrue(index_path(path).exists())
+
+    def test_runs(self):
+        entries = [
+            f'{{"word":"{word}","lang_code":"en","pos":"noun"}}'
+            for word in ("c", "a", "b", "a", "d", "b", "a")
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "out.jsonl"
+            path.write_text("\n".join(entries) + "\n", encoding="utf-8")
+            build_index(path)
+            expected = index_path(path).read_bytes()
+            with patch("wiktextract.jsonl_index.RUN_RECORDS", 2):
+                build_index(path)
+            self.assertEqual(index_path(path).read_bytes(), expected)
+            self.assertEqual(
+                sorted(p.name for p in Path(tmp_dir).iterdir()),
+                ["out.jsonl", "out.jsonl.idx"],
+            )
+            with JsonlIndex(path) as index:
+                self.assertEqual(len(index.lookup("a")), 3)
+
+    def test_empty(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "out.jsonl"
+            path.touch()
+            build_index(path)
+            with JsonlIndex(path) as index:
+                self.assertEqual(index.lookup("a"), [])
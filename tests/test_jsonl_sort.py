@@ -0,0 +1,56 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from wiktextract.jsonl_sort import sort_file, sort_key
+
+
+class TestJsonlSort(TestCase):
+    def test_sort_key(self):
+        self.assertLess(
+            sort_key({"word": "a", "pos": "noun"}, ("word", "pos")),
+            sort_key({"word": "a b", "pos": "adj"}, ("word", "pos")),
+        )
+        self.assertLess(
+            sort_key({"etymology_number": 2}, ("etymology_number",)),
+            sort_key({"etymology_number": 10}, ("etymology_number",)),
+        )
+        self.assertEqual(
+            sort_key({"title": "A", "pos": "hard-redirect"}, ("word", "pos")),
+            b"A\0hard-redirect",
+        )
+
+    def test_sort_file(self):
+        entries = [
+            {"word": f"w{i % 37}", "lang_code": ["en", "fi"][i % 2], "n": i}
+            for i in range(500)
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            in_path = Path(tmp_dir) / "in.jsonl"
+            out_path = Path(tmp_dir) / "out.jsonl"
+            in_path.write_text(
+                "".join(json.dumps(e) + "\n" for e in entries),
+                encoding="utf-8",
+            )
+            # About ten runs of 2 kB, merged in several passes
+            with (
+                patch("wiktextract.jsonl_sort.MEMORY_PER_BYTE", 256),
+                patch("wiktextract.jsonl_sort.MAX_MERGE_RUNS", 3),
+            ):
+                count = sort_file(
+                    in_path,
+                    out_path,
+                    ("lang_code", "word"),
+                    memory_mb=1,
+                    num_processes=2,
+                    tmp_dir=tmp_dir,
+                )
+            self.assertEqual(count, 500)
+            with out_path.open(encoding="utf-8") as f:
+                result = [json.loads(line) for line in f]
+        self.assertEqual(
+            result,
+            sorted(entries, key=lambda e: (e["lang_code"], e["word"])),
+        )
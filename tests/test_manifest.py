@@ -0,0 +1,100 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from wikitextprocessor import Wtp
+
+from wiktextract.config import WiktionaryConfig
+from wiktextract.manifest import Manifest
+from wiktextract.thesaurus import close_thesaurus_db
+from wiktextract.wiktionary import iter_json_objects
+from wiktextract.wxr_context import WiktextractContext
+
+
+class TestManifest(TestCase):
+    def setUp(self):
+        self.wxr = WiktextractContext(Wtp(), WiktionaryConfig())
+        self.wxr.wtp.add_page("Template:x", 10, "x")
+        self.wxr.wtp.add_page("Module:y", 828, "return {}")
+        self.wxr.wtp.db_conn.commit()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "out.jsonl.manifest"
+        self.out_path = Path(self.tmp_dir.name) / "out.jsonl"
+
+    def tearDown(self):
+        self.wxr.wtp.close_db_conn()
+        close_thesaurus_db(
+            self.wxr.thesaurus_db_path, self.wxr.thesaurus_db_conn
+        )
+        self.tmp_dir.cleanup()
+
+    def write_manifest(self) -> None:
+        manifest = Manifest(self.path, self.out_path)
+        manifest.start(self.wxr)
+        manifest.add_page(
+            self.wxr,
+            ("a", 0),
+            "hash_a",
+            0,
+            10,
+            [("Template:x", 10), ("Module:y", 828)],
+        )
+        manifest.add_page(
+            self.wxr,
+            ("b", 0),
+            "hash_b",
+            10,
+            20,
+            [("Module:y", 828), ("Template:x", 10)],
+        )
+        manifest.add_page(self.wxr, ("c", 0), "hash_c", 30, 5, [])
+        manifest.close()
+
+    def test_unchanged(self):
+        self.write_manifest()
+        manifest = Manifest(self.path, self.out_path)
+        manifest.open()
+        self.assertTrue(manifest.matches_config(self.wxr))
+        self.assertEqual(manifest.changed_dep_sets(self.wxr), set())
+        self.assertEqual(manifest.lookup_page(("b", 0)), ("hash_b", 10, 20, 1))
+        self.assertEqual(
+            manifest.dependencies(1), [("Template:x", 10), ("Module:y", 828)]
+        )
+        manifest.close()
+
+    def test_changed_dependency(self):
+        self.write_manifest()
+        self.wxr.wtp.add_page("Module:y", 828, "return {1}")
+        self.wxr.wtp.db_conn.commit()
+        manifest = Manifest(self.path, self.out_path)
+        manifest.open()
+        # pages "a" and "b" share the same dependency set
+        self.assertEqual(manifest.changed_dep_sets(self.wxr), {1})
+        manifest.close()
+
+    def test_dependent_dep_sets(self):
+        self.write_manifest()
+        manifest = Manifest(self.path, self.out_path)
+        manifest.open()
+        self.assertEqual(
+            manifest.dependent_dep_sets(self.wxr, ["Template:x"]), {1}
+        )
+        self.assertEqual(
+            manifest.dependent_dep_sets(self.wxr, ["module:y"]), {1}
+        )
+        self.assertEqual(manifest.dependent_dep_sets(self.wxr, ["z"]), set())
+        manifest.close()
+
+    def test_resume(self):
+        self.write_manifest()
+        manifest = Manifest(self.path, self.out_path)
+        manifest.start(self.wxr, 30)
+        self.assertIsNone(manifest.lookup_page(("c", 0)))
+        self.assertIsNotNone(manifest.lookup_page(("b", 0)))
+        manifest.close()
+
+    def test_iter_json_objects(self):
+        self.assertEqual(
+            list(iter_json_objects('{"a": 1}\n{\n  "b": 2\n}\n')),
+            [{"a": 1}, {"b": 2}],
+        )
@@ -0,0 +1,163 @@
+import gzip
+import io
+import json
+import lzma
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from wiktextract.output import (
+    COMPRESSORS,
+    BlockCompressingFile,
+    OutputWriter,
+    PartitionedOutput,
+    encode_json,
+    encode_json_orjson,
+    encode_json_stdlib,
+    json_text,
+    open_output,
+    orjson,
+    set_compact_json,
+)
+
+
+class TestOutputWriter(TestCase):
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "out.jsonl"
+            with path.open("w", encoding="utf-8") as f:
+                f.write('{"word": "a"}\n')
+                writer = OutputWriter(f, 2)
+                self.assertEqual(writer.offset, 14)
+                for word in ["ä", "b", "c"]:
+                    writer.write(f'{{"word": "{word}"}}\n'.encode("utf-8"))
+                writer.flush()
+                self.assertEqual(f.tell(), writer.offset)
+                writer.write(b'{"word": "d"}\n')
+                writer.close()
+                self.assertEqual(writer.offset, 71)
+            self.assertEqual(
+                path.read_text(encoding="utf-8"),
+                "".join(f'{{"word": "{w}"}}\n' for w in "aäbcd"),
+            )
+
+    def test_text_file(self):
+        f = io.StringIO()
+        writer = OutputWriter(f)
+        writer.write("ä\n".encode("utf-8"))
+        writer.close()
+        self.assertEqual(f.getvalue(), "ä\n")
+
+    def test_encoders(self):
+        if orjson is None:
+            self.skipTest("orjson is not installed")
+        data = {
+            "word": 'ä\x01"\\\n/',
+            "senses": [{"tags": [], "raw_tags": {}, "depth": 2}],
+            "b": [True, None, False, -1],
+            "a": {"1": 2**70},
+        }
+        for human_readable in (False, True):
+            self.assertEqual(
+                encode_json_orjson(data, human_readable),
+                encode_json_stdlib(data, human_readable, True),
+            )
+
+    def test_same_bytes_without_orjson(self):
+        entries = [
+            {
+                "word": "ä",
+                "lang_code": "fi",
+                "pos": "noun",
+                "senses": [
+                    {"glosses": ["a", "b"], "tags": ["rare"], "id": "x-1"}
+                ],
+                "etymology_number": 2,
+                "forms": [{"form": "äät", "tags": ["plural"]}],
+            },
+            {"title": "Ä", "redirect": "ä", "pos": "hard-redirect"},
+            {"word": '"\\/\n\t\x01', "senses": [], "b": [True, None]},
+        ]
+        self.addCleanup(set_compact_json, False)
+        for compact in (False, True):
+            set_compact_json(compact)
+            for human_readable in (False, True):
+                for data in entries:
+                    encoded = encode_json(data, human_readable)
+                    with patch("wiktextract.output.orjson", None):
+                        self.assertEqual(
+                            encode_json(data, human_readable), encoded
+                        )
+                    self.assertEqual(
+                        json_text(data, human_readable), encoded.decode()
+                    )
+        set_compact_json(False)
+        # The json module's default separators, as before orjson
+        self.assertEqual(
+            encode_json(entries[0], False),
+            (json.dumps(entries[0], ensure_ascii=False) + "\n").encode(),
+        )
+
+    def test_compressed_output(self):
+        data = "".join(f'{{"word": "{i}"}}\n' for i in range(1000))
+        for suffix, decompress in [
+            (".gz", gzip.decompress),
+            (".xz", lzma.decompress),
+        ]:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = Path(tmp_dir) / ("out.jsonl" + suffix + ".tmp")
+                with path.open("wb") as raw:
+                    with io.TextIOWrapper(
+                        BlockCompressingFile(raw, COMPRESSORS[suffix], 2, 100),
+                        encoding="utf-8",
+                    ) as f:
+                        f.write(data)
+                self.assertEqual(
+                    decompress(path.read_bytes()).decode("utf-8"), data
+                )
+                with open_output(str(path)) as f:
+                    writer = OutputWriter(f)
+                    writer.write(data.encode("utf-8"))
+                    writer.close()
+                self.assertEqual(
+                    decompress(path.read_bytes()).decode("utf-8"), data
+                )
+
+
+class TestPartitionedOutput(TestCase):
+    def test_partitions(self):
+        entries = [
+            {"word": "a", "lang_code": "en", "pos": "noun"},
+            {"word": "b", "lang_code": "fi", "pos": "verb"},
+            {"word": "c", "lang_code": "en", "pos": "noun"},
+            {"title": "d", "redirect": "a", "pos": "hard-redirect"},
+            {"word": "e", "lang_code": "en", "pos": "name/title"},
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_dir = Path(tmp_dir)
+            output = PartitionedOutput(out_dir, by_pos=True, max_open=1)
+            for entry in entries:
+                output.write_entry(entry, False)
+            output.close()
+            self.assertEqual(
+                (out_dir / "en/noun.jsonl").read_text(encoding="utf-8"),
+                '{"word": "a", "lang_code": "en", "pos": "noun"}\n'
+                '{"word": "c", "lang_code": "en", "pos": "noun"}\n',
+            )
+            self.assertTrue((out_dir / "en/name_title.jsonl").exists())
+            with (out_dir / "manifest.json").open(encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.assertEqual(manifest["partition_by"], ["lang_code", "pos"])
+            self.assertEqual(
+                [
+                    (p["path"], p["entries"], p["bytes"])
+                    for p in manifest["partitions"]
+                ],
+                [
+                    ("_unknown.jsonl", 1, 56),
+                    ("en/name_title.jsonl", 1, 54),
+                    ("en/noun.jsonl", 2, 96),
+                    ("fi/verb.jsonl", 1, 48),
+                ],
+            )
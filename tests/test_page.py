@@ -899,3 +899,32 @@ alcance
                 }
             ],
         )
+
+    def test_slice_captured_languages(self):
+        from wiktextract.extractor.en.page import slice_captured_languages
+
+        self.wxr.config.capture_language_codes = {"en", "mul"}
+        text = """{{also|A}}
+==English==
+===Noun===
+# sense 1
+==French==
+===Noun===
+# sense 2
+====Translingual====
+# sense 3
+==Finnish==
+# sense 4
+"""
+        self.assertEqual(
+            slice_captured_languages(self.wxr, text),
+            """{{also|A}}
+==English==
+===Noun===
+# sense 1
+====Translingual====
+# sense 3
+""",
+        )
+        self.wxr.config.capture_language_codes = None
+        self.assertEqual(slice_captured_languages(self.wxr, text), text)
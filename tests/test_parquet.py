@@ -0,0 +1,57 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase, skipIf
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+@skipIf(pq is None, "pyarrow is not installed")
+class TestParquet(TestCase):
+    def test_schema(self):
+        from wiktextract.parquet import entry_schema
+
+        schema = entry_schema("en")
+        self.assertEqual(
+            str(schema.field("lang_code").type.value_type), "string"
+        )
+        self.assertEqual(
+            str(schema.field("senses").type.value_type.field("glosses").type),
+            "list<item: string>",
+        )
+        # Recursive descendant trees are stored as JSON below the first level
+        descendant = entry_schema("zh").field("descendants").type.value_type
+        self.assertEqual(
+            str(descendant.field("descendants").type), "list<item: string>"
+        )
+
+    def test_write(self):
+        from wiktextract.parquet import ParquetOutput
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "out.parquet"
+            output = ParquetOutput(path, "en")
+            output.write_entry(
+                {
+                    "word": "dog",
+                    "lang_code": "en",
+                    "pos": "noun",
+                    "senses": [{"glosses": ["animal"], "tags": ["common"]}],
+                    "head_templates": [{"name": "en-noun", "args": {"1": "s"}}],
+                    "not_in_model": 1,
+                },
+                False,
+            )
+            output.write_entry(
+                {"title": "Dog", "redirect": "dog", "pos": "hard-redirect"},
+                False,
+            )
+            output.close()
+            rows = pq.read_table(path).to_pylist()
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["senses"][0]["tags"], ["common"])
+        self.assertEqual(rows[0]["head_templates"][0]["args"], '{"1": "s"}')
+        self.assertNotIn("not_in_model", rows[0])
+        self.assertEqual(rows[1]["redirect"], "dog")
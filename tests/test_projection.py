@@ -0,0 +1,148 @@
+from unittest import TestCase
+
+from wikitextprocessor import Wtp
+
+from wiktextract.config import WiktionaryConfig
+from wiktextract.page import parse_page
+from wiktextract.projection import CAPTURE_FIELDS, Projection, parse_fields
+from wiktextract.thesaurus import close_thesaurus_db
+from wiktextract.wxr_context import WiktextractContext
+
+
+class TestProjection(TestCase):
+    entry = {
+        "word": "dog",
+        "lang_code": "en",
+        "pos": "noun",
+        "forms": [{"form": "dogs", "tags": ["plural"]}],
+        "sounds": [{"ipa": "/dɒɡ/"}],
+        "senses": [
+            {"glosses": ["animal"], "examples": [{"text": "a dog"}]},
+            {"glosses": ["person"], "tags": ["slang"]},
+        ],
+    }
+
+    def test_parse_fields(self):
+        self.assertEqual(
+            parse_fields("senses.glosses, word,senses,forms.form"),
+            {"senses": {}, "word": {}, "forms": {"form": {}}},
+        )
+        self.assertEqual(parse_fields("senses,senses.glosses"), {"senses": {}})
+        with self.assertRaises(ValueError):
+            parse_fields("word,,pos")
+
+    def test_fields(self):
+        projection = Projection("word,pos,senses.glosses,forms")
+        self.assertEqual(
+            projection.apply(self.entry),
+            {
+                "word": "dog",
+                "lang_code": "en",
+                "pos": "noun",
+                "forms": [{"form": "dogs", "tags": ["plural"]}],
+                "senses": [{"glosses": ["animal"]}, {"glosses": ["person"]}],
+            },
+        )
+        # The key fields are always written
+        self.assertEqual(
+            Projection("senses.glosses").apply(self.entry),
+            {
+                "word": "dog",
+                "lang_code": "en",
+                "pos": "noun",
+                "senses": [{"glosses": ["animal"]}, {"glosses": ["person"]}],
+            },
+        )
+        redirect = {"title": "Dog", "redirect": "dog", "pos": "hard-redirect"}
+        self.assertEqual(projection.apply(redirect), redirect)
+
+    def test_exclude_fields(self):
+        projection = Projection(None, "sounds,senses.examples,forms.tags")
+        self.assertEqual(
+            projection.apply(self.entry),
+            {
+                "word": "dog",
+                "lang_code": "en",
+                "pos": "noun",
+                "forms": [{"form": "dogs"}],
+                "senses": [
+                    {"glosses": ["animal"]},
+                    {"glosses": ["person"], "tags": ["slang"]},
+                ],
+            },
+        )
+        self.assertEqual(projection.unused_captures("en"), [])
+        for exclude_fields in ("word", "sounds,lang_code", "pos"):
+            with self.assertRaises(ValueError):
+                Projection(None, exclude_fields)
+
+    def test_unused_captures(self):
+        self.assertEqual(
+            Projection("word,pos,senses.glosses,forms").unused_captures("en"),
+            [
+                "capture_translations",
+                "capture_linkages",
+                "capture_compounds",
+                "capture_examples",
+                "capture_etymologies",
+                "capture_descendants",
+            ],
+        )
+        self.assertEqual(
+            Projection("word,senses.glosses").unused_captures("en"),
+            list(CAPTURE_FIELDS["en"]),
+        )
+        # Whole senses may have the categories and tags of any section
+        self.assertEqual(Projection("word,senses").unused_captures("en"), [])
+        # Not known for the other editions
+        self.assertEqual(
+            Projection("word,pos,synonyms").unused_captures("pl"), []
+        )
+
+
+class TestProjectedExtraction(TestCase):
+    maxDiff = None
+
+    page = """==Korean==
+
+===Pronunciation===
+* (Seoul) Revised Romanization gae
+
+===Noun===
+개
+
+# dog
+#: 개가 짖는다.
+
+====Synonyms====
+* [[견]]
+
+====Translations====
+* English: [[dog]]
+"""
+
+    def extract(self, projection: Projection) -> list[dict]:
+        config = WiktionaryConfig(
+            dump_file_lang_code="en",
+            capture_language_codes=None,
+            capture_translations=True,
+            capture_pronunciation=True,
+            capture_linkages=True,
+            capture_examples=True,
+        )
+        for option in projection.unused_captures("en"):
+            setattr(config, option, False)
+        wxr = WiktextractContext(Wtp(lang_code="en"), config)
+        try:
+            return parse_page(wxr, "개", self.page)
+        finally:
+            wxr.wtp.close_db_conn()
+            close_thesaurus_db(wxr.thesaurus_db_path, wxr.thesaurus_db_conn)
+
+    def test_same_as_unprojected(self):
+        projection = Projection("word,pos,senses.glosses,forms")
+        self.assertIn("capture_examples", projection.unused_captures("en"))
+        self.assertEqual(
+            [projection.apply(data) for data in self.extract(projection)],
+            [projection.apply(data) for data in self.extract(Projection())],
+        )
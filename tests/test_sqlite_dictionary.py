@@ -0,0 +1,56 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from wiktextract.sqlite_dictionary import (
+    SqliteOutput,
+    lookup_word,
+    search_glosses,
+    search_key,
+)
+
+
+class TestSqliteDictionary(TestCase):
+    def test_search_key(self):
+        self.assertEqual(search_key("Kůň"), "kun")
+        self.assertEqual(search_key("Straße"), "strasse")
+        self.assertEqual(search_key("한국"), search_key("한국"))
+
+    def test_lookup(self):
+        entries = [
+            {
+                "word": "café",
+                "lang_code": "fr",
+                "pos": "noun",
+                "forms": [{"form": "cafés"}, {"form": "cafés"}],
+                "senses": [{"glosses": ["coffee"]}, {"glosses": ["café"]}],
+            },
+            {
+                "word": "Cafe",
+                "lang_code": "en",
+                "pos": "noun",
+                "senses": [{"glosses": ["a small restaurant serving coffee"]}],
+            },
+            {"title": "Café", "redirect": "café", "pos": "hard-redirect"},
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "dictionary.db"
+            output = SqliteOutput(path, fts=True)
+            for entry in entries:
+                output.write_entry(entry, False)
+            output.close()
+            self.assertFalse(path.with_name("dictionary.db.tmp").exists())
+            conn = sqlite3.connect(path)
+            self.assertEqual(lookup_word(conn, "CAFE"), entries)
+            self.assertEqual(lookup_word(conn, "cafe", "en"), [entries[1]])
+            self.assertEqual(lookup_word(conn, "cafes"), [])
+            self.assertEqual(
+                lookup_word(conn, "cafes", forms=True), [entries[0]]
+            )
+            self.assertEqual(lookup_word(conn, "cafes", "en", forms=True), [])
+            self.assertEqual(
+                search_glosses(conn, "coffee"), [entries[0], entries[1]]
+            )
+            self.assertEqual(search_glosses(conn, "cafe"), [entries[0]])
+            conn.close()
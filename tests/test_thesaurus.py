@@ -0,0 +1,299 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import patch
+
+from wikitextprocessor import Wtp
+
+from wiktextract.config import WiktionaryConfig
+from wiktextract.manifest import pop_dependencies, record_dependencies
+from wiktextract.thesaurus import (
+    EmittedWords,
+    ThesaurusLoader,
+    ThesaurusTerm,
+    close_thesaurus_db,
+    emit_words_in_thesaurus,
+    extract_thesaurus_data,
+    extract_thesaurus_pages,
+    find_thesaurus_terms,
+    init_thesaurus_db,
+    insert_thesaurus_term,
+    search_thesaurus,
+)
+from wiktextract.wxr_context import WiktextractContext
+
+
+class TestThesaurusIndex(TestCase):
+    def setUp(self) -> None:
+        self.wxr = WiktextractContext(Wtp(), WiktionaryConfig())
+
+    def tearDown(self) -> None:
+        self.wxr.wtp.close_db_conn()
+        close_thesaurus_db(
+            self.wxr.thesaurus_db_path, self.wxr.thesaurus_db_conn
+        )
+
+    def test_same_as_search_thesaurus(self):
+        for term, linkage, tags in [
+            ("hound", "synonyms", ["archaic"]),
+            ("canine", "synonyms", []),
+            ("cat", "antonyms", []),
+        ]:
+            insert_thesaurus_term(
+                self.wxr.thesaurus_db_conn,
+                ThesaurusTerm(
+                    entry="dog",
+                    language_code="en",
+                    pos="noun",
+                    linkage=linkage,
+                    term=term,
+                    tags=tags,
+                    sense="animal",
+                ),
+            )
+        for linkage_type in (None, "synonyms"):
+            self.assertEqual(
+                list(
+                    find_thesaurus_terms(
+                        self.wxr, "dog", "en", "noun", linkage_type
+                    )
+                ),
+                list(
+                    search_thesaurus(
+                        self.wxr.thesaurus_db_conn,
+                        "dog",
+                        "en",
+                        "noun",
+                        linkage_type,
+                    )
+                ),
+            )
+        self.assertEqual(
+            [
+                t.term
+                for t in find_thesaurus_terms(self.wxr, "dog", "en", "noun")
+            ],
+            ["hound", "canine", "cat"],
+        )
+        self.assertEqual(
+            list(find_thesaurus_terms(self.wxr, "dog", "en", "verb")), []
+        )
+
+    def test_reload_after_insert(self):
+        self.assertEqual(
+            list(find_thesaurus_terms(self.wxr, "dog", "en", "noun")), []
+        )
+        insert_thesaurus_term(
+            self.wxr.thesaurus_db_conn,
+            ThesaurusTerm(
+                entry="dog",
+                language_code="en",
+                pos="noun",
+                linkage="synonyms",
+                term="hound",
+            ),
+        )
+        self.assertEqual(
+            [
+                t.term
+                for t in find_thesaurus_terms(self.wxr, "dog", "en", "noun")
+            ],
+            ["hound"],
+        )
+
+    def test_record_thesaurus_pages(self):
+        conn = self.wxr.thesaurus_db_conn
+        (page_id,) = conn.execute(
+            "INSERT INTO pages (title, hash) "
+            "VALUES('Thesaurus:canine', '') RETURNING id"
+        ).fetchone()
+        loader = ThesaurusLoader(conn)
+        loader.add(
+            ThesaurusTerm("dog", "en", "noun", "synonyms", "hound"), page_id
+        )
+        loader.close()
+        record_dependencies(self.wxr)
+        pop_dependencies()
+        list(find_thesaurus_terms(self.wxr, "dog", "en", "noun"))
+        ns_id = self.wxr.wtp.NAMESPACE_DATA["Thesaurus"]["id"]
+        self.assertEqual(
+            sorted(pop_dependencies()),
+            [("Thesaurus:canine", ns_id), ("Thesaurus:dog", ns_id)],
+        )
+
+
+class TestThesaurusLoader(TestCase):
+    TERMS = [
+        ThesaurusTerm("dog", "en", "noun", "synonyms", "hound", ["archaic"]),
+        ThesaurusTerm("dog", "en", "noun", "synonyms", "canine", sense="a"),
+        # The sense of the first term of the entry is kept
+        ThesaurusTerm("dog", "en", "noun", "antonyms", "cat", sense="b"),
+        # Duplicate terms are ignored
+        ThesaurusTerm("dog", "en", "noun", "antonyms", "cat", ["rare"]),
+        ThesaurusTerm("dog", "en", "verb", "synonyms", "follow"),
+        ThesaurusTerm("cat", "en", "noun", "synonyms", "feline"),
+    ]
+
+    def load(self, db_path, bulk: bool) -> tuple[list, list]:
+        conn = init_thesaurus_db(db_path)
+        if bulk:
+            loader = ThesaurusLoader(conn)
+            for term in self.TERMS:
+                loader.add(term)
+            loader.close()
+            self.assertEqual(loader.rows, 8)
+        else:
+            for term in self.TERMS:
+                insert_thesaurus_term(conn, term)
+            conn.commit()
+        entries = conn.execute("SELECT * FROM entries ORDER BY id").fetchall()
+        terms = conn.execute("SELECT * FROM terms ORDER BY rowid").fetchall()
+        conn.close()
+        return entries, terms
+
+    def test_same_as_insert_thesaurus_term(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(
+                self.load(Path(tmp) / "bulk.db", True),
+                self.load(Path(tmp) / "single.db", False),
+            )
+            conn = init_thesaurus_db(Path(tmp) / "bulk.db")
+            self.assertEqual(
+                {row[1] for row in conn.execute("PRAGMA index_list(entries)")},
+                {"entries_index"},
+            )
+            conn.close()
+
+
+class TestEmitWordsInThesaurus(TestCase):
+    def setUp(self) -> None:
+        self.wxr = WiktextractContext(Wtp(), WiktionaryConfig())
+
+    def tearDown(self) -> None:
+        self.wxr.wtp.close_db_conn()
+        close_thesaurus_db(
+            self.wxr.thesaurus_db_path, self.wxr.thesaurus_db_conn
+        )
+
+    def test_skip_emitted_words(self):
+        loader = ThesaurusLoader(self.wxr.thesaurus_db_conn)
+        for term in [
+            ThesaurusTerm(
+                "dog", "en", "noun", "synonyms", "hound", ["archaic"], sense="a"
+            ),
+            ThesaurusTerm("dog", "en", "noun", "antonyms", "cat"),
+            ThesaurusTerm("dog", "en", "noun", "synonyms", "canine"),
+            ThesaurusTerm("cat", "en", "noun", "synonyms", "feline"),
+        ]:
+            loader.add(term)
+        loader.close()
+        emitted = EmittedWords()
+        emitted.update([("cat", "en", "noun"), ("dog", "en", "verb")])
+        out_f = StringIO()
+        emit_words_in_thesaurus(self.wxr, emitted, out_f, False)
+        emitted.close()
+        self.assertEqual(
+            [json.loads(line) for line in out_f.getvalue().splitlines()],
+            [
+                {
+                    "word": "dog",
+                    "lang": "English",
+                    "lang_code": "en",
+                    "pos": "noun",
+                    "senses": [
+                        {
+                            "glosses": ["a"],
+                            "synonyms": [
+                                {
+                                    "word": "hound",
+                                    "source": "Thesaurus:dog",
+                                    "tags": ["archaic"],
+                                },
+                                {"word": "canine", "source": "Thesaurus:dog"},
+                            ],
+                            "antonyms": [
+                                {"word": "cat", "source": "Thesaurus:dog"}
+                            ],
+                        }
+                    ],
+                    "source": "thesaurus",
+                }
+            ],
+        )
+
+
+def fake_extract_thesaurus_page(wxr, page) -> list[ThesaurusTerm]:
+    entry = page.title.removeprefix("Thesaurus:")
+    return [
+        ThesaurusTerm(entry, "en", "noun", "synonyms", term)
+        for term in page.body.split()
+    ]
+
+
+@patch(
+    "wiktextract.thesaurus.extract_thesaurus_page", fake_extract_thesaurus_page
+)
+class TestThesaurusCache(TestCase):
+    def setUp(self) -> None:
+        self.wxr = WiktextractContext(Wtp(), WiktionaryConfig())
+        self.ns_id = self.wxr.wtp.NAMESPACE_DATA["Thesaurus"]["id"]
+
+    def tearDown(self) -> None:
+        self.wxr.wtp.close_db_conn()
+        close_thesaurus_db(
+            self.wxr.thesaurus_db_path, self.wxr.thesaurus_db_conn
+        )
+
+    def extract(self) -> list[str]:
+        """Returns the titles of the extracted pages."""
+        self.wxr.wtp.db_conn.commit()
+        with patch(
+            "wiktextract.thesaurus.extract_thesaurus_pages",
+            wraps=extract_thesaurus_pages,
+        ) as mock:
+            extract_thesaurus_data(self.wxr, 1)
+        if not mock.called:
+            return []
+        return sorted(mock.call_args.args[2])
+
+    def terms(self) -> list[tuple[str, str]]:
+        return sorted(
+            self.wxr.thesaurus_db_conn.execute(
+                "SELECT entry, term FROM terms "
+                "JOIN entries ON terms.entry_id = entries.id"
+            )
+        )
+
+    def test_extract_changed_pages(self):
+        self.wxr.wtp.add_page("Thesaurus:dog", self.ns_id, "hound canine")
+        self.wxr.wtp.add_page("Thesaurus:cat", self.ns_id, "feline")
+        self.assertEqual(self.extract(), ["Thesaurus:cat", "Thesaurus:dog"])
+        self.assertEqual(
+            self.terms(),
+            [("cat", "feline"), ("dog", "canine"), ("dog", "hound")],
+        )
+        self.assertEqual(self.extract(), [])
+
+        self.wxr.wtp.add_page("Thesaurus:dog", self.ns_id, "hound")
+        self.wxr.wtp.db_conn.execute(
+            "DELETE FROM pages WHERE title = 'Thesaurus:cat'"
+        )
+        self.assertEqual(self.extract(), ["Thesaurus:dog"])
+        self.assertEqual(self.terms(), [("dog", "hound")])
+        self.assertEqual(
+            self.wxr.thesaurus_db_conn.execute(
+                "SELECT entry FROM entries"
+            ).fetchall(),
+            [("dog",)],
+        )
+
+    def test_other_extractor_version(self):
+        self.wxr.wtp.add_page("Thesaurus:dog", self.ns_id, "hound")
+        self.assertEqual(self.extract(), ["Thesaurus:dog"])
+        with patch(
+            "wiktextract.thesaurus.extractor_version", return_value="0.0"
+        ):
+            self.assertEqual(self.extract(), ["Thesaurus:dog"])
+        self.assertEqual(self.terms(), [("dog", "hound")])
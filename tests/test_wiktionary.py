@@ -0,0 +1,87 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from wikitextprocessor import Page, Wtp
+
+from wiktextract.config import WiktionaryConfig
+from wiktextract.thesaurus import close_thesaurus_db
+from wiktextract.timings import PageTimings
+from wiktextract.wiktionary import (
+    count_pages,
+    iter_page_keys,
+    iter_scheduled_page_keys,
+    load_page,
+    page_shard,
+)
+from wiktextract.wxr_context import WiktextractContext
+
+
+class TestReprocess(TestCase):
+    def setUp(self):
+        self.wxr = WiktextractContext(Wtp(), WiktionaryConfig())
+        self.wxr.wtp.add_page("b", 0, "==English==")
+        self.wxr.wtp.add_page("a", 0, "==Finnish==")
+        self.wxr.wtp.add_page("c", 0, redirect_to="a")
+        self.wxr.wtp.add_page("Template:a", 10, "{{{1}}}")
+        self.wxr.wtp.db_conn.commit()
+
+    def tearDown(self):
+        self.wxr.wtp.close_db_conn()
+        close_thesaurus_db(
+            self.wxr.thesaurus_db_path, self.wxr.thesaurus_db_conn
+        )
+
+    def test_iter_page_keys(self):
+        self.assertEqual(
+            list(iter_page_keys(self.wxr, [0])),
+            [("a", 0), ("b", 0), ("c", 0)],
+        )
+        self.assertEqual(
+            list(iter_page_keys(self.wxr, [0], "%English%")), [("b", 0)]
+        )
+
+    def test_load_page(self):
+        page = load_page(self.wxr, ("a", 0))
+        self.assertIsInstance(page, Page)
+        self.assertEqual(page.body, "==Finnish==")
+        self.assertEqual(load_page(self.wxr, ("c", 0)).redirect_to, "a")
+        with self.assertRaises(KeyError):
+            load_page(self.wxr, ("d", 0))
+
+    def test_shards(self):
+        shards = [
+            list(iter_page_keys(self.wxr, [0], shard=(k, 2))) for k in (0, 1)
+        ]
+        self.assertEqual(
+            sorted(shards[0] + shards[1]), [("a", 0), ("b", 0), ("c", 0)]
+        )
+        for k in (0, 1):
+            self.assertEqual(
+                count_pages(self.wxr, [0], shard=(k, 2)), len(shards[k])
+            )
+            for title, _ in shards[k]:
+                self.assertEqual(page_shard(title, 2), k)
+
+    def test_scheduled_page_keys(self):
+        self.assertEqual(
+            [key for key, _ in iter_scheduled_page_keys(self.wxr, [0])],
+            [("a", 0), ("b", 0), ("c", 0)],
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            timings = PageTimings(Path(tmp_dir) / "timings.db")
+            timings.open()
+            timings.record(("b", 0), 11, 2.0)
+            timings.record(("c", 0), 0, 0.1)
+            timings.conn.commit()
+            scheduled = list(
+                iter_scheduled_page_keys(self.wxr, [0], timings=timings)
+            )
+            timings.close()
+        self.assertEqual(
+            [key for key, _ in scheduled], [("a", 0), ("b", 0), ("c", 0)]
+        )
+        # "a" has no timing, its time is estimated from the recorded time
+        # per character: 2.1s / 11 characters
+        self.assertAlmostEqual(scheduled[0][1], 2.1)
+        self.assertEqual(scheduled[1][1], 2.0)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#
+# Measures how much time slicing away uncaptured language sections saves
+# when parsing pages of the English edition.  Pages with many languages
+# ("a", "die", single CJK characters) benefit the most.
+#
+# Usage: python tools/benchmark_language_slicing.py --db-path en.db \
+#            --page a --page die --language-code en
+
+import argparse
+import time
+
+from wikitextprocessor import Wtp
+
+from wiktextract.config import WiktionaryConfig
+from wiktextract.extractor.en.page import (
+    ADDITIONAL_EXPAND_TEMPLATES,
+    DO_NOT_PRE_EXPAND_TEMPLATES,
+    fix_subtitle_hierarchy,
+    slice_captured_languages,
+)
+from wiktextract.template_override import template_override_fns
+from wiktextract.wxr_context import WiktextractContext
+
+
+def parse_time(wxr: WiktextractContext, title: str, text: str) -> float:
+    start_t = time.perf_counter()
+    wxr.wtp.start_page(title)
+    text = fix_subtitle_hierarchy(wxr, text)
+    wxr.wtp.parse(
+        text,
+        pre_expand=True,
+        additional_expand=ADDITIONAL_EXPAND_TEMPLATES,
+        do_not_pre_expand=DO_NOT_PRE_EXPAND_TEMPLATES,
+    )
+    return time.perf_counter() - start_t
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark language section slicing in the English "
+        "extractor"
+    )
+    parser.add_argument("--db-path", type=str, required=True)
+    parser.add_argument("--page", type=str, action="append", default=[])
+    parser.add_argument(
+        "--language-code", type=str, action="append", default=[]
+    )
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    conf = WiktionaryConfig(
+        capture_language_codes=set(args.language_code or ["en"])
+    )
+    wtp = Wtp(
+        db_path=args.db_path,
+        lang_code="en",
+        template_override_funcs=template_override_fns,
+        extension_tags=conf.allowed_html_tags,
+    )
+    wxr = WiktextractContext(wtp, conf)
+
+    total_full = total_sliced = 0.0
+    for title in args.page or ["a", "die"]:
+        text = wxr.wtp.get_page_body(title, 0)
+        if text is None:
+            print(f"Can't find page '{title}' in the database.")
+            continue
+        sliced = slice_captured_languages(wxr, text)
+        full_t = min(parse_time(wxr, title, text) for _ in range(args.rounds))
+        sliced_t = min(
+            parse_time(wxr, title, sliced) for _ in range(args.rounds)
+        )
+        total_full += full_t
+        total_sliced += sliced_t
+        print(
+            f"{title}: {len(text)} -> {len(sliced)} chars, "
+            f"full {full_t:.3f}s, sliced {sliced_t:.3f}s, "
+            f"speedup {full_t / max(sliced_t, 1e-9):.1f}x"
+        )
+    if total_sliced > 0:
+        print(f"total speedup {total_full / total_sliced:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
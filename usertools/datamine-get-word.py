@@ -4,7 +4,9 @@
 # Wiktexctract json objects.
 # Copyright (c) 20
 
+import os
 import re
+import sys
 import json
 import argparse
 from collections import defaultdict
@@ -33,6 +35,22 @@ if args.regex:
 else:
     word_re = None
 
+# Use the index written by `wiktwords --write-index` if there is one
+if not word_re and os.path.exists(args.path + ".idx"):
+    from wiktextract.jsonl_index import JsonlIndex
+
+    with JsonlIndex(args.path) as index:
+        # The index also has the hard redirects, by their title; skip them
+        # like the scan below does
+        words = [word for word in index.lookup(args.word)
+                 if word.get("word", "") == args.word and
+                 (not args.language or
+                  word.get("lang", "") in args.language)]
+    for word in words[:args.max]:
+        print(json.dumps(word, sort_keys=True,
+                         ensure_ascii=False))
+    sys.exit(0)
+
 with open(args.path, buffering=16*1024*1024) as jsonf:
     count = 0
     # some good old-fashioned premature optimization,